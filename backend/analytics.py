@@ -0,0 +1,120 @@
+"""Time-bucketed log analytics over the daily rollup (see migrations/0003_rollups.sql).
+
+log_daily_rollup already holds counts and duration sums per IST day x place x
+event, so any day/week/month/quarter/year series is a date_trunc GROUP BY over
+at most (days x places x events) pre-aggregated rows instead of the logs.
+"""
+from datetime import date, timedelta
+
+from sqlparams import Params
+
+BUCKETS = ('day', 'week', 'month', 'quarter', 'year')
+GROUP_COLUMNS = {
+    "place": "COALESCE(p.name, 'unknown')",
+    "event": "r.event",
+}
+
+
+def parse_group_by(value):
+    """'place', 'event', 'place,event' or 'none' as a tuple of group names; raises ValueError"""
+    if value in (None, ''):
+        return ('place',)
+    if value == 'none':
+        return ()
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(',')))
+    for name in names:
+        if name not in GROUP_COLUMNS:
+            raise ValueError(f"Invalid group: {name} (use place, event, place,event or none)")
+    return names
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket containing ``day`` (same as date_trunc; weeks start on Monday)"""
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    if bucket == 'quarter':
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    return date(day.year, 1, 1)
+
+
+def next_bucket(start, bucket):
+    if bucket == 'day':
+        return start + timedelta(days=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[bucket]
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_starts(start, end, bucket):
+    """Every bucket start from the bucket of ``start`` through the bucket of ``end``"""
+    starts = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        starts.append(current)
+        current = next_bucket(current, bucket)
+    return starts
+
+
+def timeseries_query(start, end, bucket, group_by, place=None, event=None, paramstyle='psycopg2'):
+    """(sql, params) for the rollup rows between two dates bucketed with date_trunc.
+
+    ``bucket`` must be one of BUCKETS and ``group_by`` come from
+    parse_group_by (both are inlined). ``paramstyle`` is 'psycopg2' (%s) or
+    'asyncpg' ($n). Rows are (bucket, *groups, log_count, duration_minutes).
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Invalid bucket: {bucket}")
+    params = Params(paramstyle)
+    add = params.add
+
+    conditions = [f"r.day >= {add(start)}::date", f"r.day <= {add(end)}::date"]
+    if place:
+        # Place names resolve to ids first so the (place_id, day) index serves the range
+        conditions.append(f"r.place_id IN (SELECT id FROM places WHERE name = {add(place)}::text)")
+    if event:
+        conditions.append(f"r.event = {add(event)}::text")
+    groups = [GROUP_COLUMNS[name] for name in group_by]
+    sql = f"""
+        SELECT date_trunc('{bucket}', r.day::timestamp)::date AS bucket,
+               {"".join(f"{column} AS {name}, " for name, column in zip(group_by, groups))}
+               SUM(r.log_count)::bigint AS log_count,
+               SUM(r.duration_minutes)::bigint AS duration_minutes
+        FROM log_daily_rollup r
+        {"LEFT JOIN places p ON p.id = NULLIF(r.place_id, '')" if 'place' in group_by else ""}
+        WHERE {" AND ".join(conditions)}
+        GROUP BY {", ".join(str(position) for position in range(1, len(groups) + 2))}
+        HAVING SUM(r.log_count) <> 0
+    """
+    return sql, params
+
+
+def timeseries_json(rows, starts, group_by):
+    """Series aligned with ``starts`` (one per group), largest total duration first"""
+    positions = {start: index for index, start in enumerate(starts)}
+    series = {}
+    for row in map(tuple, rows):
+        key = row[1:1 + len(group_by)]
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = {
+                **dict(zip(group_by, key)),
+                "count": [0] * len(starts),
+                "duration_minutes": [0] * len(starts),
+                "total_count": 0,
+                "total_minutes": 0,
+            }
+        index = positions[row[0]]
+        count, minutes = int(row[-2]), int(row[-1])
+        entry["count"][index] += count
+        entry["duration_minutes"][index] += minutes
+        entry["total_count"] += count
+        entry["total_minutes"] += minutes
+    for entry in series.values():
+        entry["hours"] = [round(minutes / 60, 2) for minutes in entry["duration_minutes"]]
+    return sorted(series.values(), key=lambda entry: (-entry["total_minutes"], -entry["total_count"]))
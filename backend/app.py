@@ -1,21 +1,76 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, g, has_app_context, Response, stream_with_context
 from flask_cors import CORS
 import psycopg2
 import psycopg2.extras
 import os
 import json
 import requests
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import pandas as pd
-from math import radians, cos, sin, asin, sqrt
 from dotenv import load_dotenv
-import io
+import base64
+import functools
+import hmac
+from contextlib import contextmanager
+from db_pool import ConnectionPool, PoolTimeout
+from places_index import PlacesIndex
+from ingest import prepare_event, ingest_events, parse_timestamp, insert_log_query
+from ingest_queue import IngestQueue
+from reclassify import ReclassifyRunner, job_status
+from visits import OpenVisits, VISIT_COLUMNS, elapsed_minutes, release_place_visits, repair_points, repair_visits
+from daily import (record_day_counts, remove_day_logs, moved_day_rows, completion_day, read_days, save_day,
+                   day_json, parse_day_entries)
+from analytics import BUCKETS, parse_group_by, bucket_starts, timeseries_query, timeseries_json
+from track import track_query, track_json
+from map_tiles import MAX_ZOOM, parse_bbox, tiles_for_bbox, cluster_query, split_clusters
+from migrate import run_migrations
+from rollups import record_logs, record_task_status, release_place, DASHBOARD_SQL
+from cache import create_response_cache
+import metrics
+from profiling import RequestProfiler
+from exports import EXPORTS, COMBINED_FILENAME, COLUMNAR_FORMATS, export_types, stream_csv, stream_copy, stream_columnar, pa
 
 # Load environment variables
 load_dotenv('.env.production')
 
 app = Flask(__name__)
 CORS(app, origins=['http://13.40.49.46:3000', 'http://localhost:3000', 'http://0.0.0.0:3000'])
+metrics.instrument_app(app)
+
+# Admin endpoints require this token (X-Admin-Token or Authorization: Bearer); without it they are disabled
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+if not ADMIN_TOKEN:
+    print("⚠️ ADMIN_TOKEN is not set; /api/admin/* endpoints and X-Profile are disabled")
+
+def is_admin_request():
+    """True when the request carries ADMIN_TOKEN (never when no token is configured)"""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        supplied = authorization[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def admin_required(view):
+    """Reject requests to admin endpoints that lack the admin token"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled; set ADMIN_TOKEN to enable them"}), 403
+        if not is_admin_request():
+            return jsonify({"error": "Admin token required"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+# Opt-in profiling: 'X-Profile: 1' header (admin only) or random sampling
+profiler = RequestProfiler(
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+    keep=int(os.getenv('PROFILE_KEEP', 20)),
+    sql_limit=int(os.getenv('PROFILE_SQL_LIMIT', 200)),
+    authorize=is_admin_request
+)
+profiler.instrument_app(app)
 
 # Database configuration - Using Neon database
 print("🔧 Configuring Neon database connection...")
@@ -25,74 +80,226 @@ print(f"📊 Using Neon database: {DATABASE_URL[:50]}...")
 # IST timezone (UTC+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
 
+# Maximum number of events accepted by POST /api/log/batch
+BATCH_MAX_EVENTS = int(os.getenv('BATCH_MAX_EVENTS', 10000))
+
+# GET /api/logs page sizes (default when only a cursor is given, and upper bound for limit)
+LOGS_PAGE_SIZE = int(os.getenv('LOGS_PAGE_SIZE', 100))
+LOGS_MAX_LIMIT = int(os.getenv('LOGS_MAX_LIMIT', 1000))
+DAILY_LOG_MAX_DAYS = int(os.getenv('DAILY_LOG_MAX_DAYS', 366))
+ANALYTICS_MAX_BUCKETS = int(os.getenv('ANALYTICS_MAX_BUCKETS', 1000))
+MAP_MAX_TILES = int(os.getenv('MAP_MAX_TILES', 64))
+MAP_CLUSTER_GRID = int(os.getenv('MAP_CLUSTER_GRID', 8))  # cells per tile side
+TRACK_MAX_DAYS = int(os.getenv('TRACK_MAX_DAYS', 366))
+TRACK_TOLERANCE_M = float(os.getenv('TRACK_TOLERANCE_M', 10))  # default Douglas-Peucker tolerance
+
+# Rows fetched per round trip by streaming exports
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+# Rows per Parquet row group / Arrow record batch in columnar exports
+EXPORT_COLUMNAR_CHUNK_SIZE = int(os.getenv('EXPORT_COLUMNAR_CHUNK_SIZE', 50000))
+
+# Ingest mode for single events: 'sync' writes during the request, 'write_behind' journals
+# the event locally, answers 202 and writes it to the database in the background
+INGEST_MODE = os.getenv('INGEST_MODE', 'sync')
+
+# Connection pool (one per process; connections are opened lazily)
+db_pool = ConnectionPool(
+    DATABASE_URL,
+    minconn=int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+    maxconn=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+    max_idle=float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+    check_interval=float(os.getenv('DB_POOL_CHECK_INTERVAL', 30)),
+    connect_timeout=10,
+    keepalives_idle=600,
+    keepalives_interval=30,
+    keepalives_count=3,
+    # Every statement on pooled connections is timed and tagged for /api/metrics
+    connection_factory=metrics.MetricsConnection,
+    on_checkout=metrics.observe_pool_wait
+)
+
 def get_db_connection():
-    """Get database connection (create new connection each time for reliability)"""
+    """Get the request-scoped pooled connection (returned to the pool on teardown)"""
     try:
-        conn = psycopg2.connect(
-            DATABASE_URL,
-            connect_timeout=10,
-            keepalives_idle=600,
-            keepalives_interval=30,
-            keepalives_count=3
-        )
-        return conn
+        if not has_app_context():
+            return db_pool.getconn()
+        if 'db_conn' not in g:
+            g.db_conn = db_pool.getconn()
+        return g.db_conn
     except Exception as e:
         print(f"❌ Database connection error: {e}")
         raise
 
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.putconn(conn)
+
 def init_database():
-    """Initialize database tables if they don't exist"""
+    """Bring the database schema up to date by applying pending migrations"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Read and execute schema.sql
-        with open('schema.sql', 'r') as f:
-            schema_sql = f.read()
-        
-        cursor.execute(schema_sql)
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            run_migrations(conn)
         print("Database tables initialized successfully")
         
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in meters using Haversine formula"""
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    r = 6371000  # Earth's radius in meters
-    return c * r
+def load_places():
+    """Load all places for the geofence index"""
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute("SELECT id, name, lat, lon, geofence_radius FROM places")
+    places = cursor.fetchall()
+    cursor.close()
+    return places
 
-def get_place_from_location(lat, lon):
-    """Determine which place the location belongs to based on geofence"""
-    try:
+# Cache for read endpoints; write handlers invalidate the tags they touch
+response_cache = create_response_cache(
+    url=os.getenv('CACHE_URL'),
+    ttl=float(os.getenv('CACHE_TTL', 60)),
+    max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1024)),
+    workers=int(os.getenv('WEB_CONCURRENCY', 1))
+)
+
+# Geofence index over places, rebuilt after place mutations (and at most every TTL seconds)
+places_index = PlacesIndex(
+    load_places,
+    cell_deg=float(os.getenv('PLACES_INDEX_CELL_DEG', 0.01)),
+    ttl=float(os.getenv('PLACES_INDEX_TTL', 300))
+)
+
+# Open visit per place for this process, reloaded from the open-visit index at most every TTL seconds
+open_visits = OpenVisits(ttl=float(os.getenv('OPEN_VISITS_TTL', 60)))
+
+def current_open_visits():
+    """Every open visit, from memory (reloading the map first when it is stale)"""
+    if open_visits.stale():
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    
-        cursor.execute("SELECT * FROM places")
-        places = cursor.fetchall()
-        
-        for place in places:
-            distance = calculate_distance(lat, lon, place['lat'], place['lon'])
-            if distance <= place['geofence_radius']:
-                cursor.close()
-                conn.close()
-                return place['name']
-    
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, place_id, arrived_at FROM visits WHERE open")
+        open_visits.replace(cursor.fetchall())
         cursor.close()
-        conn.close()
-        return "unknown"
+    return open_visits.all()
+
+def get_place_from_location(lat, lon):
+    """Determine which place the location belongs to based on geofence.
+
+    Returns (place_id, place_name) for the nearest containing geofence,
+    or (None, "unknown") when the point is outside every place.
+    """
+    try:
+        with metrics.db_site('get_place_from_location'):
+            match = places_index.lookup(lat, lon)
+        if match:
+            return match[0], match[1]
         
     except Exception as e:
         print(f"Error getting place from location: {e}")
-    return "unknown"
+        if has_app_context() and 'db_conn' in g:
+            g.db_conn.rollback()
+    return None, "unknown"
+
+def cached_place_name(lat, lon):
+    """Place name from the geofence index snapshot already in memory, never rebuilding it.
+
+    Used where the database must not be waited on (write-behind ingest);
+    None when the snapshot is not loaded or no geofence contains the point.
+    """
+    match = places_index.lookup_cached(lat, lon)
+    return match[1] if match else None
+
+def automated_notes(event, place_name, lat, lon):
+    """Notes stored with events logged through the URL (iPhone automation) endpoint"""
+    if place_name and place_name != 'unknown':
+        return f"Automated {event} at {place_name}"
+    return f"Automated {event} at {lat:.4f}, {lon:.4f}"
+
+def get_places_from_locations(points):
+    """get_place_from_location() for a list of (lat, lon) in one vectorized pass"""
+    try:
+        with metrics.db_site('get_place_from_location'):
+            matches = places_index.lookup_many(points)
+        return [(match[0], match[1]) if match else (None, "unknown") for match in matches]
+    except Exception as e:
+        print(f"Error getting places from locations: {e}")
+        if has_app_context() and 'db_conn' in g:
+            g.db_conn.rollback()
+    return [(None, "unknown")] * len(points)
+
+def drain_queued_events(events):
+    """Write a batch from the write-behind queue (called on the queue's drain thread)"""
+    with metrics.db_site('ingest_queue'), db_pool.connection() as conn:
+        cursor = conn.cursor()
+        ingest_events(cursor, events, get_places_from_locations, open_visits)
+        conn.commit()
+        cursor.close()
+    response_cache.invalidate('logs')
+
+# Local journal for write-behind ingest; None in sync mode
+ingest_queue = None
+if INGEST_MODE == 'write_behind':
+    ingest_queue = IngestQueue(
+        os.getenv('INGEST_QUEUE_PATH', 'ingest_queue.db'),
+        drain_queued_events,
+        batch_size=int(os.getenv('INGEST_QUEUE_BATCH_SIZE', 500)),
+        interval=float(os.getenv('INGEST_QUEUE_INTERVAL', 0.5)),
+        max_retry_delay=float(os.getenv('INGEST_QUEUE_MAX_RETRY_DELAY', 30)),
+        transient_errors=(psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+    )
+elif INGEST_MODE != 'sync':
+    print(f"⚠️ Unknown INGEST_MODE '{INGEST_MODE}'; using sync ingest")
+
+@contextmanager
+def reclassify_connection():
+    """Pooled connection for the reclassification thread, tagged for /api/metrics"""
+    with metrics.db_site('reclassify'), db_pool.connection() as conn:
+        yield conn
+
+def reclassified_chunk(job, changed):
+    """Drop cached log listings and the open-visit map once a reclassification chunk has moved logs between places"""
+    if changed:
+        open_visits.invalidate()
+        response_cache.invalidate('logs')
+
+# Background re-matching of historical logs against the current places (see reclassify.py)
+reclassify_runner = ReclassifyRunner(
+    reclassify_connection,
+    chunk_size=int(os.getenv('RECLASSIFY_CHUNK_SIZE', 10000)),
+    pause=float(os.getenv('RECLASSIFY_PAUSE', 0)),
+    on_chunk=reclassified_chunk
+)
+# Start a reclassification automatically whenever a place is added or deleted
+RECLASSIFY_ON_PLACE_CHANGE = os.getenv('RECLASSIFY_ON_PLACE_CHANGE', 'false').lower() == 'true'
+
+def queue_event(timestamp, event, lat, lon, notes, duration_minutes, mode, auto_duration=False):
+    """Journal an event for the write-behind drain; fields match ingest.prepare_event"""
+    return ingest_queue.enqueue({
+        "timestamp": timestamp,
+        "event": event,
+        "lat": lat,
+        "lon": lon,
+        "notes": notes,
+        "duration_minutes": duration_minutes,
+        "auto_duration": auto_duration,
+        "mode": mode
+    })
+
+def insert_log(cursor, timestamp, event, lat, lon, place_id, notes, duration_minutes, mode, auto_duration=False):
+    """Insert a log row in a single round trip (see ingest.insert_log_query) and return (id, duration_minutes)"""
+    cursor.execute(*insert_log_query(timestamp, event, lat, lon, place_id, notes, duration_minutes, mode, auto_duration))
+    log_id, duration, stored_place_id, visit_id, arrived_at, closed = cursor.fetchone()
+    # Callers commit right away; a rolled-back write is corrected by the map's next reload
+    if visit_id is not None:
+        open_visits.apply(stored_place_id, opened={"id": visit_id, "place_id": stored_place_id, "arrived_at": arrived_at})
+    elif closed:
+        open_visits.apply(stored_place_id, closed=True)
+    return log_id, duration
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -104,79 +311,128 @@ def health_check_alt():
     """Alternative health check endpoint"""
     return jsonify({"status": "healthy", "timestamp": datetime.now(IST).isoformat()})
 
+@app.route('/api/pool/stats', methods=['GET'])
+def pool_stats():
+    """Connection pool usage (in-use, idle, wait time), response cache hit counts and write-behind queue depth"""
+    stats = {"success": True, "pool": db_pool.stats(), "cache": response_cache.stats()}
+    if ingest_queue is not None:
+        stats["ingest_queue"] = ingest_queue.stats()
+    return jsonify(stats)
+
+# Scrape-time gauges for /api/metrics
+metrics.register_gauge('worklog_db_pool_connections', 'Pooled connections by state',
+                       lambda: {state: db_pool.stats()[state] for state in ('in_use', 'idle', 'opening', 'waiting')},
+                       labels=('state',))
+metrics.register_gauge('worklog_db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection',
+                       lambda: db_pool.stats()['timeouts'], kind='counter')
+metrics.register_gauge('worklog_response_cache_total', 'Response cache lookups by result',
+                       lambda: {result: count for result, count in response_cache.stats().items()},
+                       kind='counter', labels=('result',))
+if ingest_queue is not None:
+    metrics.register_gauge('worklog_ingest_queue_depth', 'Events waiting in the write-behind journal',
+                           lambda: ingest_queue.stats()['depth'])
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for this process"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiles', methods=['GET', 'DELETE'])
+@admin_required
+def list_profiles():
+    """Retained request profiles of this process (slowest first), or clear them"""
+    if request.method == 'DELETE':
+        profiler.clear()
+        return jsonify({"success": True, "message": "Profiles cleared"})
+    return jsonify({"success": True, "profiles": profiler.list()})
+
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """One profile: SQL statements and cProfile report (format=pstats downloads the raw stats)"""
+    details = profiler.get(profile_id)
+    if details is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if request.args.get('format') == 'pstats':
+        if '_pstats' not in details:
+            return jsonify({"error": "No cProfile data for this request"}), 404
+        return Response(
+            details['_pstats'],
+            mimetype='application/octet-stream',
+            headers={"Content-Disposition": f"attachment; filename=profile_{profile_id}.pstats"}
+        )
+    return jsonify({"success": True, "profile": {key: value for key, value in details.items() if key != '_pstats'}})
+
+@app.route('/api/admin/reclassify', methods=['GET', 'POST', 'DELETE'])
+@admin_required
+def reclassify():
+    """Re-match historical logs against the current places: start/resume (POST), pause (DELETE) or show jobs (GET)"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            state = reclassify_runner.start(restart=bool(data.get('restart', False)))
+            return jsonify({"success": True, "message": f"Reclassification {state}"}), 202
+        if request.method == 'DELETE':
+            reclassify_runner.stop()
+            return jsonify({"success": True, "message": "Reclassification will pause after the current chunk"})
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        jobs = job_status(cursor, limit=min(int(request.args.get('limit', 10)), 100))
+        cursor.close()
+        return jsonify({
+            "success": True,
+            "running": reclassify_runner.running(),
+            "last_error": reclassify_runner.last_error,
+            "jobs": jobs
+        })
+
+    except Exception as e:
+        print(f"Error in reclassify: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/log', methods=['POST'])
 def log_event():
     """Log a new event"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['event', 'lat', 'lon']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-        
-        # Extract data
-        event = data['event']
-        lat = float(data['lat'])
-        lon = float(data['lon'])
-        notes = data.get('notes', '')
-        duration_minutes = data.get('duration_minutes', 0)
-        source = data.get('source', 'manual')
+        data = request.get_json(silent=True)
         
-        # Determine place from location
-        place_name = get_place_from_location(lat, lon)
-        
-        # Get place_id if place exists
-        place_id = None
-        if place_name != "unknown":
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM places WHERE name = %s", (place_name,))
-            result = cursor.fetchone()
-            if result:
-                place_id = result[0]
-            cursor.close()
-            conn.close()
-        
-        timestamp = datetime.now(IST)
+        # Validate with the same rules as the batch and write-behind paths; this endpoint always logs "now"
+        try:
+            prepared = prepare_event(dict(data, timestamp=None) if isinstance(data, dict) else data,
+                                     datetime.now(IST), IST)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        event, lat, lon = prepared['event'], prepared['lat'], prepared['lon']
+        timestamp = prepared['timestamp']
+        notes = prepared['notes']
+        duration_minutes = prepared['duration_minutes']
+        mode = prepared['mode']
+        
+        if ingest_queue is not None:
+            # Write-behind: durable locally now, written to the database by the drain thread
+            # (which resolves the place itself, so the response only reports a cached match)
+            queue_event(timestamp, event, lat, lon, notes, duration_minutes, mode,
+                        auto_duration=prepared['auto_duration'])
+            return jsonify({
+                "success": True,
+                "queued": True,
+                "message": f"Event '{event}' queued",
+                "timestamp": timestamp.isoformat(),
+                "place": cached_place_name(lat, lon)
+            }), 202
         
-        # Auto-calculate duration for exit events
-        if event == 'exit' and duration_minutes == 0:
-            try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT timestamp AT TIME ZONE 'Asia/Kolkata' FROM logs 
-                    WHERE event = 'arrive' 
-                    ORDER BY timestamp DESC 
-                    LIMIT 1
-                """)
-                result = cursor.fetchone()
-                if result:
-                    arrive_time = result[0]  # Already in IST from query
-                    duration_minutes = int((timestamp - arrive_time).total_seconds() / 60)
-                    if duration_minutes < 0:
-                        duration_minutes = 0
-                cursor.close()
-                conn.close()
-            except Exception as e:
-                print(f"Error calculating duration: {e}")
-                duration_minutes = 0
+        # Determine place from location
+        place_id, place_name = get_place_from_location(lat, lon)
         
-        # Insert into database
+        # Insert into database (exit duration is auto-calculated in the same statement)
         conn = get_db_connection()
         cursor = conn.cursor()
-        mode = 'iPhone' if source == 'iphone' else 'Manual'
-        
-        cursor.execute("""
-            INSERT INTO logs (timestamp, event, lat, lon, place_id, notes, duration_minutes, mode)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (timestamp, event, lat, lon, place_id, notes, duration_minutes, mode))
-        
+        insert_log(cursor, timestamp, event, lat, lon, place_id, notes, duration_minutes, mode,
+                   auto_duration=prepared['auto_duration'])
         conn.commit()
+        response_cache.invalidate('logs')
         cursor.close()
-        conn.close()
         
         return jsonify({
             "success": True,
@@ -189,6 +445,69 @@ def log_event():
         print(f"Error logging event: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/log/batch', methods=['POST'])
+def log_events_batch():
+    """Log many events at once (JSON array or NDJSON) - for replaying offline-buffered events"""
+    try:
+        # Parse body: a JSON array, {"events": [...]}, or one JSON object per line
+        items = []
+        parse_errors = {}
+        if request.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            lines = [line for line in request.get_data(as_text=True).splitlines() if line.strip()]
+            for index, line in enumerate(lines):
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(None)
+                    parse_errors[index] = "Invalid JSON"
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                data = data.get('events')
+            if not isinstance(data, list):
+                return jsonify({"error": "Body must be a JSON array of events, {\"events\": [...]}, or NDJSON"}), 400
+            items = data
+        
+        if len(items) > BATCH_MAX_EVENTS:
+            return jsonify({"error": f"Too many events in batch (max {BATCH_MAX_EVENTS})"}), 413
+        
+        # Validate every item; invalid ones are reported without failing the batch
+        now = datetime.now(IST)
+        results = [None] * len(items)
+        valid_indexes = []
+        prepared = []
+        for index, item in enumerate(items):
+            if index in parse_errors:
+                results[index] = {"index": index, "success": False, "error": parse_errors[index]}
+                continue
+            try:
+                prepared.append(prepare_event(item, now, IST))
+                valid_indexes.append(index)
+            except ValueError as e:
+                results[index] = {"index": index, "success": False, "error": str(e)}
+        
+        if prepared:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            inserted = ingest_events(cursor, prepared, get_places_from_locations, open_visits)
+            conn.commit()
+            response_cache.invalidate('logs')
+            cursor.close()
+            
+            for index, result in zip(valid_indexes, inserted):
+                results[index] = {"index": index, **result}
+        
+        return jsonify({
+            "success": True,
+            "inserted": len(prepared),
+            "failed": len(items) - len(prepared),
+            "results": results
+        })
+        
+    except Exception as e:
+        print(f"Error logging batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/<event>/<lat>/<lon>', methods=['GET', 'POST'])
 def log_event_url_params(event, lat, lon):
     """Log event using URL parameters - perfect for iPhone automation"""
@@ -207,63 +526,35 @@ def log_event_url_params(event, lat, lon):
         # Get current timestamp
         timestamp = datetime.now(IST)
         
-        # Determine place from location using geofence matching
-        place_name = get_place_from_location(lat_float, lon_float)
-        
-        # Get place_id if place exists
-        place_id = None
-        if place_name != "unknown":
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM places WHERE name = %s", (place_name,))
-            result = cursor.fetchone()
-            if result:
-                place_id = result[0]
-            cursor.close()
-            conn.close()
+        if ingest_queue is not None:
+            # Write-behind: never wait on the database for the place (the drain resolves it);
+            # the exit duration is computed when the event is drained
+            place_name = cached_place_name(lat_float, lon_float)
+            queue_event(timestamp, event, lat_float, lon_float, automated_notes(event, place_name, lat_float, lon_float),
+                        0, 'iPhone', auto_duration=(event == 'exit'))
+            return jsonify({
+                "success": True,
+                "queued": True,
+                "message": f"Event '{event}' queued",
+                "timestamp": timestamp.isoformat(),
+                "place": place_name,
+                "coordinates": f"{lat_float:.4f}, {lon_float:.4f}",
+                "duration_minutes": None
+            }), 202
         
-        # Auto-calculate duration for exit events
-        duration_minutes = 0
-        if event == 'exit':
-            try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT timestamp AT TIME ZONE 'Asia/Kolkata' FROM logs 
-                    WHERE event = 'arrive' 
-                    ORDER BY timestamp DESC 
-                    LIMIT 1
-                """)
-                result = cursor.fetchone()
-                if result:
-                    arrive_time = result[0]  # Already in IST from query
-                    duration_minutes = int((timestamp - arrive_time).total_seconds() / 60)
-                    if duration_minutes < 0:
-                        duration_minutes = 0
-                cursor.close()
-                conn.close()
-            except Exception as e:
-                print(f"Error calculating duration: {e}")
-                duration_minutes = 0
-        
-        # Create notes based on event and place
-        if place_name and place_name != 'unknown':
-            notes = f"Automated {event} at {place_name}"
-        else:
-            notes = f"Automated {event} at {lat_float:.4f}, {lon_float:.4f}"
+        # Determine place from location using geofence matching
+        place_id, place_name = get_place_from_location(lat_float, lon_float)
+        notes = automated_notes(event, place_name, lat_float, lon_float)
         
-        # Insert into database
+        # Insert into database (exit duration is auto-calculated in the same statement)
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO logs (timestamp, event, lat, lon, place_id, notes, duration_minutes, mode)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (timestamp, event, lat_float, lon_float, place_id, notes, duration_minutes, 'iPhone'))
+        _, duration_minutes = insert_log(cursor, timestamp, event, lat_float, lon_float, place_id, notes, 0, 'iPhone',
+                                         auto_duration=(event == 'exit'))
         
         conn.commit()
+        response_cache.invalidate('logs')
         cursor.close()
-        conn.close()
         
         return jsonify({
             "success": True,
@@ -278,16 +569,65 @@ def log_event_url_params(event, lat, lon):
         print(f"Error logging event via URL params: {e}")
         return jsonify({"error": str(e)}), 500
 
+def encode_log_cursor(timestamp, log_id):
+    """Opaque keyset cursor for a log row: its (timestamp, id) position"""
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_log_cursor(cursor_value):
+    """Inverse of encode_log_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        timestamp, log_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor_value}")
+
+def parse_range_bound(value, upper=False, column="l.timestamp"):
+    """SQL condition and params for a from/to bound given as a date (IST day) or an ISO datetime"""
+    if len(value) == 10:
+        date.fromisoformat(value)
+        # Whole IST days (as in the rollups and daily summaries): 'to' includes the given day
+        if upper:
+            return f"{column} < (%s::date + 1)::timestamp AT TIME ZONE 'Asia/Kolkata'", [value]
+        return f"{column} >= %s::date::timestamp AT TIME ZONE 'Asia/Kolkata'", [value]
+    bound = parse_timestamp(value, IST)
+    return (f"{column} <= %s" if upper else f"{column} >= %s"), [bound]
+
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    """Get all logs with optional filtering"""
+    """Get logs with optional filtering and keyset pagination.
+
+    Without limit/before/after every matching log is returned. With them the
+    response holds one page ordered newest first, plus next_cursor (pass as
+    'before' for older rows) and prev_cursor (pass as 'after' for newer rows).
+    """
     try:
+        # Pagination arguments
+        before = request.args.get('before')
+        after = request.args.get('after')
+        limit = request.args.get('limit')
+        if before and after:
+            return jsonify({"error": "Use either 'before' or 'after', not both"}), 400
+        try:
+            cursor_position = decode_log_cursor(before or after) if (before or after) else None
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError("limit must be positive")
+                limit = min(limit, LOGS_MAX_LIMIT)
+            elif cursor_position:
+                limit = LOGS_PAGE_SIZE
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        paginated = limit is not None
+        
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         
         # Build query with filters
         query = """
-            SELECT l.id, l.timestamp AT TIME ZONE 'Asia/Kolkata' as timestamp, l.event, l.lat, l.lon, l.place_id, l.notes, l.duration_minutes, l.mode, p.name as place_name
+            SELECT l.id, l.timestamp AS cursor_ts, l.timestamp AT TIME ZONE 'Asia/Kolkata' as timestamp, l.event, l.lat, l.lon, l.place_id, l.notes, l.duration_minutes, l.mode, p.name as place_name
             FROM logs l
             LEFT JOIN places p ON l.place_id = p.id
         """
@@ -298,10 +638,23 @@ def get_logs():
         date_filter = request.args.get('date')
         event_filter = request.args.get('event')
         place_filter = request.args.get('place')
+        from_filter = request.args.get('from')
+        to_filter = request.args.get('to')
         
         if date_filter:
-            conditions.append("DATE(l.timestamp) = %s")
-            params.append(date_filter)
+            # Sargable form of "logged on this IST day" so the timestamp index is used
+            conditions.append("l.timestamp >= %s::date::timestamp AT TIME ZONE 'Asia/Kolkata' "
+                              "AND l.timestamp < (%s::date + 1)::timestamp AT TIME ZONE 'Asia/Kolkata'")
+            params.extend([date_filter, date_filter])
+        
+        try:
+            for value, upper in ((from_filter, False), (to_filter, True)):
+                if value:
+                    condition, bound_params = parse_range_bound(value, upper)
+                    conditions.append(condition)
+                    params.extend(bound_params)
+        except ValueError:
+            return jsonify({"error": "Invalid 'from'/'to': use YYYY-MM-DD or an ISO 8601 datetime"}), 400
         
         if event_filter:
             conditions.append("l.event = %s")
@@ -311,18 +664,38 @@ def get_logs():
             conditions.append("p.name = %s")
             params.append(place_filter)
         
+        if cursor_position:
+            conditions.append("(l.timestamp, l.id) < (%s, %s)" if before else "(l.timestamp, l.id) > (%s, %s)")
+            params.extend(cursor_position)
+        
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
         
-        query += " ORDER BY l.timestamp DESC"
+        # 'after' pages walk forward from the cursor and are flipped back to newest-first below
+        if after:
+            query += " ORDER BY l.timestamp ASC, l.id ASC"
+        else:
+            query += " ORDER BY l.timestamp DESC, l.id DESC"
+        
+        if paginated:
+            # One extra row tells us whether another page exists
+            query += " LIMIT %s"
+            params.append(limit + 1)
         
         cursor.execute(query, params)
         logs = cursor.fetchall()
         
+        has_more = paginated and len(logs) > limit
+        if has_more:
+            logs = logs[:limit]
+        if after:
+            logs.reverse()
+        
         # Convert to JSON format
         logs_list = []
         for log in logs:
             log_entry = {
+                'id': log['id'],
                 'timestamp': log['timestamp'].isoformat() if log['timestamp'] else None,
                 'event': log['event'],
                 'lat': float(log['lat']),
@@ -337,13 +710,21 @@ def get_logs():
             logs_list.append(log_entry)
         
         cursor.close()
-        conn.close()
         
-        return jsonify({
+        response = {
             "success": True,
             "logs": logs_list,
             "total": len(logs_list)
-        })
+        }
+        if paginated:
+            # Older rows exist if this page was cut short, or if we paged forward from a cursor
+            older = (has_more and not after) or bool(after)
+            newer = (has_more and bool(after)) or bool(before)
+            response["has_more"] = older
+            response["next_cursor"] = encode_log_cursor(logs[-1]['cursor_ts'], logs[-1]['id']) if logs and older else None
+            response["prev_cursor"] = encode_log_cursor(logs[0]['cursor_ts'], logs[0]['id']) if logs and newer else None
+        
+        return jsonify(response)
         
     except Exception as e:
         print(f"Error getting logs: {e}")
@@ -356,16 +737,21 @@ def delete_log(log_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute("DELETE FROM logs WHERE id = %s", (log_id,))
+        cursor.execute("DELETE FROM logs WHERE id = %s RETURNING timestamp, place_id, event, duration_minutes", (log_id,))
+        deleted = cursor.fetchall()
         
-        if cursor.rowcount == 0:
+        if not deleted:
             cursor.close()
-            conn.close()
             return jsonify({"error": "Log entry not found"}), 404
         
+        record_logs(cursor, deleted, sign=-1)
+        remove_day_logs(cursor, deleted)
+        # Re-pair the visits the log was part of (the FK only nulled its id in them)
+        repair_visits(cursor, repair_points(deleted))
         conn.commit()
+        open_visits.invalidate()
+        response_cache.invalidate('logs')
         cursor.close()
-        conn.close()
         
         return jsonify({
             "success": True,
@@ -376,7 +762,214 @@ def delete_log(log_id):
         print(f"Error deleting log: {e}")
         return jsonify({"error": str(e)}), 500
 
+def visit_json(visit):
+    """JSON form of a visits row joined with its place name (IST timestamps)"""
+    return {
+        "id": visit['id'],
+        "place_id": visit['place_id'],
+        "place": visit['place_name'] if visit['place_name'] else 'unknown',
+        "arrived_at": visit['arrived_at'].astimezone(IST).isoformat() if visit['arrived_at'] else None,
+        "exited_at": visit['exited_at'].astimezone(IST).isoformat() if visit['exited_at'] else None,
+        "duration_minutes": visit['duration_minutes'],
+        "open": visit['open'],
+        "arrive_log_id": visit['arrive_log_id'],
+        "exit_log_id": visit['exit_log_id']
+    }
+
+@app.route('/api/visits', methods=['GET'])
+@response_cache.cached('logs', 'places')
+def get_visits():
+    """Visits (arrive/exit pairs per place), newest first, one page at a time.
+
+    Filters: place (name), from/to (visit start), open=true|false. Pass
+    next_cursor back as 'before' for the next page.
+    """
+    try:
+        try:
+            limit = min(int(request.args.get('limit', LOGS_PAGE_SIZE)), LOGS_MAX_LIMIT)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            before = request.args.get('before')
+            cursor_position = decode_log_cursor(before) if before else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        conditions = []
+        params = []
+        place_filter = request.args.get('place')
+        if place_filter:
+            conditions.append("p.name = %s")
+            params.append(place_filter)
+        open_filter = request.args.get('open')
+        if open_filter is not None:
+            conditions.append("v.open = %s")
+            params.append(open_filter.lower() == 'true')
+        try:
+            for value, upper in ((request.args.get('from'), False), (request.args.get('to'), True)):
+                if value:
+                    condition, bound_params = parse_range_bound(value, upper, "COALESCE(v.arrived_at, v.exited_at)")
+                    conditions.append(condition)
+                    params.extend(bound_params)
+        except ValueError:
+            return jsonify({"error": "Invalid 'from'/'to': use YYYY-MM-DD or an ISO 8601 datetime"}), 400
+        if cursor_position:
+            conditions.append("(COALESCE(v.arrived_at, v.exited_at), v.id) < (%s, %s)")
+            params.extend(cursor_position)
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.execute(f"""
+            SELECT {VISIT_COLUMNS}, COALESCE(v.arrived_at, v.exited_at) AS started_at, p.name AS place_name
+            FROM visits v
+            LEFT JOIN places p ON p.id = v.place_id
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY COALESCE(v.arrived_at, v.exited_at) DESC, v.id DESC
+            LIMIT %s
+        """, params + [limit + 1])
+        visits = cursor.fetchall()
+        cursor.close()
+        
+        has_more = len(visits) > limit
+        visits = visits[:limit]
+        return jsonify({
+            "success": True,
+            "visits": [visit_json(visit) for visit in visits],
+            "total": len(visits),
+            "has_more": has_more,
+            "next_cursor": encode_log_cursor(visits[-1]['started_at'], visits[-1]['id']) if has_more else None
+        })
+        
+    except Exception as e:
+        print(f"Error getting visits: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/visits/open', methods=['GET'])
+def get_open_visits():
+    """Visits still in progress (served from the in-memory open-visit map)"""
+    try:
+        now = datetime.now(IST)
+        names = places_index.names()
+        visits = sorted(current_open_visits(), key=lambda visit: visit['arrived_at'], reverse=True)
+        return jsonify({
+            "success": True,
+            "visits": [{
+                "id": visit['id'],
+                "place_id": visit['place_id'],
+                "place": names.get(visit['place_id'], 'unknown'),
+                "arrived_at": visit['arrived_at'].astimezone(IST).isoformat(),
+                "minutes_so_far": elapsed_minutes(visit['arrived_at'], now)
+            } for visit in visits]
+        })
+        
+    except Exception as e:
+        print(f"Error getting open visits: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/visits/summary', methods=['GET'])
+@response_cache.cached('logs', 'places')
+def visits_summary():
+    """Time at each place from completed visits, optionally within from/to (visit start)"""
+    try:
+        conditions = ["v.exited_at IS NOT NULL", "v.arrived_at IS NOT NULL"]
+        params = []
+        try:
+            for value, upper in ((request.args.get('from'), False), (request.args.get('to'), True)):
+                if value:
+                    condition, bound_params = parse_range_bound(value, upper, "v.arrived_at")
+                    conditions.append(condition)
+                    params.extend(bound_params)
+        except ValueError:
+            return jsonify({"error": "Invalid 'from'/'to': use YYYY-MM-DD or an ISO 8601 datetime"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.execute(f"""
+            SELECT COALESCE(p.name, 'unknown') AS place, COUNT(*) AS visits,
+                   COALESCE(SUM(v.duration_minutes), 0) AS total_minutes,
+                   ROUND(AVG(v.duration_minutes), 1) AS average_minutes,
+                   MAX(v.exited_at) AS last_exited_at
+            FROM visits v
+            LEFT JOIN places p ON p.id = v.place_id
+            WHERE {" AND ".join(conditions)}
+            GROUP BY 1
+            ORDER BY total_minutes DESC
+        """, params)
+        places = cursor.fetchall()
+        cursor.close()
+        
+        return jsonify({
+            "success": True,
+            "places": [{
+                "place": row['place'],
+                "visits": row['visits'],
+                "total_minutes": int(row['total_minutes']),
+                "average_minutes": float(row['average_minutes']) if row['average_minutes'] is not None else None,
+                "last_exited_at": row['last_exited_at'].astimezone(IST).isoformat() if row['last_exited_at'] else None
+            } for row in places]
+        })
+        
+    except Exception as e:
+        print(f"Error getting visits summary: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/daily-log', methods=['GET', 'POST'])
+@response_cache.cached('logs', 'places', 'tasks', 'events', 'daily')
+def daily_log():
+    """One day's log (?date=YYYY-MM-DD, default today) or every day in ?from=...&to=...
+
+    POST saves the day's notes and tasks (the daily page's own entries);
+    everything else is read from the precomputed day summaries.
+    """
+    try:
+        if request.method == 'GET':
+            try:
+                if request.args.get('from') or request.args.get('to'):
+                    start = date.fromisoformat(request.args.get('from', ''))
+                    end = date.fromisoformat(request.args.get('to', ''))
+                    if end < start:
+                        raise ValueError
+                else:
+                    start = end = date.fromisoformat(request.args['date']) if request.args.get('date') else datetime.now(IST).date()
+            except ValueError:
+                return jsonify({"error": "Use ?date=YYYY-MM-DD or ?from=YYYY-MM-DD&to=YYYY-MM-DD"}), 400
+            if (end - start).days >= DAILY_LOG_MAX_DAYS:
+                return jsonify({"error": f"Range too long (at most {DAILY_LOG_MAX_DAYS} days)"}), 400
+            
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            days = read_days(cursor, start, end)
+            cursor.close()
+            
+            if request.args.get('from'):
+                return jsonify({"success": True, "days": [day_json(day) for day in days]})
+            return jsonify({"success": True, "log": day_json(days[0])})
+        
+        elif request.method == 'POST':
+            data = request.get_json()
+            if not isinstance(data, dict) or not data.get('date'):
+                return jsonify({"error": "Missing required field: date"}), 400
+            try:
+                day = date.fromisoformat(str(data['date'])[:10])
+                notes, entries = parse_day_entries(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            save_day(cursor, day, notes, entries)
+            conn.commit()
+            response_cache.invalidate('daily')
+            saved = read_days(cursor, day, day)
+            cursor.close()
+            
+            return jsonify({"success": True, "log": day_json(saved[0])})
+        
+    except Exception as e:
+        print(f"Error handling daily log: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/places', methods=['GET', 'POST'])
+@response_cache.cached('places')
 def places():
     """Get or add places"""
     try:
@@ -388,7 +981,6 @@ def places():
             places = cursor.fetchall()
             
             cursor.close()
-            conn.close()
             
             return jsonify({"success": True, "places": places})
         
@@ -408,7 +1000,6 @@ def places():
             cursor.execute("SELECT id FROM places WHERE name = %s", (data['name'],))
             if cursor.fetchone():
                 cursor.close()
-                conn.close()
                 return jsonify({"error": f"Place '{data['name']}' already exists"}), 400
             
             # Insert new place
@@ -425,8 +1016,11 @@ def places():
             ))
             
             conn.commit()
+            response_cache.invalidate('places')
             cursor.close()
-            conn.close()
+            places_index.invalidate()
+            if RECLASSIFY_ON_PLACE_CHANGE:
+                reclassify_runner.start()
             
             new_place = {
                 "id": data['name'],
@@ -453,16 +1047,23 @@ def delete_place(place_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # Its open visit can't stay open once its visits lose their place
+        release_place_visits(cursor, place_id)
         cursor.execute("DELETE FROM places WHERE id = %s", (place_id,))
         
         if cursor.rowcount == 0:
             cursor.close()
-            conn.close()
             return jsonify({"error": "Place not found"}), 404
         
+        # Its logs now have place_id = NULL; move their rollup counts along with them
+        release_place(cursor, place_id)
         conn.commit()
+        response_cache.invalidate('places')
         cursor.close()
-        conn.close()
+        places_index.invalidate()
+        open_visits.apply(place_id, closed=True)
+        if RECLASSIFY_ON_PLACE_CHANGE:
+            reclassify_runner.start()
         
         return jsonify({"success": True, "message": f"Place {place_id} deleted"})
         
@@ -470,6 +1071,7 @@ def delete_place(place_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/tasks', methods=['GET', 'POST'])
+@response_cache.cached('tasks')
 def tasks():
     """Get or add tasks"""
     try:
@@ -481,7 +1083,6 @@ def tasks():
             tasks = cursor.fetchall()
             
             cursor.close()
-            conn.close()
             
             return jsonify({"success": True, "tasks": tasks})
         
@@ -511,10 +1112,11 @@ def tasks():
                 data.get('priority', 'medium'),
                 data.get('due_by')
             ))
+            record_task_status(cursor, new_status='pending', created=True)
             
             conn.commit()
+            response_cache.invalidate('tasks')
             cursor.close()
-            conn.close()
             
             new_task = {
                 "id": new_id,
@@ -572,39 +1174,46 @@ def update_task(task_id):
                 params.append(data['priority'])
             
             if updates:
-                params.append(task_id)
+                # Return the previous status and completion too so the rollups can be adjusted
                 cursor.execute(f"""
+                    WITH old AS (SELECT id, status, completed_at FROM tasks WHERE id = %s FOR UPDATE)
                     UPDATE tasks 
                     SET {', '.join(updates)}
-                    WHERE id = %s
-                """, params)
+                    FROM old
+                    WHERE tasks.id = old.id
+                    RETURNING old.status, tasks.status, old.completed_at, tasks.completed_at
+                """, [task_id] + params)
+                result = cursor.fetchone()
                 
-                if cursor.rowcount == 0:
+                if result is None:
                     cursor.close()
-                    conn.close()
                     return jsonify({"error": "Task not found"}), 404
                 
+                if result[0] != result[1]:
+                    record_task_status(cursor, old_status=result[0], new_status=result[1])
+                record_day_counts(cursor, 'tasks_completed', moved_day_rows(completion_day(result[2]), completion_day(result[3])))
                 conn.commit()
+                response_cache.invalidate('tasks')
                 cursor.close()
-                conn.close()
             
                 return jsonify({"success": True, "message": f"Task {task_id} updated"})
             else:
                 cursor.close()
-                conn.close()
                 return jsonify({"error": "No fields to update"}), 400
         
         elif request.method == 'DELETE':
-            cursor.execute("DELETE FROM tasks WHERE id = %s", (task_id,))
+            cursor.execute("DELETE FROM tasks WHERE id = %s RETURNING status, completed_at", (task_id,))
+            result = cursor.fetchone()
             
-            if cursor.rowcount == 0:
+            if result is None:
                 cursor.close()
-                conn.close()
                 return jsonify({"error": "Task not found"}), 404
             
+            record_task_status(cursor, old_status=result[0], deleted=True)
+            record_day_counts(cursor, 'tasks_completed', moved_day_rows(old_day=completion_day(result[1])))
             conn.commit()
+            response_cache.invalidate('tasks')
             cursor.close()
-            conn.close()
             
             return jsonify({"success": True, "message": f"Task {task_id} deleted"})
             
@@ -612,44 +1221,17 @@ def update_task(task_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/dashboard', methods=['GET'])
+@response_cache.cached('logs', 'tasks', 'places')
 def get_dashboard_data():
     """Get dashboard metrics"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Calculate metrics
-        cursor.execute("SELECT COUNT(*) FROM logs")
-        total_logs = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM logs WHERE DATE(timestamp) = CURRENT_DATE")
-        today_logs = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT event) FROM logs")
-        unique_events = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COALESCE(SUM(duration_minutes), 0) FROM logs")
-        total_duration = cursor.fetchone()[0]
-        
-        # Event distribution
-        cursor.execute("SELECT event, COUNT(*) FROM logs GROUP BY event")
-        event_counts = dict(cursor.fetchall())
-        
-        # Place distribution
-        cursor.execute("""
-            SELECT COALESCE(p.name, 'unknown'), COUNT(*) 
-            FROM logs l 
-            LEFT JOIN places p ON l.place_id = p.id 
-            GROUP BY p.name
-        """)
-        place_counts = dict(cursor.fetchall())
-        
-        # Task stats
-        cursor.execute("SELECT COUNT(*) FROM tasks")
-        total_tasks = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
-        task_status_counts = dict(cursor.fetchall())
+        # All metrics in one statement over the rollup tables (kept current by every log/task write)
+        cursor.execute(DASHBOARD_SQL)
+        total_logs, today_logs, unique_events, total_duration, event_counts, place_counts, task_status_counts = cursor.fetchone()
+        total_tasks = sum(task_status_counts.values())
         
         task_stats = {
             "total": total_tasks,
@@ -659,7 +1241,6 @@ def get_dashboard_data():
         }
         
         cursor.close()
-        conn.close()
         
         return jsonify({
             "success": True,
@@ -679,232 +1260,221 @@ def get_dashboard_data():
         print(f"Error getting dashboard data: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/analytics/timeseries', methods=['GET'])
+@response_cache.cached('logs', 'places')
+def analytics_timeseries():
+    """Log counts and durations per day/week/month/quarter/year, grouped by place and/or event.
+
+    Query: from/to (YYYY-MM-DD, default the last 365 days), bucket (default
+    week), group (place, event, place,event or none; default place) and
+    optional place/event filters. Computed from the daily rollup.
+    """
+    try:
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.now(IST).date()
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=364)
+            if end < start:
+                raise ValueError("'from' must not be after 'to'")
+            bucket = request.args.get('bucket', 'week')
+            if bucket not in BUCKETS:
+                raise ValueError(f"Invalid bucket: use one of {', '.join(BUCKETS)}")
+            group_by = parse_group_by(request.args.get('group'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        starts = bucket_starts(start, end, bucket)
+        if len(starts) > ANALYTICS_MAX_BUCKETS:
+            return jsonify({"error": f"Too many buckets ({len(starts)} > {ANALYTICS_MAX_BUCKETS}); use a larger bucket or a shorter range"}), 400
+        
+        sql, params = timeseries_query(start, end, bucket, group_by, request.args.get('place'), request.args.get('event'))
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        
+        return jsonify({
+            "success": True,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "bucket": bucket,
+            "group_by": list(group_by),
+            "buckets": [bucket_day.isoformat() for bucket_day in starts],
+            "series": timeseries_json(rows, starts, group_by)
+        })
+        
+    except Exception as e:
+        print(f"Error getting analytics timeseries: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/track', methods=['GET'])
+@response_cache.cached('logs')
+def get_track():
+    """Movement path for a day (?date=YYYY-MM-DD, default today) or ?from=...&to=...
+
+    The logged points are simplified with Douglas-Peucker (?tolerance= in
+    meters, 0 keeps every point) and returned as an encoded polyline
+    (?precision=5 or 6) with per-point time deltas instead of log objects.
+    """
+    try:
+        try:
+            if request.args.get('from') or request.args.get('to'):
+                start = date.fromisoformat(request.args.get('from', ''))
+                end = date.fromisoformat(request.args.get('to', ''))
+                if end < start:
+                    raise ValueError
+            else:
+                start = end = date.fromisoformat(request.args['date']) if request.args.get('date') else datetime.now(IST).date()
+        except ValueError:
+            return jsonify({"error": "Use ?date=YYYY-MM-DD or ?from=YYYY-MM-DD&to=YYYY-MM-DD"}), 400
+        if (end - start).days >= TRACK_MAX_DAYS:
+            return jsonify({"error": f"Range too long (at most {TRACK_MAX_DAYS} days)"}), 400
+        try:
+            tolerance = float(request.args.get('tolerance', TRACK_TOLERANCE_M))
+            precision = int(request.args.get('precision', 5))
+        except ValueError:
+            return jsonify({"error": "tolerance must be a number of meters and precision an integer"}), 400
+        if not tolerance >= 0 or precision not in (5, 6):
+            return jsonify({"error": "tolerance must be >= 0 and precision 5 or 6"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(*track_query(start, end))
+        rows = cursor.fetchall()
+        cursor.close()
+        
+        return jsonify({"success": True, "from": start.isoformat(), "to": end.isoformat(),
+                        **track_json(rows, tolerance, precision, IST)})
+        
+    except Exception as e:
+        print(f"Error getting track: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/map/points', methods=['GET'])
+def map_points():
+    """Logged locations inside ?bbox=min_lon,min_lat,max_lon,max_lat clustered for ?zoom=N.
+
+    Optional event, place and from/to (YYYY-MM-DD) filters. Clusters are
+    computed per map tile and cached per tile until the next log write.
+    """
+    try:
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+            zoom = int(request.args.get('zoom', ''))
+            if not 0 <= zoom <= MAX_ZOOM:
+                raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        tiles = tiles_for_bbox(bbox, zoom)
+        if len(tiles) > MAP_MAX_TILES:
+            return jsonify({"error": f"bbox covers {len(tiles)} tiles at zoom {zoom} (at most {MAP_MAX_TILES}); zoom in"}), 400
+        event_filter = request.args.get('event')
+        place_filter = request.args.get('place')
+        
+        # Each tile's clusters are cached on their own, so panning only queries the newly visible tiles
+        filters = '&'.join(f"{name}={request.args[name]}" for name in ('event', 'place', 'from', 'to') if request.args.get(name))
+        keys = response_cache.fragment_keys([f"map/{zoom}/{x}/{y}?{filters}" for x, y in tiles], ('logs', 'places'))
+        clusters = {}
+        missing = []
+        for tile, key, value in zip(tiles, keys, response_cache.get_fragments(keys)):
+            if value is None:
+                missing.append((tile, key))
+            else:
+                clusters[tile] = json.loads(value)
+        
+        if missing:
+            sql, params = cluster_query([tile for tile, _ in missing], zoom, MAP_CLUSTER_GRID,
+                                        event_filter, place_filter, start, end)
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            computed = split_clusters(cursor.fetchall(), [tile for tile, _ in missing], MAP_CLUSTER_GRID, IST)
+            cursor.close()
+            for tile, key in missing:
+                clusters[tile] = computed[tile]
+                response_cache.set_fragment(key, json.dumps(computed[tile]).encode('utf-8'))
+        
+        points = [cluster for tile in tiles for cluster in clusters[tile]]
+        return jsonify({
+            "success": True,
+            "zoom": zoom,
+            "tiles": len(tiles),
+            "clusters": points,
+            "total": sum(cluster['count'] for cluster in points)
+        })
+        
+    except Exception as e:
+        print(f"Error getting map points: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/export', methods=['GET'])
 def export_data():
-    """Export data as CSV"""
+    """Export data as CSV (streamed from a server-side cursor, or Postgres COPY with engine=copy) or as Parquet/Arrow"""
     try:
         format_type = request.args.get('format', 'csv')
         export_type = request.args.get('type', 'logs')  # logs, combined, places, tasks, events
+        engine = request.args.get('engine', 'stream')  # stream (Python csv writer) or copy (Postgres COPY)
         
         if format_type == 'csv':
+            if export_types(export_type) is None:
+                return jsonify({"error": "Invalid export type. Use: logs, places, tasks, events, or combined"}), 400
+            
+            if engine not in ('stream', 'copy'):
+                return jsonify({"error": "Invalid export engine. Use: stream or copy"}), 400
+            
+            prefix = COMBINED_FILENAME if export_type == 'combined' else EXPORTS[export_type]['filename']
+            filename = f'{prefix}_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
             conn = get_db_connection()
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
             
-            if export_type == 'logs':
-                cursor.execute("""
-                    SELECT l.id, l.timestamp AT TIME ZONE 'Asia/Kolkata' as timestamp, l.event, l.lat, l.lon, l.place_id, l.notes, l.duration_minutes, l.mode, p.name as place_name
-                    FROM logs l
-                    LEFT JOIN places p ON l.place_id = p.id
-                    ORDER BY l.timestamp DESC
-                """)
-                logs = cursor.fetchall()
-                
-                # Create CSV in memory
-                output = io.StringIO()
-                if logs:
-                    # Write header
-                    fieldnames = ['timestamp', 'event', 'lat', 'lon', 'place', 'notes', 'duration_minutes', 'mode']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    # Write data
-                    for log in logs:
-                        row = [
-                            log['timestamp'].isoformat() if log['timestamp'] else '',
-                            log['event'],
-                            str(log['lat']),
-                            str(log['lon']),
-                            log['place_name'] if log['place_name'] else 'unknown',
-                            log['notes'] if log['notes'] else '',
-                            str(log['duration_minutes']) if log['duration_minutes'] else '0',
-                            log['mode'] if log['mode'] else 'Manual'
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                filename = f'work_logs_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
-                
-            elif export_type == 'places':
-                cursor.execute("SELECT * FROM places ORDER BY name")
-                data = cursor.fetchall()
-                
-                output = io.StringIO()
-                if data:
-                    fieldnames = ['id', 'name', 'lat', 'lon', 'geofence_radius', 'type']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for place in data:
-                        row = [
-                            place['id'],
-                            place['name'],
-                            str(place['lat']),
-                            str(place['lon']),
-                            str(place['geofence_radius']) if place['geofence_radius'] else '0',
-                            place['type'] if place['type'] else ''
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                filename = f'work_places_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
-                
-            elif export_type == 'tasks':
-                cursor.execute("SELECT id, title, description, status, created_at AT TIME ZONE 'Asia/Kolkata' as created_at, completed_at AT TIME ZONE 'Asia/Kolkata' as completed_at, priority, due_by FROM tasks ORDER BY created_at DESC")
-                tasks = cursor.fetchall()
-                
-                output = io.StringIO()
-                if tasks:
-                    fieldnames = ['id', 'title', 'description', 'status', 'created_at', 'completed_at', 'priority', 'due_by']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for task in tasks:
-                        row = [
-                            task['id'],
-                            task['title'],
-                            task['description'] if task['description'] else '',
-                            task['status'],
-                            task['created_at'].isoformat() if task['created_at'] else '',
-                            task['completed_at'].isoformat() if task['completed_at'] else '',
-                            task['priority'] if task['priority'] else '',
-                            task['due_by'].isoformat() if task['due_by'] else ''
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                filename = f'work_tasks_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
-                
-            elif export_type == 'events':
-                cursor.execute("SELECT * FROM events ORDER BY date DESC")
-                data = cursor.fetchall()
-                
-                output = io.StringIO()
-                if data:
-                    fieldnames = ['id', 'title', 'description', 'date']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for event in data:
-                        row = [
-                            event['id'],
-                            event['title'],
-                            event['description'] if event['description'] else '',
-                            event['date'].isoformat() if event['date'] else ''
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                filename = f'work_events_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
-                
-            elif export_type == 'combined':
-                # Export all data in a single CSV with multiple sheets/sections
-                output = io.StringIO()
-                
-                # Section 1: Logs
-                cursor.execute("""
-                    SELECT l.id, l.timestamp AT TIME ZONE 'Asia/Kolkata' as timestamp, l.event, l.lat, l.lon, l.place_id, l.notes, l.duration_minutes, l.mode, p.name as place_name
-                    FROM logs l
-                    LEFT JOIN places p ON l.place_id = p.id
-                    ORDER BY l.timestamp DESC
-                """)
-                logs = cursor.fetchall()
-                
-                output.write('=== LOGS ===\n')
-                if logs:
-                    fieldnames = ['timestamp', 'event', 'lat', 'lon', 'place', 'notes', 'duration_minutes', 'mode']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for log in logs:
-                        row = [
-                            log['timestamp'].isoformat() if log['timestamp'] else '',
-                            log['event'],
-                            str(log['lat']),
-                            str(log['lon']),
-                            log['place_name'] if log['place_name'] else 'unknown',
-                            log['notes'] if log['notes'] else '',
-                            str(log['duration_minutes']) if log['duration_minutes'] else '0',
-                            log['mode'] if log['mode'] else 'Manual'
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                output.write('\n=== PLACES ===\n')
-                cursor.execute("SELECT * FROM places ORDER BY name")
-                places = cursor.fetchall()
-                
-                if places:
-                    fieldnames = ['id', 'name', 'lat', 'lon', 'geofence_radius', 'type']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for place in places:
-                        row = [
-                            place['id'],
-                            place['name'],
-                            str(place['lat']),
-                            str(place['lon']),
-                            str(place['geofence_radius']) if place['geofence_radius'] else '0',
-                            place['type'] if place['type'] else ''
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                output.write('\n=== TASKS ===\n')
-                cursor.execute("SELECT id, title, description, status, created_at AT TIME ZONE 'Asia/Kolkata' as created_at, completed_at AT TIME ZONE 'Asia/Kolkata' as completed_at, priority, due_by FROM tasks ORDER BY created_at DESC")
-                tasks = cursor.fetchall()
-                
-                if tasks:
-                    fieldnames = ['id', 'title', 'description', 'status', 'created_at', 'completed_at', 'priority', 'due_by']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for task in tasks:
-                        row = [
-                            task['id'],
-                            task['title'],
-                            task['description'] if task['description'] else '',
-                            task['status'],
-                            task['created_at'].isoformat() if task['created_at'] else '',
-                            task['completed_at'].isoformat() if task['completed_at'] else '',
-                            task['priority'] if task['priority'] else '',
-                            task['due_by'].isoformat() if task['due_by'] else ''
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                output.write('\n=== EVENTS ===\n')
-                cursor.execute("SELECT * FROM events ORDER BY date DESC")
-                events = cursor.fetchall()
-                
-                if events:
-                    fieldnames = ['id', 'title', 'description', 'date']
-                    output.write(','.join(fieldnames) + '\n')
-                    
-                    for event in events:
-                        row = [
-                            event['id'],
-                            event['title'],
-                            event['description'] if event['description'] else '',
-                            event['date'].isoformat() if event['date'] else ''
-                        ]
-                        output.write(','.join(row) + '\n')
-                
-                filename = f'worklog_combined_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
+            def generate():
+                try:
+                    with metrics.db_site(f'export:{export_type}:{engine}'):
+                        if engine == 'copy':
+                            # Postgres formats the CSV itself; bytes are relayed as they arrive
+                            yield from stream_copy(conn, export_type)
+                        else:
+                            for chunk in stream_csv(conn, export_type, EXPORT_CHUNK_SIZE):
+                                yield chunk.encode('utf-8')
+                except Exception as e:
+                    # Headers are already sent; all we can do is stop the stream
+                    print(f"Error streaming export: {e}")
             
-            else:
-                cursor.close()
-                conn.close()
-                return jsonify({"error": "Invalid export type. Use: logs, places, tasks, events, or combined"}), 400
+            return Response(
+                stream_with_context(generate()),
+                mimetype='text/csv',
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+        elif format_type in COLUMNAR_FORMATS:
+            if export_type not in EXPORTS:
+                return jsonify({"error": "Invalid export type for columnar formats. Use: logs, places, tasks, or events"}), 400
+            if pa is None:
+                return jsonify({"error": f"Export format '{format_type}' requires pyarrow to be installed"}), 501
             
-            cursor.close()
-            conn.close()
-            
-            # Create file-like object for Flask
-            output.seek(0)
-            csv_data = io.BytesIO()
-            csv_data.write(output.getvalue().encode('utf-8'))
-            csv_data.seek(0)
-            
-            return send_file(
-                csv_data,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='text/csv'
+            extension, mimetype = COLUMNAR_FORMATS[format_type]
+            filename = f'{EXPORTS[export_type]["filename"]}_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.{extension}'
+            conn = get_db_connection()
+            
+            def generate():
+                try:
+                    with metrics.db_site(f'export:{export_type}:{format_type}'):
+                        yield from stream_columnar(conn, export_type, format_type, EXPORT_COLUMNAR_CHUNK_SIZE)
+                except Exception as e:
+                    print(f"Error streaming {format_type} export: {e}")
+            
+            return Response(
+                stream_with_context(generate()),
+                mimetype=mimetype,
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
             )
         else:
-            return jsonify({"error": "Unsupported format"}), 400
+            return jsonify({"error": "Unsupported format. Use: csv, parquet, or arrow"}), 400
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/events', methods=['GET', 'POST'])
+@response_cache.cached('events')
 def events():
     """Get or add events (journal entries)"""
     try:
@@ -916,7 +1486,6 @@ def events():
             events = cursor.fetchall()
             
             cursor.close()
-            conn.close()
             
             return jsonify({"success": True, "events": events})
         
@@ -939,16 +1508,18 @@ def events():
             cursor.execute("""
                 INSERT INTO events (id, title, description, date)
                 VALUES (%s, %s, %s, %s)
+                RETURNING date
             """, (
                 new_id,
                 data['title'],
                 data['description'],
                 data['date']
             ))
+            record_day_counts(cursor, 'events_count', moved_day_rows(new_day=cursor.fetchone()[0]))
             
             conn.commit()
+            response_cache.invalidate('events')
             cursor.close()
-            conn.close()
             
             new_event = {
                 "id": new_id,
@@ -993,39 +1564,43 @@ def update_event(event_id):
                 params.append(data['date'])
             
             if updates:
-                params.append(event_id)
+                # Return the previous date too so the day summaries can be adjusted
                 cursor.execute(f"""
+                    WITH old AS (SELECT id, date FROM events WHERE id = %s FOR UPDATE)
                     UPDATE events 
                     SET {', '.join(updates)}
-                    WHERE id = %s
-                """, params)
+                    FROM old
+                    WHERE events.id = old.id
+                    RETURNING old.date, events.date
+                """, [event_id] + params)
+                result = cursor.fetchone()
                 
-                if cursor.rowcount == 0:
+                if result is None:
                     cursor.close()
-                    conn.close()
                     return jsonify({"error": "Event not found"}), 404
                 
+                record_day_counts(cursor, 'events_count', moved_day_rows(result[0], result[1]))
                 conn.commit()
+                response_cache.invalidate('events')
                 cursor.close()
-                conn.close()
             
                 return jsonify({"success": True, "message": f"Event {event_id} updated"})
             else:
                 cursor.close()
-                conn.close()
                 return jsonify({"error": "No fields to update"}), 400
         
         elif request.method == 'DELETE':
-            cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+            cursor.execute("DELETE FROM events WHERE id = %s RETURNING date", (event_id,))
+            result = cursor.fetchone()
             
-            if cursor.rowcount == 0:
+            if result is None:
                 cursor.close()
-                conn.close()
                 return jsonify({"error": "Event not found"}), 404
             
+            record_day_counts(cursor, 'events_count', moved_day_rows(old_day=result[0]))
             conn.commit()
+            response_cache.invalidate('events')
             cursor.close()
-            conn.close()
             
             return jsonify({"success": True, "message": f"Event {event_id} deleted"})
             
@@ -1035,6 +1610,8 @@ def update_event(event_id):
 if __name__ == '__main__':
     # Initialize database on startup
     init_database()
+    if ingest_queue is not None:
+        ingest_queue.start()
     
     port = int(os.environ.get('PORT', 5051))
     debug = os.environ.get('FLASK_ENV') != 'production'
@@ -0,0 +1,1332 @@
+"""asyncio variant of the API (Quart + asyncpg).
+
+Same routes and JSON shapes as app.py. Handlers await the database instead of
+holding a worker thread, so one process can serve many concurrent ingest
+clients. Migrations still use migrate.py (psycopg2) once at startup.
+
+Run with: hypercorn async_app:app --bind 0.0.0.0:5051
+Requires requirements-async.txt.
+"""
+import asyncio
+import base64
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
+
+import asyncpg
+import psycopg2
+from dotenv import load_dotenv
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+
+from ingest import (prepare_event, parse_timestamp, plan_rows, ingest_results, insert_log_query, insert_logs_query,
+                    existing_places_query)
+from migrate import run_migrations
+from places_index import PlacesIndex
+from rollups import log_rollup_rows, task_status_rows, log_rollup_query, task_status_query, release_place_query, DASHBOARD_SQL
+from visits import (PAIRED_EVENTS, VISIT_COLUMNS, elapsed_minutes, place_key, plan_visits, open_visits_query,
+                    latest_paired_query, close_visits_query, insert_visits_query, release_place_visits_query,
+                    repair_points, repair_visits_query)
+from daily import (day_log_rows, moved_day_rows, completion_day, day_json, parse_day_entries, upsert_day_logs_query,
+                   remove_day_logs_query, day_counts_query, daily_log_query, save_day_query)
+from sqlparams import Params
+from analytics import BUCKETS, parse_group_by, bucket_starts, timeseries_query, timeseries_json
+from track import track_query, track_json
+from map_tiles import MAX_ZOOM, parse_bbox, tiles_for_bbox, cluster_query, split_clusters
+from exports import (EXPORTS, COMBINED_FILENAME, COLUMNAR_FORMATS, export_types, csv_section, csv_header, format_csv,
+                     ColumnarWriter, pa)
+
+# Load environment variables
+load_dotenv('.env.production')
+
+app = Quart(__name__)
+app = cors(app, allow_origin=['http://13.40.49.46:3000', 'http://localhost:3000', 'http://0.0.0.0:3000'])
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'NOURLHERE')
+
+# IST timezone
+IST = timezone(timedelta(hours=5, minutes=30))
+
+BATCH_MAX_EVENTS = int(os.getenv('BATCH_MAX_EVENTS', 10000))
+LOGS_PAGE_SIZE = int(os.getenv('LOGS_PAGE_SIZE', 100))
+LOGS_MAX_LIMIT = int(os.getenv('LOGS_MAX_LIMIT', 1000))
+DAILY_LOG_MAX_DAYS = int(os.getenv('DAILY_LOG_MAX_DAYS', 366))
+ANALYTICS_MAX_BUCKETS = int(os.getenv('ANALYTICS_MAX_BUCKETS', 1000))
+MAP_MAX_TILES = int(os.getenv('MAP_MAX_TILES', 64))
+MAP_CLUSTER_GRID = int(os.getenv('MAP_CLUSTER_GRID', 8))
+TRACK_MAX_DAYS = int(os.getenv('TRACK_MAX_DAYS', 366))
+TRACK_TOLERANCE_M = float(os.getenv('TRACK_TOLERANCE_M', 10))
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+EXPORT_COLUMNAR_CHUNK_SIZE = int(os.getenv('EXPORT_COLUMNAR_CHUNK_SIZE', 50000))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+PLACES_INDEX_TTL = float(os.getenv('PLACES_INDEX_TTL', 300))
+
+# Created in before_serving (asyncpg pools are bound to the running event loop)
+db_pool = None
+
+# Checkout and connection counters for /api/pool/stats, under the keys db_pool.ConnectionPool.stats()
+# uses in app.py (asyncpg's pool only reports its sizes)
+pool_counters = {
+    "checkouts": 0,
+    "connections_opened": 0,
+    "connections_closed": 0,
+    "connections_recycled": 0,
+    "health_check_failures": 0,
+    "timeouts": 0,
+    "wait_count": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "opening": 0,
+    "waiting": 0,
+}
+
+def connection_closed(conn):
+    pool_counters["connections_closed"] += 1
+
+async def connect(*args, **kwargs):
+    """create_pool connect hook counting the connections the pool opens and closes"""
+    pool_counters["opening"] += 1
+    try:
+        conn = await asyncpg.connect(*args, **kwargs)
+    finally:
+        pool_counters["opening"] -= 1
+    pool_counters["connections_opened"] += 1
+    conn.add_termination_listener(connection_closed)
+    return conn
+
+@app.before_serving
+async def startup():
+    """Apply migrations, open the connection pool and load the places index"""
+    global db_pool
+
+    def migrate():
+        conn = psycopg2.connect(DATABASE_URL, connect_timeout=10)
+        try:
+            run_migrations(conn)
+        finally:
+            conn.close()
+
+    await asyncio.to_thread(migrate)
+    db_pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+        max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        max_inactive_connection_lifetime=float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+        connect=connect,
+        timeout=10
+    )
+    await refresh_places()
+    print("✅ Async backend ready")
+
+@app.after_serving
+async def shutdown():
+    if db_pool is not None:
+        await db_pool.close()
+
+@asynccontextmanager
+async def acquire():
+    """Pooled connection, waiting at most DB_POOL_TIMEOUT for one to free up"""
+    started = time.monotonic()
+    # No idle connection and no room for another: this checkout waits for a release
+    waits = int(db_pool.get_idle_size() == 0 and db_pool.get_size() >= db_pool.get_max_size())
+    pool_counters["waiting"] += waits
+    try:
+        conn = await db_pool.acquire(timeout=DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        pool_counters["timeouts"] += 1
+        raise
+    finally:
+        pool_counters["waiting"] -= waits
+    wait = time.monotonic() - started
+    pool_counters["checkouts"] += 1
+    pool_counters["wait_count"] += waits
+    pool_counters["wait_seconds_total"] += wait
+    pool_counters["wait_seconds_max"] = max(pool_counters["wait_seconds_max"], wait)
+    try:
+        yield conn
+    finally:
+        await db_pool.release(conn)
+
+# Geofence index; the rows are fetched asynchronously and handed to the index as a snapshot
+places_snapshot = {"rows": [], "loaded_at": 0.0}
+places_index = PlacesIndex(
+    lambda: places_snapshot["rows"],
+    cell_deg=float(os.getenv('PLACES_INDEX_CELL_DEG', 0.01)),
+    ttl=float('inf')
+)
+
+async def refresh_places():
+    """Reload places from the database and rebuild the geofence index"""
+    rows = await db_pool.fetch("SELECT id, name, lat, lon, geofence_radius FROM places")
+    places_snapshot["rows"] = [dict(row) for row in rows]
+    places_snapshot["loaded_at"] = time.monotonic()
+    places_index.invalidate()
+
+async def get_place_from_location(lat, lon):
+    """Determine which place the location belongs to; (None, "unknown") outside every geofence"""
+    try:
+        if time.monotonic() - places_snapshot["loaded_at"] >= PLACES_INDEX_TTL:
+            await refresh_places()
+        match = places_index.lookup(lat, lon)
+        if match:
+            return match[0], match[1]
+    except Exception as e:
+        print(f"Error getting place from location: {e}")
+    return None, "unknown"
+
+async def get_places_from_locations(points):
+    """get_place_from_location() for a list of (lat, lon) in one vectorized pass"""
+    try:
+        if time.monotonic() - places_snapshot["loaded_at"] >= PLACES_INDEX_TTL:
+            await refresh_places()
+        return [(match[0], match[1]) if match else (None, "unknown") for match in places_index.lookup_many(points)]
+    except Exception as e:
+        print(f"Error getting places from locations: {e}")
+    return [(None, "unknown")] * len(points)
+
+async def record_logs(conn, logs, sign=1):
+    """Async counterpart of rollups.record_logs"""
+    rows = log_rollup_rows(logs, sign)
+    if rows:
+        sql, params = log_rollup_query(rows, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+
+async def record_day_logs(conn, logs):
+    """Async counterpart of daily.record_day_logs"""
+    rows = day_log_rows(logs)
+    if rows:
+        sql, params = upsert_day_logs_query(rows, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+
+async def remove_day_logs(conn, logs):
+    """Async counterpart of daily.remove_day_logs"""
+    rows = [(day, count) for day, count, _, _, _ in day_log_rows(logs)]
+    if rows:
+        sql, params = remove_day_logs_query(rows, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+
+async def record_day_counts(conn, column, rows):
+    """Async counterpart of daily.record_day_counts"""
+    if rows:
+        sql, params = day_counts_query(column, rows, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+
+async def read_days(conn, start, end):
+    """Async counterpart of daily.read_days (asyncpg returns json columns as text)"""
+    sql, params = daily_log_query(start, end, paramstyle='asyncpg')
+    rows = await conn.fetch(sql, *params)
+    return [{**row, "entries": json.loads(row['entries']), "places": json.loads(row['places'])} for row in rows]
+
+async def record_task_status(conn, old_status=None, new_status=None, created=False, deleted=False):
+    """Async counterpart of rollups.record_task_status"""
+    rows = task_status_rows(old_status, new_status, created, deleted)
+    if rows:
+        sql, params = task_status_query(rows, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+
+async def insert_log(conn, timestamp, event, lat, lon, place_id, notes, duration_minutes, mode, auto_duration=False):
+    """Insert a log row in one statement (see ingest.insert_log_query); returns (id, duration_minutes)"""
+    sql, params = insert_log_query(timestamp, event, lat, lon, place_id, notes, duration_minutes, mode, auto_duration,
+                                   paramstyle='asyncpg')
+    row = await conn.fetchrow(sql, *params)
+    return row['id'], row['duration_minutes']
+
+async def record_visits(conn, closes, inserts, log_ids):
+    """Async counterpart of visits.record_visits (without the return value: there is no open-visit map here)"""
+    if closes:
+        sql, params = close_visits_query(closes, log_ids, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+    if inserts:
+        sql, params = insert_visits_query(inserts, log_ids, paramstyle='asyncpg')
+        await conn.execute(sql, *params)
+
+async def ingest_events(conn, events):
+    """Async counterpart of ingest.ingest_events (same pairing and result shape)"""
+    if not events:
+        return []
+
+    order = sorted(range(len(events)), key=lambda i: events[i]['timestamp'])
+    ordered = [events[i] for i in order]
+
+    places = await get_places_from_locations([(e['lat'], e['lon']) for e in ordered])
+    candidate_ids = sorted({place_id for place_id, _ in places if place_id is not None})
+    if candidate_ids:
+        sql, params = existing_places_query(candidate_ids, paramstyle='asyncpg')
+        existing = {row['id'] for row in await conn.fetch(sql, *params)}
+        places = [(place_id, name) if place_id in existing else (None, "unknown") for place_id, name in places]
+
+    keys = sorted({place_key(place_id) for (place_id, _), e in zip(places, ordered) if e['event'] in PAIRED_EVENTS})
+    stored_visits, latest = {}, {}
+    if keys:
+        sql, params = open_visits_query(keys, paramstyle='asyncpg')
+        rows = await conn.fetch(sql, *params)
+        stored_visits = {row['key']: {"id": row['id'], "arrived_at": row['arrived_at']} for row in rows}
+        sql, params = latest_paired_query(keys, paramstyle='asyncpg')
+        rows = await conn.fetch(sql, *params)
+        latest = {row['key']: row['latest'] for row in rows if row['latest'] is not None}
+
+    durations, closes, visit_rows = plan_visits(ordered, places, stored_visits, latest)
+    rows = plan_rows(ordered, places, durations)
+    sql, params = insert_logs_query(rows, paramstyle='asyncpg')
+    inserted = await conn.fetch(sql, *params)
+    ids = [row['id'] for row in inserted]
+    await record_visits(conn, closes, visit_rows, ids)
+    logs = [(row[0], row[4], row[1], row[6]) for row in rows]
+    await record_logs(conn, logs)
+    await record_day_logs(conn, logs)
+    return ingest_results(len(events), order, ordered, ids, places)
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({"status": "healthy", "timestamp": datetime.now(IST).isoformat()})
+
+@app.route('/health', methods=['GET'])
+async def health_check_alt():
+    """Alternative health check endpoint"""
+    return jsonify({"status": "healthy", "timestamp": datetime.now(IST).isoformat()})
+
+@app.route('/api/pool/stats', methods=['GET'])
+async def pool_stats():
+    """Connection pool usage (in-use, idle, wait time) under the same keys as app.py.
+
+    There is no response cache or write-behind queue here, so "cache" and
+    "ingest_queue" are absent. asyncpg doesn't say why it closes a connection:
+    every close counts in connections_closed, and connections_recycled and
+    health_check_failures stay 0.
+    """
+    size = db_pool.get_size()
+    idle = db_pool.get_idle_size()
+    pool = dict(pool_counters)
+    pool.update({
+        "in_use": size - idle,
+        "idle": idle,
+        "size": size,
+        "min_size": db_pool.get_min_size(),
+        "max_size": db_pool.get_max_size()
+    })
+    return jsonify({"success": True, "pool": pool})
+
+@app.route('/api/log', methods=['POST'])
+async def log_event():
+    """Log a new event"""
+    try:
+        data = await request.get_json()
+
+        # Validate required fields
+        required_fields = ['event', 'lat', 'lon']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        # Extract data
+        event = data['event']
+        lat = float(data['lat'])
+        lon = float(data['lon'])
+        notes = data.get('notes', '')
+        duration_minutes = data.get('duration_minutes', 0)
+        source = data.get('source', 'manual')
+
+        place_id, place_name = await get_place_from_location(lat, lon)
+        timestamp = datetime.now(IST)
+        mode = 'iPhone' if source == 'iphone' else 'Manual'
+
+        async with acquire() as conn:
+            await insert_log(conn, timestamp, event, lat, lon, place_id, notes, duration_minutes, mode,
+                             auto_duration=(event == 'exit' and duration_minutes == 0))
+
+        return jsonify({
+            "success": True,
+            "message": f"Event '{event}' logged successfully",
+            "timestamp": timestamp.isoformat(),
+            "place": place_name
+        })
+
+    except Exception as e:
+        print(f"Error logging event: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/log/batch', methods=['POST'])
+async def log_events_batch():
+    """Log many events at once (JSON array or NDJSON) - for replaying offline-buffered events"""
+    try:
+        # Parse body: a JSON array, {"events": [...]}, or one JSON object per line
+        items = []
+        parse_errors = {}
+        if request.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            body = await request.get_data(as_text=True)
+            lines = [line for line in body.splitlines() if line.strip()]
+            for index, line in enumerate(lines):
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(None)
+                    parse_errors[index] = "Invalid JSON"
+        else:
+            data = await request.get_json(silent=True)
+            if isinstance(data, dict):
+                data = data.get('events')
+            if not isinstance(data, list):
+                return jsonify({"error": "Body must be a JSON array of events, {\"events\": [...]}, or NDJSON"}), 400
+            items = data
+
+        if len(items) > BATCH_MAX_EVENTS:
+            return jsonify({"error": f"Too many events in batch (max {BATCH_MAX_EVENTS})"}), 413
+
+        now = datetime.now(IST)
+        results = [None] * len(items)
+        valid_indexes = []
+        prepared = []
+        for index, item in enumerate(items):
+            if index in parse_errors:
+                results[index] = {"index": index, "success": False, "error": parse_errors[index]}
+                continue
+            try:
+                prepared.append(prepare_event(item, now, IST))
+                valid_indexes.append(index)
+            except ValueError as e:
+                results[index] = {"index": index, "success": False, "error": str(e)}
+
+        if prepared:
+            async with acquire() as conn:
+                async with conn.transaction():
+                    inserted = await ingest_events(conn, prepared)
+            for index, result in zip(valid_indexes, inserted):
+                results[index] = {"index": index, **result}
+
+        return jsonify({
+            "success": True,
+            "inserted": len(prepared),
+            "failed": len(items) - len(prepared),
+            "results": results
+        })
+
+    except Exception as e:
+        print(f"Error logging batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/<event>/<lat>/<lon>', methods=['GET', 'POST'])
+async def log_event_url_params(event, lat, lon):
+    """Log event using URL parameters - perfect for iPhone automation"""
+    try:
+        if event not in ['arrive', 'exit']:
+            return jsonify({"error": "Event must be 'arrive' or 'exit'"}), 400
+
+        try:
+            lat_float = float(lat)
+            lon_float = float(lon)
+        except ValueError:
+            return jsonify({"error": "Invalid latitude or longitude format"}), 400
+
+        timestamp = datetime.now(IST)
+        place_id, place_name = await get_place_from_location(lat_float, lon_float)
+
+        if place_name and place_name != 'unknown':
+            notes = f"Automated {event} at {place_name}"
+        else:
+            notes = f"Automated {event} at {lat_float:.4f}, {lon_float:.4f}"
+
+        async with acquire() as conn:
+            _, duration_minutes = await insert_log(conn, timestamp, event, lat_float, lon_float, place_id, notes, 0,
+                                                   'iPhone', auto_duration=(event == 'exit'))
+
+        return jsonify({
+            "success": True,
+            "message": f"Event '{event}' logged successfully",
+            "timestamp": timestamp.isoformat(),
+            "place": place_name,
+            "coordinates": f"{lat_float:.4f}, {lon_float:.4f}",
+            "duration_minutes": duration_minutes
+        })
+
+    except Exception as e:
+        print(f"Error logging event via URL params: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def encode_log_cursor(timestamp, log_id):
+    """Opaque keyset cursor for a log row: its (timestamp, id) position"""
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_log_cursor(cursor_value):
+    """Inverse of encode_log_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        timestamp, log_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor_value}")
+
+def range_bound(params, value, upper=False, column="l.timestamp"):
+    """SQL condition for a from/to bound (YYYY-MM-DD in IST days, or an ISO 8601 datetime); raises ValueError"""
+    if len(value) == 10:
+        date.fromisoformat(value)
+        bound = params.add(value)
+        if upper:
+            return f"{column} < ({bound}::text::date + 1)::timestamp AT TIME ZONE 'Asia/Kolkata'"
+        return f"{column} >= {bound}::text::date::timestamp AT TIME ZONE 'Asia/Kolkata'"
+    bound = params.add(parse_timestamp(value, IST))
+    return f"{column} {'<=' if upper else '>='} {bound}::timestamptz"
+
+@app.route('/api/logs', methods=['GET'])
+async def get_logs():
+    """Get logs with optional filtering and keyset pagination (see app.get_logs)"""
+    try:
+        before = request.args.get('before')
+        after = request.args.get('after')
+        limit = request.args.get('limit')
+        if before and after:
+            return jsonify({"error": "Use either 'before' or 'after', not both"}), 400
+        try:
+            cursor_position = decode_log_cursor(before or after) if (before or after) else None
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError("limit must be positive")
+                limit = min(limit, LOGS_MAX_LIMIT)
+            elif cursor_position:
+                limit = LOGS_PAGE_SIZE
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        paginated = limit is not None
+
+        query = """
+            SELECT l.id, l.timestamp AS cursor_ts, l.timestamp AT TIME ZONE 'Asia/Kolkata' as timestamp, l.event, l.lat, l.lon, l.place_id, l.notes, l.duration_minutes, l.mode, p.name as place_name
+            FROM logs l
+            LEFT JOIN places p ON l.place_id = p.id
+        """
+        conditions = []
+        params = Params('asyncpg')
+
+        date_filter = request.args.get('date')
+        event_filter = request.args.get('event')
+        place_filter = request.args.get('place')
+
+        if date_filter:
+            day = params.add(date_filter)
+            conditions.append(f"l.timestamp >= {day}::text::date::timestamp AT TIME ZONE 'Asia/Kolkata' "
+                              f"AND l.timestamp < ({day}::text::date + 1)::timestamp AT TIME ZONE 'Asia/Kolkata'")
+
+        try:
+            for name, upper in (('from', False), ('to', True)):
+                if request.args.get(name):
+                    conditions.append(range_bound(params, request.args[name], upper))
+        except ValueError:
+            return jsonify({"error": "Invalid 'from'/'to': use YYYY-MM-DD or an ISO 8601 datetime"}), 400
+
+        if event_filter:
+            conditions.append(f"l.event = {params.add(event_filter)}")
+        if place_filter:
+            conditions.append(f"p.name = {params.add(place_filter)}")
+        if cursor_position:
+            position = f"({params.add(cursor_position[0])}::timestamptz, {params.add(cursor_position[1])}::int)"
+            conditions.append(f"(l.timestamp, l.id) {'<' if before else '>'} {position}")
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY l.timestamp ASC, l.id ASC" if after else " ORDER BY l.timestamp DESC, l.id DESC"
+        if paginated:
+            query += f" LIMIT {params.add(limit + 1)}"
+
+        async with acquire() as conn:
+            logs = await conn.fetch(query, *params)
+
+        has_more = paginated and len(logs) > limit
+        if has_more:
+            logs = logs[:limit]
+        if after:
+            logs.reverse()
+
+        logs_list = []
+        for log in logs:
+            logs_list.append({
+                'id': log['id'],
+                'timestamp': log['timestamp'].isoformat() if log['timestamp'] else None,
+                'event': log['event'],
+                'lat': float(log['lat']),
+                'lon': float(log['lon']),
+                'place': log['place_name'] if log['place_name'] else 'unknown',
+                'notes': log['notes'] if log['notes'] else '',
+                'duration_minutes': int(log['duration_minutes']) if log['duration_minutes'] else 0,
+                'mode': log['mode'] if log['mode'] else 'Manual',
+                'date': log['timestamp'].date().isoformat() if log['timestamp'] else None,
+                'time': log['timestamp'].time().isoformat() if log['timestamp'] else None
+            })
+
+        response = {
+            "success": True,
+            "logs": logs_list,
+            "total": len(logs_list)
+        }
+        if paginated:
+            older = (has_more and not after) or bool(after)
+            newer = (has_more and bool(after)) or bool(before)
+            response["has_more"] = older
+            response["next_cursor"] = encode_log_cursor(logs[-1]['cursor_ts'], logs[-1]['id']) if logs and older else None
+            response["prev_cursor"] = encode_log_cursor(logs[0]['cursor_ts'], logs[0]['id']) if logs and newer else None
+
+        return jsonify(response)
+
+    except Exception as e:
+        print(f"Error getting logs: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/logs/<int:log_id>', methods=['DELETE'])
+async def delete_log(log_id):
+    """Delete a log entry by ID"""
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                deleted = await conn.fetch(
+                    "DELETE FROM logs WHERE id = $1 RETURNING timestamp, place_id, event, duration_minutes", log_id
+                )
+                if not deleted:
+                    return jsonify({"error": "Log entry not found"}), 404
+                deleted = [tuple(row) for row in deleted]
+                await record_logs(conn, deleted, sign=-1)
+                await remove_day_logs(conn, deleted)
+                # Re-pair the visits the log was part of (the FK only nulled its id in them)
+                points = repair_points(deleted)
+                if points:
+                    sql, params = repair_visits_query(points, paramstyle='asyncpg')
+                    await conn.execute(sql, *params)
+
+        return jsonify({
+            "success": True,
+            "message": "Log entry deleted successfully"
+        })
+
+    except Exception as e:
+        print(f"Error deleting log: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def visit_json(visit):
+    """JSON form of a visits row joined with its place name (IST timestamps)"""
+    return {
+        "id": visit['id'],
+        "place_id": visit['place_id'],
+        "place": visit['place_name'] if visit['place_name'] else 'unknown',
+        "arrived_at": visit['arrived_at'].astimezone(IST).isoformat() if visit['arrived_at'] else None,
+        "exited_at": visit['exited_at'].astimezone(IST).isoformat() if visit['exited_at'] else None,
+        "duration_minutes": visit['duration_minutes'],
+        "open": visit['open'],
+        "arrive_log_id": visit['arrive_log_id'],
+        "exit_log_id": visit['exit_log_id']
+    }
+
+@app.route('/api/visits', methods=['GET'])
+async def get_visits():
+    """Visits (arrive/exit pairs per place), newest first, one page at a time (see app.get_visits)"""
+    try:
+        try:
+            limit = min(int(request.args.get('limit', LOGS_PAGE_SIZE)), LOGS_MAX_LIMIT)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            before = request.args.get('before')
+            cursor_position = decode_log_cursor(before) if before else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        conditions = []
+        params = Params('asyncpg')
+        place_filter = request.args.get('place')
+        if place_filter:
+            conditions.append(f"p.name = {params.add(place_filter)}")
+        open_filter = request.args.get('open')
+        if open_filter is not None:
+            conditions.append(f"v.open = {params.add(open_filter.lower() == 'true')}::boolean")
+        try:
+            for name, upper in (('from', False), ('to', True)):
+                if request.args.get(name):
+                    conditions.append(range_bound(params, request.args[name], upper, "COALESCE(v.arrived_at, v.exited_at)"))
+        except ValueError:
+            return jsonify({"error": "Invalid 'from'/'to': use YYYY-MM-DD or an ISO 8601 datetime"}), 400
+        if cursor_position:
+            position = f"({params.add(cursor_position[0])}::timestamptz, {params.add(cursor_position[1])}::int)"
+            conditions.append(f"(COALESCE(v.arrived_at, v.exited_at), v.id) < {position}")
+
+        async with acquire() as conn:
+            visits = await conn.fetch(f"""
+                SELECT {VISIT_COLUMNS}, COALESCE(v.arrived_at, v.exited_at) AS started_at, p.name AS place_name
+                FROM visits v
+                LEFT JOIN places p ON p.id = v.place_id
+                {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                ORDER BY COALESCE(v.arrived_at, v.exited_at) DESC, v.id DESC
+                LIMIT {params.add(limit + 1)}
+            """, *params)
+
+        has_more = len(visits) > limit
+        visits = visits[:limit]
+        return jsonify({
+            "success": True,
+            "visits": [visit_json(visit) for visit in visits],
+            "total": len(visits),
+            "has_more": has_more,
+            "next_cursor": encode_log_cursor(visits[-1]['started_at'], visits[-1]['id']) if has_more else None
+        })
+
+    except Exception as e:
+        print(f"Error getting visits: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/visits/open', methods=['GET'])
+async def get_open_visits():
+    """Visits still in progress (read through the open-visit index)"""
+    try:
+        async with acquire() as conn:
+            visits = await conn.fetch("""
+                SELECT v.id, v.place_id, v.arrived_at, p.name AS place_name
+                FROM visits v
+                LEFT JOIN places p ON p.id = v.place_id
+                WHERE v.open
+                ORDER BY v.arrived_at DESC
+            """)
+        now = datetime.now(IST)
+        return jsonify({
+            "success": True,
+            "visits": [{
+                "id": visit['id'],
+                "place_id": visit['place_id'],
+                "place": visit['place_name'] if visit['place_name'] else 'unknown',
+                "arrived_at": visit['arrived_at'].astimezone(IST).isoformat(),
+                "minutes_so_far": elapsed_minutes(visit['arrived_at'], now)
+            } for visit in visits]
+        })
+
+    except Exception as e:
+        print(f"Error getting open visits: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/visits/summary', methods=['GET'])
+async def visits_summary():
+    """Time at each place from completed visits, optionally within from/to (visit start)"""
+    try:
+        conditions = ["v.exited_at IS NOT NULL", "v.arrived_at IS NOT NULL"]
+        params = Params('asyncpg')
+        try:
+            for name, upper in (('from', False), ('to', True)):
+                if request.args.get(name):
+                    conditions.append(range_bound(params, request.args[name], upper, "v.arrived_at"))
+        except ValueError:
+            return jsonify({"error": "Invalid 'from'/'to': use YYYY-MM-DD or an ISO 8601 datetime"}), 400
+
+        async with acquire() as conn:
+            places = await conn.fetch(f"""
+                SELECT COALESCE(p.name, 'unknown') AS place, COUNT(*) AS visits,
+                       COALESCE(SUM(v.duration_minutes), 0) AS total_minutes,
+                       ROUND(AVG(v.duration_minutes), 1) AS average_minutes,
+                       MAX(v.exited_at) AS last_exited_at
+                FROM visits v
+                LEFT JOIN places p ON p.id = v.place_id
+                WHERE {" AND ".join(conditions)}
+                GROUP BY 1
+                ORDER BY total_minutes DESC
+            """, *params)
+
+        return jsonify({
+            "success": True,
+            "places": [{
+                "place": row['place'],
+                "visits": row['visits'],
+                "total_minutes": int(row['total_minutes']),
+                "average_minutes": float(row['average_minutes']) if row['average_minutes'] is not None else None,
+                "last_exited_at": row['last_exited_at'].astimezone(IST).isoformat() if row['last_exited_at'] else None
+            } for row in places]
+        })
+
+    except Exception as e:
+        print(f"Error getting visits summary: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/daily-log', methods=['GET', 'POST'])
+async def daily_log():
+    """One day's log (?date=...) or every day in ?from=...&to=... (see app.daily_log); POST saves notes and tasks"""
+    try:
+        if request.method == 'GET':
+            try:
+                if request.args.get('from') or request.args.get('to'):
+                    start = date.fromisoformat(request.args.get('from', ''))
+                    end = date.fromisoformat(request.args.get('to', ''))
+                    if end < start:
+                        raise ValueError
+                else:
+                    start = end = date.fromisoformat(request.args['date']) if request.args.get('date') else datetime.now(IST).date()
+            except ValueError:
+                return jsonify({"error": "Use ?date=YYYY-MM-DD or ?from=YYYY-MM-DD&to=YYYY-MM-DD"}), 400
+            if (end - start).days >= DAILY_LOG_MAX_DAYS:
+                return jsonify({"error": f"Range too long (at most {DAILY_LOG_MAX_DAYS} days)"}), 400
+
+            async with acquire() as conn:
+                days = await read_days(conn, start, end)
+
+            if request.args.get('from'):
+                return jsonify({"success": True, "days": [day_json(day) for day in days]})
+            return jsonify({"success": True, "log": day_json(days[0])})
+
+        data = await request.get_json()
+        if not isinstance(data, dict) or not data.get('date'):
+            return jsonify({"error": "Missing required field: date"}), 400
+        try:
+            day = date.fromisoformat(str(data['date'])[:10])
+            notes, entries = parse_day_entries(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        async with acquire() as conn:
+            sql, params = save_day_query(day, notes, json.dumps(entries) if entries is not None else None,
+                                         paramstyle='asyncpg')
+            await conn.execute(sql, *params)
+            saved = await read_days(conn, day, day)
+
+        return jsonify({"success": True, "log": day_json(saved[0])})
+
+    except Exception as e:
+        print(f"Error handling daily log: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/places', methods=['GET', 'POST'])
+async def places():
+    """Get or add places"""
+    try:
+        if request.method == 'GET':
+            async with acquire() as conn:
+                places = await conn.fetch("SELECT * FROM places ORDER BY name")
+            return jsonify({"success": True, "places": [dict(place) for place in places]})
+
+        data = await request.get_json()
+
+        required_fields = ['name', 'lat', 'lon', 'geofence_radius']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        new_place = {
+            "id": data['name'],  # Use name as ID
+            "name": data['name'],
+            "lat": float(data['lat']),
+            "lon": float(data['lon']),
+            "geofence_radius": int(data['geofence_radius']),
+            "type": data.get('type', 'custom')
+        }
+
+        async with acquire() as conn:
+            if await conn.fetchval("SELECT id FROM places WHERE name = $1", data['name']):
+                return jsonify({"error": f"Place '{data['name']}' already exists"}), 400
+            await conn.execute("""
+                INSERT INTO places (id, name, lat, lon, geofence_radius, type)
+                VALUES ($1, $2, $3, $4, $5, $6)
+            """, *new_place.values())
+        await refresh_places()
+
+        return jsonify({
+            "success": True,
+            "message": f"Place '{data['name']}' added successfully",
+            "place": new_place
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/places/<place_id>', methods=['DELETE'])
+async def delete_place(place_id):
+    """Delete a place"""
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                # Its open visit is closed first so the one-open-visit-per-place index stays valid
+                sql, params = release_place_visits_query(place_id, paramstyle='asyncpg')
+                await conn.execute(sql, *params)
+                result = await conn.execute("DELETE FROM places WHERE id = $1", place_id)
+                if result == 'DELETE 0':
+                    return jsonify({"error": "Place not found"}), 404
+
+                # Its logs now have place_id = NULL; move their rollup counts along with them
+                sql, params = release_place_query(place_id, paramstyle='asyncpg')
+                await conn.execute(sql, *params)
+        await refresh_places()
+
+        return jsonify({"success": True, "message": f"Place {place_id} deleted"})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/tasks', methods=['GET', 'POST'])
+async def tasks():
+    """Get or add tasks"""
+    try:
+        if request.method == 'GET':
+            async with acquire() as conn:
+                tasks = await conn.fetch("SELECT id, title, description, status, created_at AT TIME ZONE 'Asia/Kolkata' as created_at, completed_at AT TIME ZONE 'Asia/Kolkata' as completed_at, priority, due_by FROM tasks ORDER BY created_at DESC")
+            return jsonify({"success": True, "tasks": [dict(task) for task in tasks]})
+
+        data = await request.get_json()
+
+        if 'title' not in data:
+            return jsonify({"error": "Missing required field: title"}), 400
+
+        new_id = f"task_{int(datetime.now(IST).timestamp())}"
+
+        async with acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    INSERT INTO tasks (id, title, description, status, created_at, priority, due_by)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7::text::timestamptz)
+                """, new_id, data['title'], data.get('description', ''), 'pending', datetime.now(IST),
+                    data.get('priority', 'medium'), data.get('due_by'))
+                await record_task_status(conn, new_status='pending', created=True)
+
+        new_task = {
+            "id": new_id,
+            "title": data['title'],
+            "description": data.get('description', ''),
+            "status": "pending",
+            "created_at": datetime.now(IST).isoformat(),
+            "completed_at": None,
+            "priority": data.get('priority', 'medium')
+        }
+
+        return jsonify({
+            "success": True,
+            "message": f"Task '{data['title']}' added successfully",
+            "task": new_task
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/tasks/<task_id>', methods=['PUT', 'DELETE'])
+async def update_task(task_id):
+    """Update or delete a task"""
+    try:
+        if request.method == 'PUT':
+            data = await request.get_json()
+
+            updates = []
+            params = Params('asyncpg')
+            params.add(task_id)
+            if 'status' in data:
+                updates.append(f"status = {params.add(data['status'])}")
+                completed_at = datetime.now(IST) if data['status'] == 'completed' else None
+                updates.append(f"completed_at = {params.add(completed_at)}::timestamptz")
+            for field in ('title', 'description', 'priority'):
+                if field in data:
+                    updates.append(f"{field} = {params.add(data[field])}")
+
+            if not updates:
+                return jsonify({"error": "No fields to update"}), 400
+
+            async with acquire() as conn:
+                async with conn.transaction():
+                    # Return the previous status and completion too so the rollups can be adjusted
+                    result = await conn.fetchrow(f"""
+                        WITH old AS (SELECT id, status, completed_at FROM tasks WHERE id = $1 FOR UPDATE)
+                        UPDATE tasks
+                        SET {', '.join(updates)}
+                        FROM old
+                        WHERE tasks.id = old.id
+                        RETURNING old.status, tasks.status, old.completed_at, tasks.completed_at
+                    """, *params)
+                    if result is None:
+                        return jsonify({"error": "Task not found"}), 404
+                    if result[0] != result[1]:
+                        await record_task_status(conn, old_status=result[0], new_status=result[1])
+                    await record_day_counts(conn, 'tasks_completed',
+                                            moved_day_rows(completion_day(result[2]), completion_day(result[3])))
+
+            return jsonify({"success": True, "message": f"Task {task_id} updated"})
+
+        async with acquire() as conn:
+            async with conn.transaction():
+                status = await conn.fetchrow("DELETE FROM tasks WHERE id = $1 RETURNING status, completed_at", task_id)
+                if status is None:
+                    return jsonify({"error": "Task not found"}), 404
+                await record_task_status(conn, old_status=status[0], deleted=True)
+                await record_day_counts(conn, 'tasks_completed', moved_day_rows(old_day=completion_day(status[1])))
+
+        return jsonify({"success": True, "message": f"Task {task_id} deleted"})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/dashboard', methods=['GET'])
+async def get_dashboard_data():
+    """Get dashboard metrics (one statement over the rollup tables)"""
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow(DASHBOARD_SQL)
+        total_logs, today_logs, unique_events, total_duration = row[:4]
+        event_counts, place_counts, task_status_counts = (json.loads(value) for value in row[4:])
+
+        return jsonify({
+            "success": True,
+            "metrics": {
+                "total_logs": total_logs,
+                "today_logs": today_logs,
+                "unique_events": unique_events,
+                "total_duration_hours": total_duration / 60
+            },
+            "event_distribution": event_counts,
+            "place_distribution": place_counts,
+            "task_stats": {
+                "total": sum(task_status_counts.values()),
+                "pending": task_status_counts.get('pending', 0),
+                "in_progress": task_status_counts.get('in_progress', 0),
+                "completed": task_status_counts.get('completed', 0)
+            }
+        })
+
+    except Exception as e:
+        print(f"Error getting dashboard data: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics/timeseries', methods=['GET'])
+async def analytics_timeseries():
+    """Log counts and durations per day/week/month/quarter/year (see app.analytics_timeseries)"""
+    try:
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.now(IST).date()
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=364)
+            if end < start:
+                raise ValueError("'from' must not be after 'to'")
+            bucket = request.args.get('bucket', 'week')
+            if bucket not in BUCKETS:
+                raise ValueError(f"Invalid bucket: use one of {', '.join(BUCKETS)}")
+            group_by = parse_group_by(request.args.get('group'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        starts = bucket_starts(start, end, bucket)
+        if len(starts) > ANALYTICS_MAX_BUCKETS:
+            return jsonify({"error": f"Too many buckets ({len(starts)} > {ANALYTICS_MAX_BUCKETS}); use a larger bucket or a shorter range"}), 400
+
+        sql, params = timeseries_query(start, end, bucket, group_by, request.args.get('place'),
+                                       request.args.get('event'), paramstyle='asyncpg')
+        async with acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+
+        return jsonify({
+            "success": True,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "bucket": bucket,
+            "group_by": list(group_by),
+            "buckets": [bucket_day.isoformat() for bucket_day in starts],
+            "series": timeseries_json(rows, starts, group_by)
+        })
+
+    except Exception as e:
+        print(f"Error getting analytics timeseries: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/track', methods=['GET'])
+async def get_track():
+    """Simplified, polyline-encoded movement path for ?date=... or ?from=...&to=... (see app.get_track)"""
+    try:
+        try:
+            if request.args.get('from') or request.args.get('to'):
+                start = date.fromisoformat(request.args.get('from', ''))
+                end = date.fromisoformat(request.args.get('to', ''))
+                if end < start:
+                    raise ValueError
+            else:
+                start = end = date.fromisoformat(request.args['date']) if request.args.get('date') else datetime.now(IST).date()
+        except ValueError:
+            return jsonify({"error": "Use ?date=YYYY-MM-DD or ?from=YYYY-MM-DD&to=YYYY-MM-DD"}), 400
+        if (end - start).days >= TRACK_MAX_DAYS:
+            return jsonify({"error": f"Range too long (at most {TRACK_MAX_DAYS} days)"}), 400
+        try:
+            tolerance = float(request.args.get('tolerance', TRACK_TOLERANCE_M))
+            precision = int(request.args.get('precision', 5))
+        except ValueError:
+            return jsonify({"error": "tolerance must be a number of meters and precision an integer"}), 400
+        if not tolerance >= 0 or precision not in (5, 6):
+            return jsonify({"error": "tolerance must be >= 0 and precision 5 or 6"}), 400
+
+        async with acquire() as conn:
+            sql, params = track_query(start, end, paramstyle='asyncpg')
+            rows = await conn.fetch(sql, *params)
+
+        return jsonify({"success": True, "from": start.isoformat(), "to": end.isoformat(),
+                        **track_json(rows, tolerance, precision, IST)})
+
+    except Exception as e:
+        print(f"Error getting track: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/map/points', methods=['GET'])
+async def map_points():
+    """Logged locations inside ?bbox=... clustered for ?zoom=N (see app.map_points; no tile cache here)"""
+    try:
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+            zoom = int(request.args.get('zoom', ''))
+            if not 0 <= zoom <= MAX_ZOOM:
+                raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        tiles = tiles_for_bbox(bbox, zoom)
+        if len(tiles) > MAP_MAX_TILES:
+            return jsonify({"error": f"bbox covers {len(tiles)} tiles at zoom {zoom} (at most {MAP_MAX_TILES}); zoom in"}), 400
+        event_filter = request.args.get('event')
+        place_filter = request.args.get('place')
+
+        sql, params = cluster_query(tiles, zoom, MAP_CLUSTER_GRID, event_filter, place_filter, start, end,
+                                    paramstyle='asyncpg')
+        async with acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+        clusters = split_clusters(rows, tiles, MAP_CLUSTER_GRID, IST)
+
+        points = [cluster for tile in tiles for cluster in clusters[tile]]
+        return jsonify({
+            "success": True,
+            "zoom": zoom,
+            "tiles": len(tiles),
+            "clusters": points,
+            "total": sum(cluster['count'] for cluster in points)
+        })
+
+    except Exception as e:
+        print(f"Error getting map points: {e}")
+        return jsonify({"error": str(e)}), 500
+
+async def fetch_chunks(conn, query, chunk_size):
+    """Yield lists of rows from a cursor over ``query``, chunk_size rows at a time (call inside a transaction)"""
+    cursor = await conn.cursor(query)
+    while True:
+        rows = await cursor.fetch(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def session_rows(rows, zone):
+    """Rows with timestamptz values moved into the session time zone, where psycopg2 (and so app.py) renders them"""
+    if zone is None:
+        return rows
+    return [[value.astimezone(zone) if isinstance(value, datetime) and value.tzinfo else value for value in row]
+            for row in rows]
+
+async def session_zone(conn):
+    """The session TimeZone, or None for UTC (asyncpg returns timestamptz values in UTC) and zones Python doesn't know"""
+    name = await conn.fetchval("SHOW TimeZone")
+    if name in ('UTC', 'Etc/UTC', 'GMT'):
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ValueError, LookupError):
+        return None
+
+async def stream_csv(export_type):
+    """Generate the CSV for an export type chunk by chunk, like exports.stream_csv"""
+    async with acquire() as conn:
+        zone = await session_zone(conn)
+        async with conn.transaction(readonly=True):
+            for index, name in enumerate(export_types(export_type)):
+                # Like the original export, the header is only written when there is data
+                pending, header = csv_section(export_type, name, index), True
+                async for rows in fetch_chunks(conn, EXPORTS[name]['query'], EXPORT_CHUNK_SIZE):
+                    yield (pending + format_csv(name, session_rows(rows, zone), header)).encode('utf-8')
+                    pending, header = '', False
+                if pending:
+                    yield pending.encode('utf-8')
+
+async def stream_copy(export_type):
+    """Generate CSV bytes straight from COPY (SELECT ...) TO STDOUT, like exports.stream_copy.
+
+    COPY runs in a task that feeds a bounded queue; closing the generator
+    (client disconnect) cancels the task, which ends the COPY.
+    """
+    out = asyncio.Queue(maxsize=16)
+    done = object()
+
+    async def run():
+        try:
+            async with acquire() as conn:
+                for index, name in enumerate(export_types(export_type)):
+                    section = csv_section(export_type, name, index)
+                    if section:
+                        await out.put(section.encode('utf-8'))
+                    # COPY runs without HEADER; the header goes out with the first row so empty tables stay empty
+                    header = [csv_header(name).encode('utf-8')]
+
+                    async def sink(data):
+                        if header and data:
+                            await out.put(header.pop())
+                        await out.put(bytes(data))
+
+                    await conn.copy_from_query(EXPORTS[name]['copy_query'], output=sink, format='csv')
+            await out.put(done)
+        except Exception as e:
+            await out.put(e)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            item = await out.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def stream_columnar(export_type, format_type):
+    """Generate a Parquet file or Arrow IPC stream, one record batch per cursor chunk (see exports.stream_columnar)"""
+    writer = ColumnarWriter(export_type, format_type)
+    async with acquire() as conn:
+        async with conn.transaction(readonly=True):
+            async for rows in fetch_chunks(conn, EXPORTS[export_type]['columnar_query'], EXPORT_COLUMNAR_CHUNK_SIZE):
+                data = writer.write(rows)
+                if data:
+                    yield data
+    yield writer.close()
+
+def download(body, mimetype, filename):
+    """Streamed attachment response; on errors mid-stream (headers already sent) the body just stops"""
+    async def generate():
+        try:
+            async for chunk in body:
+                yield chunk
+        except Exception as e:
+            print(f"Error streaming export: {e}")
+
+    response = Response(generate(), mimetype=mimetype,
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+    # Large exports can take longer than Quart's RESPONSE_TIMEOUT
+    response.timeout = None
+    return response
+
+@app.route('/api/export', methods=['GET'])
+async def export_data():
+    """Export data as CSV (streamed from a cursor, or Postgres COPY with engine=copy) or as Parquet/Arrow"""
+    try:
+        format_type = request.args.get('format', 'csv')
+        export_type = request.args.get('type', 'logs')  # logs, combined, places, tasks, events
+        engine = request.args.get('engine', 'stream')  # stream (Python csv writer) or copy (Postgres COPY)
+
+        if format_type == 'csv':
+            if export_types(export_type) is None:
+                return jsonify({"error": "Invalid export type. Use: logs, places, tasks, events, or combined"}), 400
+
+            if engine not in ('stream', 'copy'):
+                return jsonify({"error": "Invalid export engine. Use: stream or copy"}), 400
+
+            prefix = COMBINED_FILENAME if export_type == 'combined' else EXPORTS[export_type]['filename']
+            filename = f'{prefix}_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.csv'
+            body = stream_copy(export_type) if engine == 'copy' else stream_csv(export_type)
+            return download(body, 'text/csv', filename)
+        elif format_type in COLUMNAR_FORMATS:
+            if export_type not in EXPORTS:
+                return jsonify({"error": "Invalid export type for columnar formats. Use: logs, places, tasks, or events"}), 400
+            if pa is None:
+                return jsonify({"error": f"Export format '{format_type}' requires pyarrow to be installed"}), 501
+
+            extension, mimetype = COLUMNAR_FORMATS[format_type]
+            filename = f'{EXPORTS[export_type]["filename"]}_{datetime.now(IST).strftime("%Y%m%d_%H%M%S")}.{extension}'
+            return download(stream_columnar(export_type, format_type), mimetype, filename)
+        else:
+            return jsonify({"error": "Unsupported format. Use: csv, parquet, or arrow"}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/events', methods=['GET', 'POST'])
+async def events():
+    """Get or add events (journal entries)"""
+    try:
+        if request.method == 'GET':
+            async with acquire() as conn:
+                events = await conn.fetch("SELECT * FROM events ORDER BY date DESC")
+            return jsonify({"success": True, "events": [dict(event) for event in events]})
+
+        data = await request.get_json()
+
+        required_fields = ['title', 'description', 'date']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        new_id = f"event_{int(datetime.now(IST).timestamp())}"
+
+        async with acquire() as conn:
+            async with conn.transaction():
+                event_date = await conn.fetchval("""
+                    INSERT INTO events (id, title, description, date)
+                    VALUES ($1, $2, $3, $4::text::date)
+                    RETURNING date
+                """, new_id, data['title'], data['description'], data['date'])
+                await record_day_counts(conn, 'events_count', moved_day_rows(new_day=event_date))
+
+        new_event = {
+            "id": new_id,
+            "title": data['title'],
+            "description": data['description'],
+            "date": data['date']
+        }
+
+        return jsonify({
+            "success": True,
+            "message": f"Event '{data['title']}' added successfully",
+            "event": new_event
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/events/<event_id>', methods=['PUT', 'DELETE'])
+async def update_event(event_id):
+    """Update or delete an event"""
+    try:
+        if request.method == 'PUT':
+            data = await request.get_json()
+
+            updates = []
+            params = Params('asyncpg')
+            params.add(event_id)
+            if 'title' in data:
+                updates.append(f"title = {params.add(data['title'])}")
+            if 'description' in data:
+                updates.append(f"description = {params.add(data['description'])}")
+            if 'date' in data:
+                updates.append(f"date = {params.add(data['date'])}::text::date")
+
+            if not updates:
+                return jsonify({"error": "No fields to update"}), 400
+
+            async with acquire() as conn:
+                async with conn.transaction():
+                    # Return the previous date too so the day summaries can be adjusted
+                    result = await conn.fetchrow(f"""
+                        WITH old AS (SELECT id, date FROM events WHERE id = $1 FOR UPDATE)
+                        UPDATE events
+                        SET {', '.join(updates)}
+                        FROM old
+                        WHERE events.id = old.id
+                        RETURNING old.date, events.date
+                    """, *params)
+                    if result is None:
+                        return jsonify({"error": "Event not found"}), 404
+                    await record_day_counts(conn, 'events_count', moved_day_rows(result[0], result[1]))
+
+            return jsonify({"success": True, "message": f"Event {event_id} updated"})
+
+        async with acquire() as conn:
+            async with conn.transaction():
+                event_date = await conn.fetchval("DELETE FROM events WHERE id = $1 RETURNING date", event_id)
+                if event_date is None:
+                    return jsonify({"error": "Event not found"}), 404
+                await record_day_counts(conn, 'events_count', moved_day_rows(old_day=event_date))
+
+        return jsonify({"success": True, "message": f"Event {event_id} deleted"})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5051))
+    app.run(host='0.0.0.0', port=port, use_reloader=False)
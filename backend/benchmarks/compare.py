@@ -0,0 +1,64 @@
+"""Compare two benchmark reports (load.py or micro.py JSON) and flag regressions.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 10
+
+Latency metrics (p50/p95/p99 ms, micro median µs) that grow by more than
+``--threshold`` percent, and throughput that drops by more than that, are
+reported as regressions; the exit status is 1 when there are any.
+"""
+import argparse
+import json
+import sys
+
+# metric -> True when larger is better
+LOAD_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput_rps": True}
+MICRO_METRICS = {"median_us": False, "ops_per_s": True}
+
+
+def compare(baseline, candidate, threshold):
+    metrics = MICRO_METRICS if baseline.get("kind") == "micro" else LOAD_METRICS
+    rows = []
+    for name, before in baseline.get("results", {}).items():
+        after = candidate.get("results", {}).get(name)
+        if after is None:
+            continue
+        for metric, higher_is_better in metrics.items():
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            regressed = change < -threshold if higher_is_better else change > threshold
+            rows.append({
+                "scenario": name,
+                "metric": metric,
+                "baseline": old,
+                "candidate": new,
+                "change_pct": round(change, 1),
+                "regression": regressed,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent change treated as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    regressions = [row for row in rows if row["regression"]]
+    print(json.dumps({"threshold_pct": args.threshold, "regressions": regressions, "comparisons": rows}, indent=2))
+    for row in regressions:
+        print(f"REGRESSION {row['scenario']} {row['metric']}: {row['baseline']} -> {row['candidate']} "
+              f"({row['change_pct']:+}%)", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
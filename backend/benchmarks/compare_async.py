@@ -0,0 +1,64 @@
+"""Compare the sync (gunicorn + app.py) and async (hypercorn + async_app.py) backends.
+
+Start both servers against the same database, then run e.g.
+
+    python benchmarks/compare_async.py --sync http://localhost:5051 \\
+        --async http://localhost:5052 --concurrency 32 --requests 2000
+
+Each scenario is run against both servers with the same number of concurrent
+clients; throughput and latency percentiles are printed as JSON.
+"""
+import argparse
+import sys
+
+import harness
+
+# (name, method, path) - ingest scenarios write rows, so point both servers at a scratch database
+SCENARIOS = [
+    ("health", "GET", "/api/health"),
+    ("dashboard", "GET", "/api/dashboard"),
+    ("logs_page", "GET", "/api/logs?limit=100"),
+    ("logs_by_event", "GET", "/api/logs?event=arrive&limit=100"),
+    ("ingest_url", "GET", "/api/arrive/12.9716/77.5946"),
+    ("ingest_post", "POST", "/api/log"),
+]
+
+INGEST_BODY = {"event": "arrive", "lat": 12.9716, "lon": 77.5946, "notes": "benchmark"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sync', dest='sync_url', default='http://localhost:5051')
+    parser.add_argument('--async', dest='async_url', default='http://localhost:5052')
+    parser.add_argument('--requests', type=int, default=1000, help="requests per scenario and server")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--scenario', action='append', help="run only these scenarios (repeatable)")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    selected = [s for s in SCENARIOS if not args.scenario or s[0] in args.scenario]
+    report = {
+        "environment": harness.environment(),
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "servers": {"sync": args.sync_url, "async": args.async_url},
+        "scenarios": {},
+    }
+    for name, method, path in selected:
+        result = {}
+        for label, base_url in (("sync", args.sync_url), ("async", args.async_url)):
+            body = INGEST_BODY if method == "POST" else None
+            result[label] = harness.run_http_scenario(base_url, method, path, args.requests, args.concurrency,
+                                                      args.timeout, body=body)
+            print(f"{name:14} {label:5} {result[label]['throughput_rps']} req/s  "
+                  f"p50 {result[label]['p50_ms']} ms  p99 {result[label]['p99_ms']} ms", file=sys.stderr)
+        sync_rps, async_rps = result["sync"]["throughput_rps"], result["async"]["throughput_rps"]
+        result["async_speedup"] = round(async_rps / sync_rps, 2) if sync_rps and async_rps else None
+        report["scenarios"][name] = result
+
+    harness.write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
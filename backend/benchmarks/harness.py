@@ -0,0 +1,107 @@
+"""Shared helpers for the benchmark scripts: timing, percentiles, JSON reports"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Benchmarks import the backend modules (geo, places_index, migrate, ...) directly
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return None
+    rank = max(int(round(pct / 100.0 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def summarize(latencies, errors=0, elapsed=None):
+    """Throughput and latency percentiles (milliseconds) for a list of per-operation seconds"""
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3) if elapsed is not None else None,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": ms(statistics.fmean(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p90_ms": ms(percentile(latencies, 90)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def run_http_scenario(base_url, method, path, total, concurrency, timeout=30.0, body=None, warmup=None):
+    """Issue ``total`` requests from ``concurrency`` client threads and summarize them.
+
+    Streamed responses are read to the end, so export timings include the
+    whole download. Responses with status >= 400 count as errors.
+    """
+    import requests
+
+    local = threading.local()
+    url = base_url.rstrip('/') + path
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        size = 0
+        try:
+            with session.request(method, url, json=body, timeout=timeout, stream=True) as response:
+                for chunk in response.iter_content(65536):
+                    size += len(chunk)
+                ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok, size
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        # Warm up connections, caches and the places index before measuring
+        list(pool.map(one, range(min(concurrency, total) if warmup is None else warmup)))
+
+        started = time.perf_counter()
+        results = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, ok, _ in results if ok]
+    summary = summarize(latencies, len(results) - len(latencies), elapsed)
+    summary["mean_bytes"] = round(statistics.fmean(size for _, _, size in results)) if results else 0
+    return summary
+
+
+def environment():
+    """Where and when a report was produced, so runs can be compared meaningfully"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_report(report, output=None):
+    """Print the JSON report and optionally save it to ``output``"""
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + "\n")
@@ -0,0 +1,107 @@
+"""HTTP load test for a running backend (seed it first with seed.py).
+
+    python benchmarks/load.py --url http://localhost:5051 --concurrency 16 \\
+        --requests 500 --output results/$(git rev-parse --short HEAD).json
+
+Measures throughput and latency percentiles for ingest (POST /api/log and
+/api/<event>/<lat>/<lon>), GET /api/logs with each filter and with keyset
+pagination, the dashboard, and every export type and format. Ingest
+scenarios write rows, so only run against a benchmark database. Results are
+printed as JSON; compare two runs with compare.py.
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+import requests
+
+import harness
+from seed import CENTER_LAT, CENTER_LON
+
+INGEST_BODY = {"event": "arrive", "lat": CENTER_LAT, "lon": CENTER_LON, "notes": "benchmark"}
+
+
+def scenarios(base_url, place):
+    """[(name, group, method, path, body)] for every measured endpoint"""
+    today = date.today()
+    week_ago = today - timedelta(days=7)
+    listed = [
+        ("ingest_post", "ingest", "POST", "/api/log", INGEST_BODY),
+        ("ingest_url_arrive", "ingest", "GET", f"/api/arrive/{CENTER_LAT}/{CENTER_LON}", None),
+        ("ingest_url_exit", "ingest", "GET", f"/api/exit/{CENTER_LAT}/{CENTER_LON}", None),
+        ("logs_page", "read", "GET", "/api/logs?limit=100", None),
+        ("logs_date", "read", "GET", f"/api/logs?date={week_ago.isoformat()}&limit=100", None),
+        ("logs_event", "read", "GET", "/api/logs?event=arrive&limit=100", None),
+        ("logs_place", "read", "GET", f"/api/logs?place={place}&limit=100", None),
+        ("logs_range", "read", "GET", f"/api/logs?from={week_ago.isoformat()}&to={today.isoformat()}&limit=100", None),
+        ("dashboard", "read", "GET", "/api/dashboard", None),
+        ("daily_log_month", "read", "GET",
+         f"/api/daily-log?from={(today - timedelta(days=30)).isoformat()}&to={today.isoformat()}", None),
+        ("timeseries_year_week", "read", "GET", "/api/analytics/timeseries?bucket=week&group=place", None),
+        ("timeseries_place_month", "read", "GET", f"/api/analytics/timeseries?bucket=month&place={place}", None),
+        ("map_city_zoom12", "read", "GET",
+         f"/api/map/points?bbox={CENTER_LON - 0.1},{CENTER_LAT - 0.1},{CENTER_LON + 0.1},{CENTER_LAT + 0.1}&zoom=12", None),
+        ("track_week", "read", "GET", f"/api/track?from={week_ago.isoformat()}&to={today.isoformat()}", None),
+    ]
+
+    # A deep page: follow next_cursor a few times and benchmark the page after it
+    try:
+        cursor = None
+        for _ in range(10):
+            query = "/api/logs?limit=100" + (f"&before={cursor}" if cursor else "")
+            cursor = requests.get(base_url.rstrip('/') + query, timeout=60).json().get("next_cursor") or cursor
+        if cursor:
+            listed.append(("logs_cursor", "read", "GET", f"/api/logs?limit=100&before={cursor}", None))
+    except requests.RequestException as e:
+        print(f"Skipping logs_cursor: {e}", file=sys.stderr)
+
+    for export_type in ("logs", "places", "tasks", "events", "combined"):
+        for engine in ("stream", "copy"):
+            listed.append((f"export_{export_type}_csv_{engine}", "export", "GET",
+                           f"/api/export?type={export_type}&engine={engine}", None))
+    for export_type in ("logs", "places", "tasks", "events"):
+        for format_type in ("parquet", "arrow"):
+            listed.append((f"export_{export_type}_{format_type}", "export", "GET",
+                           f"/api/export?type={export_type}&format={format_type}", None))
+    return listed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load test for the backend API")
+    parser.add_argument('--url', default='http://localhost:5051')
+    parser.add_argument('--requests', type=int, default=500, help="requests per ingest/read scenario")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--export-requests', type=int, default=3, help="requests per export scenario")
+    parser.add_argument('--export-concurrency', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--place', default='bench_place_1', help="place name for the place filter")
+    parser.add_argument('--group', action='append', choices=['ingest', 'read', 'export'],
+                        help="only run these scenario groups (repeatable)")
+    parser.add_argument('--scenario', action='append', help="only run these scenarios (repeatable)")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, group, method, path, body in scenarios(args.url, args.place):
+        if (args.group and group not in args.group) or (args.scenario and name not in args.scenario):
+            continue
+        exporting = group == 'export'
+        total = args.export_requests if exporting else args.requests
+        concurrency = args.export_concurrency if exporting else args.concurrency
+        results[name] = harness.run_http_scenario(
+            args.url, method, path, total, concurrency, args.timeout, body=body, warmup=1 if exporting else None
+        )
+        results[name].update({"group": group, "method": method, "path": path, "concurrency": concurrency})
+        print(f"{name:32} {results[name]['throughput_rps']} req/s  p50 {results[name]['p50_ms']} ms  "
+              f"p99 {results[name]['p99_ms']} ms  errors {results[name]['errors']}", file=sys.stderr)
+
+    harness.write_report({
+        "kind": "load",
+        "environment": harness.environment(),
+        "url": args.url,
+        "results": results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
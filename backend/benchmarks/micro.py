@@ -0,0 +1,160 @@
+"""Micro-benchmarks for the geofence hot path (no database needed).
+
+    python benchmarks/micro.py --places 10000 --output micro.json
+
+Times calculate_distance() and the places-index lookup behind
+get_place_from_location() against synthetic places, plus a brute-force scan
+over every place as the baseline the index replaces, and the vectorized
+batch paths (PlacesIndex.lookup_many and a vectorized brute-force scan,
+match_geofences).
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+import harness
+from geo import calculate_distance, haversine_pairs
+from places_index import PlacesIndex
+from seed import CENTER_LAT, CENTER_LON, SPREAD_DEG
+
+# Upper bound on points x places evaluated at once by match_geofences (~8 bytes each per temporary)
+MATCH_CHUNK_ELEMENTS = 1 << 20
+
+
+def synthetic_places(count, rng):
+    return [{
+        "id": f"bench_place_{i}",
+        "name": f"bench_place_{i}",
+        "lat": CENTER_LAT + (rng.random() - 0.5) * SPREAD_DEG,
+        "lon": CENTER_LON + (rng.random() - 0.5) * SPREAD_DEG,
+        "geofence_radius": 50 + rng.randrange(450),
+    } for i in range(1, count + 1)]
+
+
+def match_geofences(lats, lons, place_lats, place_lons, radii):
+    """Nearest containing geofence for each point by comparing it with every place (numpy baseline).
+
+    Returns (indexes, distances): for every point the index of the closest
+    place whose radius covers it (-1 when none does) and the distance to it
+    in meters (NaN when none does). Points are processed in chunks so memory
+    stays bounded.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    radii = np.asarray(radii, dtype=np.float64)
+    indexes = np.full(len(lats), -1, dtype=np.int64)
+    distances = np.full(len(lats), np.nan)
+    if not len(lats) or not len(radii):
+        return indexes, distances
+
+    place_lats = np.asarray(place_lats, dtype=np.float64)[None, :]
+    place_lons = np.asarray(place_lons, dtype=np.float64)[None, :]
+    chunk = max(MATCH_CHUNK_ELEMENTS // len(radii), 1)
+    for start in range(0, len(lats), chunk):
+        stop = start + chunk
+        # Broadcasts to a (points, places) distance matrix
+        matrix = haversine_pairs(lats[start:stop, None], lons[start:stop, None], place_lats, place_lons)
+        matrix[matrix > radii] = np.inf
+        nearest = matrix.argmin(axis=1)
+        nearest_distance = matrix[np.arange(len(nearest)), nearest]
+        inside = np.isfinite(nearest_distance)
+        indexes[start:stop] = np.where(inside, nearest, -1)
+        distances[start:stop] = np.where(inside, nearest_distance, np.nan)
+    return indexes, distances
+
+
+def synthetic_points(places, count, rng, inside_ratio=0.5):
+    """Points near random places (roughly inside_ratio of them within a geofence) and scattered elsewhere"""
+    points = []
+    for _ in range(count):
+        if places and rng.random() < inside_ratio:
+            place = rng.choice(places)
+            points.append((place['lat'] + (rng.random() - 0.5) * 0.001, place['lon'] + (rng.random() - 0.5) * 0.001))
+        else:
+            points.append((CENTER_LAT + (rng.random() - 0.5) * SPREAD_DEG, CENTER_LON + (rng.random() - 0.5) * SPREAD_DEG))
+    return points
+
+
+def bench(func, args_list, repeat):
+    """Time ``func`` over ``args_list`` ``repeat`` times; per-call stats from each pass"""
+    per_call = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        per_call.append((time.perf_counter() - started) / len(args_list))
+    per_call.sort()
+    best = per_call[0]
+    return {
+        "calls_per_pass": len(args_list),
+        "passes": repeat,
+        "best_us": round(best * 1e6, 3),
+        "median_us": round(harness.percentile(per_call, 50) * 1e6, 3),
+        "worst_us": round(per_call[-1] * 1e6, 3),
+        "ops_per_s": round(1 / best) if best else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Geofence micro-benchmarks")
+    parser.add_argument('--places', type=int, default=10000)
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--brute-force-points', type=int, default=200,
+                        help="points for the O(places) baseline (it is slow)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    places = synthetic_places(args.places, rng)
+    points = synthetic_points(places, args.points, rng)
+    pairs = [(lat, lon, place['lat'], place['lon']) for (lat, lon), place in zip(points, rng.choices(places, k=len(points)))]
+
+    index = PlacesIndex(lambda: places, ttl=float('inf'))
+    started = time.perf_counter()
+    index.warm()
+    build_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def brute_force(lat, lon):
+        best = None
+        for place in places:
+            distance = calculate_distance(lat, lon, place['lat'], place['lon'])
+            if distance <= place['geofence_radius'] and (best is None or distance < best[1]):
+                best = (place['id'], distance)
+        return best
+
+    results = {
+        "calculate_distance": bench(calculate_distance, pairs, args.repeat),
+        "places_index_build": {"places": len(places), "ms": build_ms},
+        "get_place_from_location": bench(index.lookup, points, args.repeat),
+        "brute_force_lookup": bench(brute_force, points[:args.brute_force_points], 1),
+    }
+    batch_points = [(points,)]
+    place_columns = ([p['lat'] for p in places], [p['lon'] for p in places], [p['geofence_radius'] for p in places])
+    brute_points = points[:args.brute_force_points]
+    results["lookup_many_batch"] = bench(index.lookup_many, batch_points, args.repeat)
+    results["lookup_many_batch"]["points"] = len(points)
+    results["match_geofences_batch"] = bench(
+        lambda batch: match_geofences([p[0] for p in batch], [p[1] for p in batch], *place_columns),
+        [(brute_points,)], args.repeat
+    )
+    results["match_geofences_batch"]["points"] = len(brute_points)
+    hits = sum(1 for lat, lon in points if index.lookup(lat, lon))
+    results["get_place_from_location"]["hit_ratio"] = round(hits / len(points), 3) if points else None
+    for name, result in results.items():
+        print(f"{name:26} {result}", file=sys.stderr)
+
+    harness.write_report({
+        "kind": "micro",
+        "environment": harness.environment(),
+        "parameters": {"places": args.places, "points": args.points, "seed": args.seed},
+        "results": results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Seed a benchmark database with synthetic places, logs, tasks and events.
+
+    python benchmarks/seed.py --dsn postgresql://localhost/worklog_bench \\
+        --places 10000 --logs 10000000 --tasks 100000 --events 10000 --truncate
+
+Rows are generated server-side with generate_series in chunks (one
+transaction each), so tens of millions of logs load without shipping data
+from Python. random() is seeded per chunk, so the same arguments produce the
+same data. Migrations are applied first; the rollup tables, visits and day
+summaries are rebuilt and the tables analyzed at the end. Never point this at
+a production database.
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+import harness  # noqa: F401  (adds the backend directory to sys.path)
+from migrate import run_migrations
+from daily import rebuild_daily_summaries
+from rollups import rebuild_rollups
+from visits import rebuild_visits
+
+# Synthetic places are scattered around this point
+CENTER_LAT, CENTER_LON = 12.9716, 77.5946
+SPREAD_DEG = 0.5
+
+PLACES_SQL = """
+    INSERT INTO places (id, name, lat, lon, geofence_radius, type)
+    SELECT 'bench_place_' || i, 'bench_place_' || i,
+           %(lat)s + (random() - 0.5) * %(spread)s,
+           %(lon)s + (random() - 0.5) * %(spread)s,
+           50 + floor(random() * 450)::int,
+           'benchmark'
+    FROM generate_series(%(start)s, %(stop)s) AS i
+    ON CONFLICT (id) DO NOTHING
+"""
+
+# Each log sits inside (or just outside) the geofence of a pseudo-random place;
+# events alternate arrive/exit and exits carry a duration
+LOGS_SQL = """
+    INSERT INTO logs (timestamp, event, lat, lon, place_id, notes, duration_minutes, mode)
+    SELECT NOW() - random() * (%(days)s * INTERVAL '1 day'),
+           CASE WHEN i %% 2 = 0 THEN 'arrive' ELSE 'exit' END,
+           p.lat + (random() - 0.5) * 0.002,
+           p.lon + (random() - 0.5) * 0.002,
+           CASE WHEN random() < 0.9 THEN p.id END,
+           'benchmark seed',
+           CASE WHEN i %% 2 = 1 THEN floor(random() * 480)::int ELSE 0 END,
+           CASE WHEN random() < 0.8 THEN 'iPhone' ELSE 'Manual' END
+    FROM generate_series(%(start)s, %(stop)s) AS i
+    JOIN places p ON p.id = 'bench_place_' || (1 + (i::bigint * 7919) %% %(places)s)
+"""
+
+TASKS_SQL = """
+    INSERT INTO tasks (id, title, description, status, created_at, completed_at, priority, due_by)
+    SELECT 'bench_task_' || i, 'Benchmark task ' || i, 'benchmark seed',
+           s.status,
+           s.created_at,
+           CASE WHEN s.status = 'completed' THEN s.created_at + random() * INTERVAL '7 days' END,
+           (ARRAY['low', 'medium', 'high'])[1 + floor(random() * 3)::int],
+           CASE WHEN random() < 0.5 THEN s.created_at + random() * INTERVAL '30 days' END
+    FROM generate_series(%(start)s, %(stop)s) AS i,
+         LATERAL (SELECT (ARRAY['pending', 'in_progress', 'completed'])[1 + floor(random() * 3)::int] AS status,
+                         NOW() - random() * (%(days)s * INTERVAL '1 day') AS created_at
+                  WHERE i IS NOT NULL) AS s
+    ON CONFLICT (id) DO NOTHING
+"""
+
+EVENTS_SQL = """
+    INSERT INTO events (id, title, description, date)
+    SELECT 'bench_event_' || i, 'Benchmark event ' || i, 'benchmark seed',
+           (NOW() - random() * (%(days)s * INTERVAL '1 day'))::date
+    FROM generate_series(%(start)s, %(stop)s) AS i
+    ON CONFLICT (id) DO NOTHING
+"""
+
+
+def insert_chunked(conn, label, sql, total, chunk_size, params):
+    """Run ``sql`` over 1..total in chunks, committing and reporting progress after each"""
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    for chunk_start in range(1, total + 1, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size - 1, total)
+        # Deterministic data for a given chunk layout
+        cursor.execute("SELECT setseed(%s)", ((chunk_start % 1000000) / 1000000.0,))
+        cursor.execute(sql, dict(params, start=chunk_start, stop=chunk_stop))
+        conn.commit()
+        rate = chunk_stop / max(time.perf_counter() - started, 1e-9)
+        print(f"  {label}: {chunk_stop:,}/{total:,} ({rate:,.0f} rows/s)", file=sys.stderr)
+    cursor.close()
+    return round(time.perf_counter() - started, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a benchmark database")
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL'), help="defaults to $DATABASE_URL")
+    parser.add_argument('--places', type=int, default=10000)
+    parser.add_argument('--logs', type=int, default=1000000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365, help="spread timestamps over this many past days")
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    parser.add_argument('--truncate', action='store_true', help="empty logs, places, tasks and events first")
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+    if args.logs and not args.places:
+        parser.error("--logs needs at least one place")
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        run_migrations(conn)
+        cursor = conn.cursor()
+        if args.truncate:
+            cursor.execute("TRUNCATE logs, places, tasks, events RESTART IDENTITY CASCADE")
+            conn.commit()
+
+        params = {"lat": CENTER_LAT, "lon": CENTER_LON, "spread": SPREAD_DEG, "days": args.days, "places": args.places}
+        timings = {}
+        for label, sql, total in (("places", PLACES_SQL, args.places), ("logs", LOGS_SQL, args.logs),
+                                  ("tasks", TASKS_SQL, args.tasks), ("events", EVENTS_SQL, args.events)):
+            if total:
+                timings[label] = insert_chunked(conn, label, sql, total, args.chunk_size, params)
+
+        started = time.perf_counter()
+        rebuild_rollups(cursor)
+        conn.commit()
+        timings["rollups"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        rebuild_visits(cursor)
+        conn.commit()
+        timings["visits"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        rebuild_daily_summaries(cursor)
+        conn.commit()
+        timings["daily_summaries"] = round(time.perf_counter() - started, 3)
+
+        conn.autocommit = True
+        cursor.execute("ANALYZE")
+        cursor.execute("SELECT (SELECT COUNT(*) FROM places), (SELECT COUNT(*) FROM logs), "
+                       "(SELECT COUNT(*) FROM tasks), (SELECT COUNT(*) FROM events)")
+        counts = dict(zip(("places", "logs", "tasks", "events"), cursor.fetchone()))
+        cursor.close()
+    finally:
+        conn.close()
+
+    harness.write_report({"environment": harness.environment(), "seconds": timings, "rows": counts})
+
+
+if __name__ == '__main__':
+    main()
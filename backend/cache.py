@@ -0,0 +1,228 @@
+"""Response cache for read endpoints, invalidated by the write handlers.
+
+Entries are keyed by route, query arguments and the current *generation* of
+every tag the route depends on (e.g. 'places'). A mutation bumps the tag's
+generation, which makes every dependent entry unreachable at once; stale
+entries then simply age out. The default backend is an in-process LRU with
+TTL. Setting CACHE_URL=redis://... shares entries and invalidations between
+processes (requires the optional ``redis`` package).
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+try:
+    import redis
+except ImportError:  # optional: only needed for the shared backend
+    redis = None
+
+
+class LRUCache:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counters(self, names):
+        with self._lock:
+            return [self._counters.get(name, 0) for name in names]
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Shared backend: entries and tag generations live in Redis"""
+
+    def __init__(self, url, prefix='worklog:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    def get_counters(self, names):
+        values = self.client.mget([self.prefix + 'gen:' + name for name in names])
+        return [int(value) if value else 0 for value in values]
+
+    def incr(self, name):
+        self.client.incr(self.prefix + 'gen:' + name)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + 'resp:*'):
+            self.client.delete(key)
+
+
+def _pack(etag, mimetype, body):
+    return f"{etag}\n{mimetype}\n".encode('utf-8') + body
+
+
+def _unpack(value):
+    etag, mimetype, body = value.split(b'\n', 2)
+    return etag.decode('utf-8'), mimetype.decode('utf-8'), body
+
+
+class ResponseCache:
+    """Caches successful GET responses and answers If-None-Match with 304"""
+
+    def __init__(self, backend, ttl=60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def invalidate(self, *tags):
+        """Make every cached response depending on any of ``tags`` stale"""
+        for tag in tags:
+            try:
+                self.backend.incr(tag)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error invalidating cache tag {tag}: {e}")
+
+    def _key(self, tags):
+        generations = self.backend.get_counters(tags)
+        args = '&'.join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+        versions = '.'.join(f"{tag}{generation}" for tag, generation in zip(tags, generations))
+        return f"resp:{request.path}?{args}#{versions}"
+
+    def cached(self, *tags):
+        """Decorator for GET views whose output only changes when ``tags`` are invalidated"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or self.ttl <= 0:
+                    return view(*args, **kwargs)
+
+                entry = None
+                try:
+                    key = self._key(tags)
+                    value = self.backend.get(key)
+                    entry = _unpack(value) if value else None
+                except Exception as e:
+                    # A broken cache must never break the endpoint
+                    key = None
+                    self.errors += 1
+                    print(f"Error reading response cache: {e}")
+
+                if entry is None:
+                    self.misses += 1
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    entry = ('"' + hashlib.sha1(body).hexdigest() + '"', response.mimetype, body)
+                    if key is not None:
+                        try:
+                            self.backend.set(key, _pack(*entry), self.ttl)
+                        except Exception as e:
+                            self.errors += 1
+                            print(f"Error writing response cache: {e}")
+                else:
+                    self.hits += 1
+
+                etag, mimetype, body = entry
+                headers = {"ETag": etag, "Cache-Control": "no-cache"}
+                if etag.strip('"') in request.if_none_match:
+                    return Response(status=304, headers=headers)
+                return Response(body, mimetype=mimetype, headers=headers)
+            return wrapper
+        return decorator
+
+    def fragment_keys(self, names, tags):
+        """Keys for cached pieces of a response (e.g. map tiles) under the current generations of ``tags``.
+
+        Keys are None when caching is disabled or the backend is unreachable,
+        which get_fragments() treats as misses and set_fragment() ignores.
+        """
+        if self.ttl <= 0:
+            return [None] * len(names)
+        try:
+            generations = self.backend.get_counters(tags)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error reading response cache: {e}")
+            return [None] * len(names)
+        versions = '.'.join(f"{tag}{generation}" for tag, generation in zip(tags, generations))
+        return [f"resp:frag:{name}#{versions}" for name in names]
+
+    def get_fragments(self, keys):
+        """Cached values for ``keys`` (None where missing); never raises"""
+        values = []
+        for key in keys:
+            value = None
+            if key is not None:
+                try:
+                    value = self.backend.get(key)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error reading response cache: {e}")
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            values.append(value)
+        return values
+
+    def set_fragment(self, key, value):
+        if key is None or self.ttl <= 0:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error writing response cache: {e}")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+def create_response_cache(url=None, ttl=60.0, max_entries=1024, workers=1):
+    """Build the response cache: Redis when ``url`` is set and usable, in-process LRU otherwise.
+
+    An in-process cache only sees the invalidations of its own process, so
+    with several ``workers`` and no shared backend caching is turned off.
+    """
+    if url:
+        if redis is None:
+            print("⚠️ CACHE_URL is set but the redis package is not installed; using in-process cache")
+        else:
+            return ResponseCache(RedisCache(url), ttl)
+    if workers > 1 and ttl > 0:
+        print(f"⚠️ Response cache disabled: {workers} workers would each keep a stale copy (set CACHE_URL to share one)")
+        ttl = 0
+    return ResponseCache(LRUCache(max_entries), ttl)
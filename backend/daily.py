@@ -0,0 +1,282 @@
+"""Per-day summaries behind the daily log (see migrations/0006_daily_summaries.sql).
+
+Like the rollups, a day's row is updated in the same transaction as every
+write that adds or removes logs, completes tasks or moves journal events, so
+a range of days is read with one primary-key range scan (joined with the
+per-place minutes already kept in log_daily_rollup) instead of from logs.
+
+Usage: python daily.py --rebuild   (recompute every day from the base tables)
+"""
+import json
+from collections import defaultdict
+
+from rollups import IST, rollup_day
+from sqlparams import Params, columns
+
+
+def upsert_day_logs_query(rows, paramstyle='psycopg2'):
+    """(sql, params) folding day_log_rows() into daily_summaries"""
+    params = Params(paramstyle)
+    days, counts, first_arrives, last_arrives, last_exits = columns(rows)
+    sql = f"""
+        INSERT INTO daily_summaries (day, log_count, first_arrive_at, last_arrive_at, last_exit_at)
+        SELECT * FROM unnest({params.add(days)}::date[], {params.add(counts)}::int[],
+                             {params.add(first_arrives)}::timestamptz[], {params.add(last_arrives)}::timestamptz[],
+                             {params.add(last_exits)}::timestamptz[])
+        ON CONFLICT (day) DO UPDATE
+        SET log_count = daily_summaries.log_count + EXCLUDED.log_count,
+            first_arrive_at = LEAST(daily_summaries.first_arrive_at, EXCLUDED.first_arrive_at),
+            last_arrive_at = GREATEST(daily_summaries.last_arrive_at, EXCLUDED.last_arrive_at),
+            last_exit_at = GREATEST(daily_summaries.last_exit_at, EXCLUDED.last_exit_at),
+            updated_at = NOW()
+    """
+    return sql, params
+
+
+def remove_day_logs_query(rows, paramstyle='psycopg2'):
+    """(sql, params) taking (day, removed) log counts out of daily_summaries.
+
+    After logs are deleted the day's first/last times are re-read through
+    the (event, timestamp) index.
+    """
+    params = Params(paramstyle)
+    days, removed = columns(rows)
+    sql = f"""
+        UPDATE daily_summaries s
+        SET log_count = s.log_count - d.removed,
+            first_arrive_at = (SELECT MIN(timestamp) FROM logs WHERE event = 'arrive' AND timestamp >= b.start AND timestamp < b.stop),
+            last_arrive_at = (SELECT MAX(timestamp) FROM logs WHERE event = 'arrive' AND timestamp >= b.start AND timestamp < b.stop),
+            last_exit_at = (SELECT MAX(timestamp) FROM logs WHERE event = 'exit' AND timestamp >= b.start AND timestamp < b.stop),
+            updated_at = NOW()
+        FROM unnest({params.add(days)}::date[], {params.add(removed)}::int[]) AS d(day, removed)
+        CROSS JOIN LATERAL (
+            SELECT d.day::timestamp AT TIME ZONE 'Asia/Kolkata' AS start,
+                   (d.day + 1)::timestamp AT TIME ZONE 'Asia/Kolkata' AS stop
+        ) b
+        WHERE s.day = d.day
+    """
+    return sql, params
+
+
+def daily_log_query(start, end, paramstyle='psycopg2'):
+    """(sql, params) for every day from ``start`` to ``end`` (inclusive) with its minutes per place from the log rollup"""
+    params = Params(paramstyle)
+    # Bound once and reused: psycopg2 placeholders are positional
+    sql = f"""
+        WITH bounds AS (
+            SELECT {params.add(start)}::date AS start, {params.add(end)}::date AS stop
+        ), place_minutes AS (
+            SELECT r.day, SUM(r.minutes) AS total_minutes,
+                   json_agg(json_build_object('place', COALESCE(p.name, 'unknown'), 'minutes', r.minutes)
+                            ORDER BY r.minutes DESC) AS places
+            FROM (
+                SELECT day, place_id, SUM(duration_minutes) AS minutes
+                FROM log_daily_rollup, bounds
+                WHERE day BETWEEN bounds.start AND bounds.stop
+                GROUP BY day, place_id
+                HAVING SUM(duration_minutes) > 0
+            ) r
+            LEFT JOIN places p ON p.id = NULLIF(r.place_id, '')
+            GROUP BY r.day
+        )
+        SELECT d.day::date AS day, s.first_arrive_at, s.last_arrive_at, s.last_exit_at,
+               COALESCE(s.log_count, 0) AS log_count, COALESCE(s.tasks_completed, 0) AS tasks_completed,
+               COALESCE(s.events_count, 0) AS events_count, COALESCE(s.notes, '') AS notes,
+               COALESCE(s.entries, '[]') AS entries, COALESCE(m.places, '[]') AS places,
+               COALESCE(m.total_minutes, 0) AS total_minutes
+        FROM bounds
+        CROSS JOIN generate_series(bounds.start, bounds.stop, interval '1 day') AS d(day)
+        LEFT JOIN daily_summaries s ON s.day = d.day::date AND s.day BETWEEN bounds.start AND bounds.stop
+        LEFT JOIN place_minutes m ON m.day = d.day::date
+        ORDER BY d.day
+    """
+    return sql, params
+
+
+def save_day_query(day, notes=None, entries_json=None, paramstyle='psycopg2'):
+    """(sql, params) storing a day's notes and/or entries (a JSON string); None keeps the stored value"""
+    params = Params(paramstyle)
+    sql = f"""
+        WITH saved AS (
+            SELECT {params.add(day)}::date AS day, {params.add(notes)}::text AS notes,
+                   {params.add(entries_json)}::jsonb AS entries
+        )
+        INSERT INTO daily_summaries (day, notes, entries)
+        SELECT day, COALESCE(notes, ''), COALESCE(entries, '[]') FROM saved
+        ON CONFLICT (day) DO UPDATE
+        SET notes = COALESCE((SELECT notes FROM saved), daily_summaries.notes),
+            entries = COALESCE((SELECT entries FROM saved), daily_summaries.entries),
+            updated_at = NOW()
+    """
+    return sql, params
+
+
+def day_counts_query(column, rows, paramstyle='psycopg2'):
+    """(sql, params) applying (day, delta) rows to the tasks_completed or events_count column"""
+    if column not in ('tasks_completed', 'events_count'):
+        raise ValueError(f"Unknown daily summary counter: {column}")
+    params = Params(paramstyle)
+    days, deltas = columns(rows)
+    sql = f"""
+        INSERT INTO daily_summaries (day, {column})
+        SELECT * FROM unnest({params.add(days)}::date[], {params.add(deltas)}::int[])
+        ON CONFLICT (day) DO UPDATE
+        SET {column} = daily_summaries.{column} + EXCLUDED.{column}, updated_at = NOW()
+    """
+    return sql, params
+
+
+def day_log_rows(logs):
+    """Aggregate (timestamp, place_id, event, duration_minutes) logs into
+    (day, count, first_arrive_at, last_arrive_at, last_exit_at) rows"""
+    days = defaultdict(lambda: [0, None, None, None])
+    for timestamp, _, event, _ in logs:
+        day = days[rollup_day(timestamp)]
+        day[0] += 1
+        if event == 'arrive':
+            day[1] = timestamp if day[1] is None else min(day[1], timestamp)
+            day[2] = timestamp if day[2] is None else max(day[2], timestamp)
+        elif event == 'exit':
+            day[3] = timestamp if day[3] is None else max(day[3], timestamp)
+    return [(day, *values) for day, values in days.items()]
+
+
+def record_day_logs(cursor, logs):
+    """Fold inserted logs, given as for rollups.record_logs, into their days"""
+    rows = day_log_rows(logs)
+    if not rows:
+        return
+    cursor.execute(*upsert_day_logs_query(rows))
+
+
+def remove_day_logs(cursor, logs):
+    """Take deleted logs (already gone from logs) out of their days"""
+    rows = [(day, count) for day, count, _, _, _ in day_log_rows(logs)]
+    if not rows:
+        return
+    cursor.execute(*remove_day_logs_query(rows))
+
+
+def moved_day_rows(old_day=None, new_day=None):
+    """(day, delta) rows for something counted under ``old_day`` now counted under ``new_day`` (either may be None)"""
+    if old_day == new_day:
+        return []
+    return [(day, delta) for day, delta in ((old_day, -1), (new_day, 1)) if day is not None]
+
+
+def completion_day(completed_at):
+    """IST day a task's completion is counted under (None while it is not completed)"""
+    return rollup_day(completed_at) if completed_at is not None else None
+
+
+def record_day_counts(cursor, column, rows):
+    """Apply (day, delta) rows to the tasks_completed or events_count column"""
+    if not rows:
+        return
+    cursor.execute(*day_counts_query(column, rows))
+
+
+def read_days(cursor, start, end):
+    """Summary rows (dicts) for every day from ``start`` to ``end`` inclusive"""
+    cursor.execute(*daily_log_query(start, end))
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def save_day(cursor, day, notes=None, entries=None):
+    """Store the daily page's notes and/or entries for a day"""
+    entries = json.dumps(entries) if entries is not None else None
+    cursor.execute(*save_day_query(day, notes, entries))
+
+
+def day_json(row):
+    """JSON form of a read_days() row in the shape the daily page uses"""
+    first_arrive, last_arrive, last_exit = row['first_arrive_at'], row['last_arrive_at'], row['last_exit_at']
+    online = last_arrive is not None and (last_exit is None or last_arrive > last_exit)
+    return {
+        "date": row['day'].isoformat(),
+        "start_time": first_arrive.astimezone(IST).isoformat() if first_arrive else None,
+        "end_time": last_exit.astimezone(IST).isoformat() if last_exit else None,
+        "total_minutes": int(row['total_minutes']),
+        "total_hours": round(int(row['total_minutes']) / 60, 2),
+        "places": row['places'],
+        "event_count": row['log_count'],
+        "tasks_completed": row['tasks_completed'],
+        "events_count": row['events_count'],
+        "tasks": row['entries'],
+        "notes": row['notes'],
+        "breaks": [],
+        "status": 'online' if online else 'offline'
+    }
+
+
+def parse_day_entries(data):
+    """Validate a POSTed daily log; returns (notes, entries), None for fields not sent. Raises ValueError"""
+    notes = data.get('notes')
+    if notes is not None and not isinstance(notes, str):
+        raise ValueError("notes must be a string")
+    entries = data.get('tasks')
+    if entries is not None and (not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries)):
+        raise ValueError("tasks must be a list of objects")
+    return notes, entries
+
+
+def rebuild_daily_summaries(cursor):
+    """Recompute every day's counters from the base tables, keeping saved notes and entries"""
+    cursor.execute("""
+        UPDATE daily_summaries
+        SET first_arrive_at = NULL, last_arrive_at = NULL, last_exit_at = NULL,
+            log_count = 0, tasks_completed = 0, events_count = 0, updated_at = NOW();
+
+        INSERT INTO daily_summaries (day, first_arrive_at, last_arrive_at, last_exit_at, log_count, tasks_completed, events_count)
+        SELECT day, MIN(first_arrive_at), MAX(last_arrive_at), MAX(last_exit_at),
+               SUM(log_count), SUM(tasks_completed), SUM(events_count)
+        FROM (
+            SELECT (timestamp AT TIME ZONE 'Asia/Kolkata')::date AS day,
+                   MIN(timestamp) FILTER (WHERE event = 'arrive') AS first_arrive_at,
+                   MAX(timestamp) FILTER (WHERE event = 'arrive') AS last_arrive_at,
+                   MAX(timestamp) FILTER (WHERE event = 'exit') AS last_exit_at,
+                   COUNT(*) AS log_count, 0 AS tasks_completed, 0 AS events_count
+            FROM logs
+            GROUP BY 1
+            UNION ALL
+            SELECT (completed_at AT TIME ZONE 'Asia/Kolkata')::date, NULL, NULL, NULL, 0, COUNT(*), 0
+            FROM tasks
+            WHERE completed_at IS NOT NULL
+            GROUP BY 1
+            UNION ALL
+            SELECT date, NULL, NULL, NULL, 0, 0, COUNT(*)
+            FROM events
+            GROUP BY 1
+        ) counts
+        GROUP BY day
+        ON CONFLICT (day) DO UPDATE
+        SET first_arrive_at = EXCLUDED.first_arrive_at, last_arrive_at = EXCLUDED.last_arrive_at,
+            last_exit_at = EXCLUDED.last_exit_at, log_count = EXCLUDED.log_count,
+            tasks_completed = EXCLUDED.tasks_completed, events_count = EXCLUDED.events_count;
+
+        DELETE FROM daily_summaries
+        WHERE log_count = 0 AND tasks_completed = 0 AND events_count = 0 AND notes = '' AND entries = '[]';
+    """)
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv('.env.production')
+    if '--rebuild' not in sys.argv[1:]:
+        print(__doc__)
+        sys.exit(2)
+    connection = psycopg2.connect(os.getenv('DATABASE_URL', 'NOURLHERE'), connect_timeout=10)
+    try:
+        cursor = connection.cursor()
+        rebuild_daily_summaries(cursor)
+        connection.commit()
+        cursor.execute("SELECT COUNT(*) FROM daily_summaries")
+        print(f"✅ Rebuilt {cursor.fetchone()[0]} daily summaries")
+    finally:
+        connection.close()
@@ -0,0 +1,265 @@
+"""Thread-safe Postgres connection pool used by every route in app.py"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout"""
+
+
+class ConnectionPool:
+    """Pool of reusable psycopg2 connections.
+
+    Connections are opened lazily up to ``maxconn``, health-checked on checkout
+    when they have been idle for a while, and recycled once they exceed
+    ``max_lifetime`` seconds. Idle connections beyond ``minconn`` are closed
+    after ``max_idle`` seconds. The pool is fork-aware: a child process never
+    reuses sockets inherited from its parent.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0, max_lifetime=1800.0,
+                 max_idle=300.0, check_interval=30.0, on_checkout=None, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        # Optional callback receiving the wait time (seconds) of every checkout
+        self.on_checkout = on_checkout
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        """Forget all connections (used on init and after a fork)"""
+        self._pid = os.getpid()
+        self._idle = deque()    # (conn, created_at, last_used)
+        self._in_use = {}       # id(conn) -> created_at
+        self._opening = 0
+        self._waiting = 0
+        self._draining = False
+        self._stats = {
+            "checkouts": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "connections_recycled": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "wait_count": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Sockets inherited from the parent must not be shared; drop them without closing
+            self._reset_state()
+
+    def _total(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, **self.connect_kwargs)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn):
+        """Cheap liveness probe run on checkout for connections idle past check_interval"""
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _prune_idle(self, now):
+        """Close idle connections past max_idle, keeping at least minconn around"""
+        expired = []
+        while self._idle and self._total() > self.minconn:
+            conn, created_at, last_used = self._idle[0]
+            if now - last_used < self.max_idle:
+                break
+            self._idle.popleft()
+            expired.append(conn)
+        return expired
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds for one to free up"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            to_close = []
+            candidate = None
+            open_new = False
+
+            with self._cond:
+                self._check_pid()
+                now = time.monotonic()
+                to_close.extend(self._prune_idle(now))
+
+                while self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    if conn.closed or now - created_at > self.max_lifetime:
+                        self._stats["connections_recycled"] += 1
+                        to_close.append(conn)
+                        continue
+                    candidate = (conn, created_at, last_used)
+                    self._in_use[id(conn)] = created_at
+                    break
+
+                if candidate is None and self._total() < self.maxconn:
+                    self._opening += 1
+                    open_new = True
+
+                if candidate is None and not open_new:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout:.1f}s "
+                            f"(max {self.maxconn} connections in use)"
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            for conn in to_close:
+                self._close(conn)
+
+            if open_new:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opening -= 1
+                    self._in_use[id(conn)] = time.monotonic()
+                    self._stats["connections_opened"] += 1
+                return self._checked_out(conn, started, waited)
+
+            if candidate is not None:
+                conn, created_at, last_used = candidate
+                if time.monotonic() - last_used > self.check_interval and not self._is_healthy(conn):
+                    with self._cond:
+                        self._in_use.pop(id(conn), None)
+                        self._stats["health_check_failures"] += 1
+                        self._cond.notify()
+                    self._close(conn)
+                    continue
+                return self._checked_out(conn, started, waited)
+
+    def _checked_out(self, conn, started, waited):
+        wait = time.monotonic() - started
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["wait_count"] += 1
+            self._stats["wait_seconds_total"] += wait
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+        if self.on_checkout is not None:
+            self.on_checkout(wait)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            created_at = self._in_use.get(id(conn))
+            if created_at is None:
+                return
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        with self._cond:
+            self._in_use.pop(id(conn), None)
+            recycle = discard or conn.closed or self._draining or now - created_at > self.max_lifetime
+            if recycle and not discard and not conn.closed and not self._draining:
+                self._stats["connections_recycled"] += 1
+            if not recycle:
+                self._idle.append((conn, created_at, now))
+            self._cond.notify()
+
+        if recycle:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def prefill(self):
+        """Open connections until at least minconn are idle or in use"""
+        conns = []
+        try:
+            with self._cond:
+                self._check_pid()
+                missing = self.minconn - self._total()
+            for _ in range(max(missing, 0)):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def closeall(self):
+        """Close every idle connection; checked-out connections are closed when returned"""
+        with self._cond:
+            idle = [conn for conn, _, _ in self._idle]
+            self._idle.clear()
+            self._draining = True
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            self._check_pid()
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "opening": self._opening,
+                "waiting": self._waiting,
+                "size": self._total(),
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+            })
+        return snapshot
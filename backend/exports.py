@@ -0,0 +1,400 @@
+"""Export definitions and streaming writers for /api/export (the async app reuses the formatting helpers)"""
+import contextvars
+import csv
+import io
+import queue
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for format=parquet / format=arrow
+    pa = None
+    pq = None
+
+
+def _iso_sql(expression, with_offset=False):
+    """SQL rendering a timestamp like Python's isoformat() (fractional seconds only when non-zero)"""
+    if with_offset:
+        return f"regexp_replace(to_char({expression}, 'YYYY-MM-DD\"T\"HH24:MI:SS.USTZH:TZM'), '\\.000000([+-])', '\\1')"
+    return f"regexp_replace(to_char({expression}, 'YYYY-MM-DD\"T\"HH24:MI:SS.US'), '\\.000000$', '')"
+
+
+# Each export type: the query (plain tuple rows), the CSV header, a row formatter,
+# the equivalent COPY query (same columns and text rendering, formatted by Postgres),
+# the typed query and column types used by the columnar (Parquet/Arrow) exports,
+# the section title used by the combined export and the download filename prefix
+EXPORTS = {
+    'logs': {
+        'query': """
+            SELECT l.timestamp AT TIME ZONE 'Asia/Kolkata' as timestamp, l.event, l.lat, l.lon, p.name as place_name, l.notes, l.duration_minutes, l.mode
+            FROM logs l
+            LEFT JOIN places p ON l.place_id = p.id
+            ORDER BY l.timestamp DESC
+        """,
+        'fieldnames': ['timestamp', 'event', 'lat', 'lon', 'place', 'notes', 'duration_minutes', 'mode'],
+        'format_row': lambda log: [
+            log[0].isoformat() if log[0] else '',
+            log[1],
+            str(log[2]),
+            str(log[3]),
+            log[4] if log[4] else 'unknown',
+            log[5] if log[5] else '',
+            str(log[6]) if log[6] else '0',
+            log[7] if log[7] else 'Manual'
+        ],
+        'copy_query': """
+            SELECT {ts} AS timestamp, l.event, l.lat, l.lon,
+                   COALESCE(NULLIF(p.name, ''), 'unknown') AS place, NULLIF(l.notes, '') AS notes,
+                   COALESCE(l.duration_minutes, 0) AS duration_minutes, COALESCE(NULLIF(l.mode, ''), 'Manual') AS mode
+            FROM logs l
+            LEFT JOIN places p ON l.place_id = p.id
+            ORDER BY l.timestamp DESC
+        """.format(ts=_iso_sql("l.timestamp AT TIME ZONE 'Asia/Kolkata'")),
+        'columnar_query': """
+            SELECT l.timestamp, l.event, l.lat, l.lon, COALESCE(p.name, 'unknown') AS place, l.notes,
+                   COALESCE(l.duration_minutes, 0) AS duration_minutes, COALESCE(l.mode, 'Manual') AS mode
+            FROM logs l
+            LEFT JOIN places p ON l.place_id = p.id
+            ORDER BY l.timestamp DESC
+        """,
+        'columns': [('timestamp', 'timestamp'), ('event', 'string'), ('lat', 'float64'), ('lon', 'float64'),
+                    ('place', 'string'), ('notes', 'string'), ('duration_minutes', 'int32'), ('mode', 'string')],
+        'section': 'LOGS',
+        'filename': 'work_logs',
+    },
+    'places': {
+        'query': "SELECT id, name, lat, lon, geofence_radius, type FROM places ORDER BY name",
+        'fieldnames': ['id', 'name', 'lat', 'lon', 'geofence_radius', 'type'],
+        'format_row': lambda place: [
+            place[0],
+            place[1],
+            str(place[2]),
+            str(place[3]),
+            str(place[4]) if place[4] else '0',
+            place[5] if place[5] else ''
+        ],
+        'copy_query': """
+            SELECT id, name, lat, lon, COALESCE(geofence_radius, 0) AS geofence_radius, NULLIF(type, '') AS type
+            FROM places ORDER BY name
+        """,
+        'columnar_query': "SELECT id, name, lat, lon, geofence_radius, type FROM places ORDER BY name",
+        'columns': [('id', 'string'), ('name', 'string'), ('lat', 'float64'), ('lon', 'float64'),
+                    ('geofence_radius', 'int32'), ('type', 'string')],
+        'section': 'PLACES',
+        'filename': 'work_places',
+    },
+    'tasks': {
+        'query': "SELECT id, title, description, status, created_at AT TIME ZONE 'Asia/Kolkata' as created_at, completed_at AT TIME ZONE 'Asia/Kolkata' as completed_at, priority, due_by FROM tasks ORDER BY created_at DESC",
+        'fieldnames': ['id', 'title', 'description', 'status', 'created_at', 'completed_at', 'priority', 'due_by'],
+        'format_row': lambda task: [
+            task[0],
+            task[1],
+            task[2] if task[2] else '',
+            task[3],
+            task[4].isoformat() if task[4] else '',
+            task[5].isoformat() if task[5] else '',
+            task[6] if task[6] else '',
+            task[7].isoformat() if task[7] else ''
+        ],
+        'copy_query': """
+            SELECT id, title, NULLIF(description, '') AS description, status,
+                   {created_at} AS created_at, {completed_at} AS completed_at,
+                   NULLIF(priority, '') AS priority, {due_by} AS due_by
+            FROM tasks ORDER BY tasks.created_at DESC
+        """.format(
+            created_at=_iso_sql("created_at AT TIME ZONE 'Asia/Kolkata'"),
+            completed_at=_iso_sql("completed_at AT TIME ZONE 'Asia/Kolkata'"),
+            due_by=_iso_sql("due_by", with_offset=True)
+        ),
+        'columnar_query': "SELECT id, title, description, status, created_at, completed_at, priority, due_by FROM tasks ORDER BY created_at DESC",
+        'columns': [('id', 'string'), ('title', 'string'), ('description', 'string'), ('status', 'string'),
+                    ('created_at', 'timestamp'), ('completed_at', 'timestamp'), ('priority', 'string'),
+                    ('due_by', 'timestamp')],
+        'section': 'TASKS',
+        'filename': 'work_tasks',
+    },
+    'events': {
+        'query': "SELECT id, title, description, date FROM events ORDER BY date DESC",
+        'fieldnames': ['id', 'title', 'description', 'date'],
+        'format_row': lambda event: [
+            event[0],
+            event[1],
+            event[2] if event[2] else '',
+            event[3].isoformat() if event[3] else ''
+        ],
+        'copy_query': """
+            SELECT id, title, NULLIF(description, '') AS description, to_char(date, 'YYYY-MM-DD') AS date
+            FROM events ORDER BY events.date DESC
+        """,
+        'columnar_query': "SELECT id, title, description, date FROM events ORDER BY date DESC",
+        'columns': [('id', 'string'), ('title', 'string'), ('description', 'string'), ('date', 'date')],
+        'section': 'EVENTS',
+        'filename': 'work_events',
+    },
+}
+
+# The combined export writes every type as a titled section, in this order
+COMBINED_EXPORTS = ['logs', 'places', 'tasks', 'events']
+COMBINED_FILENAME = 'worklog_combined'
+
+
+def export_types(export_type):
+    """Export types making up a request, or None if the type is unknown"""
+    if export_type == 'combined':
+        return COMBINED_EXPORTS
+    if export_type in EXPORTS:
+        return [export_type]
+    return None
+
+
+def iter_rows(conn, export_type, chunk_size):
+    """Yield lists of rows from a named (server-side) cursor, chunk_size rows at a time"""
+    cursor = conn.cursor(name=f'export_{export_type}')
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(EXPORTS[export_type]['query'])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def csv_section(export_type, name, index):
+    """Title line opening a type's section of the combined export ('' for single-type exports)"""
+    if export_type != 'combined':
+        return ''
+    return ('\n' if index else '') + f"=== {EXPORTS[name]['section']} ===\n"
+
+
+def format_csv(export_type, rows, header=False):
+    """CSV text for a chunk of an export type's rows, led by the header line when ``header`` is set"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    spec = EXPORTS[export_type]
+    if header:
+        writer.writerow(spec['fieldnames'])
+    writer.writerows(spec['format_row'](row) for row in rows)
+    return buffer.getvalue()
+
+
+def stream_csv(conn, export_type, chunk_size=2000):
+    """Generate the CSV for an export type chunk by chunk in constant memory"""
+    for index, name in enumerate(export_types(export_type)):
+        # Like the original export, the header is only written when there is data
+        pending, header = csv_section(export_type, name, index), True
+        for rows in iter_rows(conn, name, chunk_size):
+            yield pending + format_csv(name, rows, header)
+            pending, header = '', False
+        if pending:
+            yield pending
+
+    # Server-side cursors live in a transaction; end it so the connection goes back clean
+    conn.rollback()
+
+
+def csv_header(export_type):
+    """The CSV header line of an export type; COPY exports write it just before their first row"""
+    return ','.join(EXPORTS[export_type]['fieldnames']) + '\n'
+
+
+class _QueueWriter:
+    """File-like sink for copy_expert that hands buffered bytes to a bounded queue"""
+
+    def __init__(self, out, cancelled, flush_bytes):
+        self.out = out
+        self.cancelled = cancelled
+        self.flush_bytes = flush_bytes
+        self.buffer = bytearray()
+        self.header = None
+
+    def write(self, data):
+        if self.header and data:
+            # Held back until COPY produces a row, so empty tables get no header (like stream_csv)
+            self.buffer += self.header.encode('utf-8')
+            self.header = None
+        self.buffer += data.encode('utf-8') if isinstance(data, str) else data
+        if len(self.buffer) >= self.flush_bytes:
+            self.flush()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                # Raising inside write() aborts the running COPY
+                raise RuntimeError("Export cancelled by client")
+            try:
+                self.out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+
+_COPY_DONE = object()
+
+
+def stream_copy(conn, export_type, flush_bytes=65536):
+    """Generate CSV bytes straight from COPY (SELECT ...) TO STDOUT, with no per-row Python formatting.
+
+    COPY runs in a helper thread that feeds a bounded queue, so the download
+    starts immediately and memory stays bounded. Closing the generator (client
+    disconnect) cancels the COPY and waits for the thread before the
+    connection can go back to the pool.
+    """
+    out = queue.Queue(maxsize=16)
+    cancelled = threading.Event()
+    writer = _QueueWriter(out, cancelled, flush_bytes)
+
+    def run():
+        try:
+            cursor = conn.cursor()
+            for index, name in enumerate(export_types(export_type)):
+                writer.write(csv_section(export_type, name, index))
+                writer.header = csv_header(name)
+                cursor.copy_expert(f"COPY ({EXPORTS[name]['copy_query']}) TO STDOUT WITH CSV", writer)
+                writer.header = None
+                writer.flush()
+            cursor.close()
+            conn.rollback()
+            writer.put(_COPY_DONE)
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            if not cancelled.is_set():
+                out.put(e)
+
+    # Run in a copy of the caller's context so context-local state (e.g. metrics tags) carries over
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(run,),
+                              name=f"export-copy-{export_type}", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _COPY_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        while worker.is_alive():
+            try:
+                out.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        worker.join()
+
+
+# Columnar export formats: file extension and MIME type
+COLUMNAR_FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+def _arrow_schema(columns):
+    types = {
+        'string': pa.string(),
+        'float64': pa.float64(),
+        'int32': pa.int32(),
+        'date': pa.date32(),
+        # Stored as UTC instants; readers display them in IST
+        'timestamp': pa.timestamp('us', tz='Asia/Kolkata'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class _ByteSink:
+    """Write-only file object collecting what the Arrow writers emit until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ColumnarWriter:
+    """Encodes chunks of an export type's typed rows as Parquet row groups or Arrow record batches.
+
+    write() and close() return the bytes produced so far, so they can be sent
+    as soon as each chunk is encoded. Parquet output is zstd-compressed.
+    """
+
+    def __init__(self, export_type, format_type):
+        self.schema = _arrow_schema(EXPORTS[export_type]['columns'])
+        self.sink = _ByteSink()
+        stream = pa.PythonFile(self.sink, mode='w')
+        if format_type == 'parquet':
+            self.writer = pq.ParquetWriter(stream, self.schema, compression='zstd')
+        else:
+            self.writer = pa.ipc.new_stream(stream, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        )
+        self.writer.write_batch(batch)
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+def stream_columnar(conn, export_type, format_type, chunk_size=50000):
+    """Generate a Parquet file or Arrow IPC stream with typed columns, one record batch per cursor chunk.
+
+    Each chunk from the server-side cursor becomes a Parquet row group (or an
+    Arrow record batch) and is sent as soon as it is written, so memory stays
+    bounded by the chunk size.
+    """
+    writer = ColumnarWriter(export_type, format_type)
+    cursor = conn.cursor(name=f'export_{export_type}_{format_type}')
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(EXPORTS[export_type]['columnar_query'])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            data = writer.write(rows)
+            if data:
+                yield data
+        yield writer.close()
+    finally:
+        cursor.close()
+        conn.rollback()
@@ -0,0 +1,119 @@
+"""Geographic helpers shared by place lookups, the places index and track simplification"""
+from math import radians, cos, sin, asin, sqrt
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000  # Earth's radius in meters
+METERS_PER_DEGREE_LAT = 111320
+
+# 7 chunks of 5 bits cover any coordinate delta up to precision 7; values are encoded this many at a time
+POLYLINE_CHUNKS = 7
+POLYLINE_BATCH = 1 << 16
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points in meters using Haversine formula"""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+    return c * EARTH_RADIUS_M
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """Haversine on radian arrays (broadcasting) in meters"""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_many(lat, lon, lats, lons):
+    """Distances in meters from one point to each of ``lats``/``lons`` as a 1-D array"""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    return _haversine(radians(lat), radians(lon), lats, lons)
+
+
+def haversine_pairs(lats1, lons1, lats2, lons2):
+    """Element-wise distances in meters between (lats1[i], lons1[i]) and (lats2[i], lons2[i])"""
+    return _haversine(np.radians(np.asarray(lats1, dtype=np.float64)), np.radians(np.asarray(lons1, dtype=np.float64)),
+                      np.radians(np.asarray(lats2, dtype=np.float64)), np.radians(np.asarray(lons2, dtype=np.float64)))
+
+
+def _segment_distances(px, py, ax, ay, bx, by):
+    """Planar distances from points p to segments a-b (all arrays, same shape)"""
+    dx = bx - ax
+    dy = by - ay
+    length2 = dx * dx + dy * dy
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify_track(lats, lons, tolerance):
+    """Indexes of the points Douglas-Peucker keeps at ``tolerance`` meters.
+
+    Points are projected to local equirectangular meters and every pending
+    segment is split in the same numpy pass, so the Python loop runs once
+    per recursion level instead of once per segment.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    n = len(lats)
+    if n <= 2 or tolerance <= 0:
+        return np.arange(n)
+
+    y = lats * METERS_PER_DEGREE_LAT
+    x = lons * METERS_PER_DEGREE_LAT * cos(radians(float(lats.mean())))
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    while len(starts):
+        # Interior points of every segment, concatenated segment by segment
+        lengths = ends - starts - 1
+        offsets = np.cumsum(lengths) - lengths
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        points = starts[segment] + 1 + np.arange(lengths.sum()) - offsets[segment]
+        a, b = starts[segment], ends[segment]
+        distances = _segment_distances(x[points], y[points], x[a], y[a], x[b], y[b])
+
+        farthest = np.maximum.reduceat(distances, offsets)
+        # First point of each segment reaching its maximum
+        candidates = np.flatnonzero(distances == farthest[segment])
+        _, first = np.unique(segment[candidates], return_index=True)
+        split = points[candidates[first]]
+
+        far = farthest > tolerance
+        split = split[far]
+        keep[split] = True
+        starts = np.concatenate([starts[far], split])
+        ends = np.concatenate([split, ends[far]])
+        pending = ends - starts > 1
+        starts, ends = starts[pending], ends[pending]
+    return np.flatnonzero(keep)
+
+
+def encode_polyline(lats, lons, precision=5):
+    """Encoded polyline (Google's algorithm) of the points at ``precision`` decimal places.
+
+    Coordinates are rounded, delta-encoded against the previous point and
+    written as base64-like 5-bit chunks; 5 is what Leaflet and Google Maps
+    decoders expect, 6 is the OSRM/Valhalla variant.
+    """
+    factor = 10 ** precision
+    values = np.empty((len(lats), 2), dtype=np.int64)
+    values[:, 0] = np.round(np.asarray(lats, dtype=np.float64) * factor)
+    values[:, 1] = np.round(np.asarray(lons, dtype=np.float64) * factor)
+    deltas = np.diff(values, axis=0, prepend=0).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Every value as POLYLINE_CHUNKS 5-bit chunks, low bits first, 0x20 set while more follow
+    shifts = np.arange(POLYLINE_CHUNKS) * 5
+    encoded = []
+    for start in range(0, len(zigzag), POLYLINE_BATCH):
+        batch = zigzag[start:start + POLYLINE_BATCH, None]
+        more = (batch >> (shifts + 5)) > 0
+        chars = ((batch >> shifts) & 0x1f | np.where(more, 0x20, 0)) + 63
+        used = np.concatenate([np.ones((len(batch), 1), dtype=bool), more[:, :-1]], axis=1)
+        encoded.append(chars[used].astype(np.uint8).tobytes().decode('ascii'))
+    return ''.join(encoded)
@@ -0,0 +1,60 @@
+"""Gunicorn settings for the production backend (see wsgi.py)"""
+import multiprocessing
+import os
+import sys
+
+# Server socket
+bind = f"0.0.0.0:{os.getenv('PORT', 5051)}"
+
+# Worker processes x threads. Each worker has its own connection pool, so keep
+# DB_POOL_MAX_SIZE >= GUNICORN_THREADS.
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+# The app reads this to tell whether an in-process response cache would be shared
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+# Import the app once in the master: migrations and the places index warm-up run once
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() != 'false'
+
+# Long enough for large streamed exports; in-flight requests get graceful_timeout on shutdown
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth (0 disables)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def pre_fork(server, worker):
+    # Close the master's connections (used for migrations/warm-up) so no socket is inherited.
+    # Without preload the app was never imported here, and importing it now would do all that work.
+    app = sys.modules.get('app')
+    if app is not None:
+        app.db_pool.closeall()
+
+
+def post_fork(server, worker):
+    from app import db_pool, ingest_queue
+    if ingest_queue is not None:
+        # Drain anything left in the journal by a previous run
+        ingest_queue.start()
+    try:
+        db_pool.prefill()
+    except Exception as e:
+        server.log.warning(f"⚠️ Could not prefill connection pool in worker {worker.pid}: {e}")
+
+
+def worker_exit(server, worker):
+    # Runs after in-flight requests finish (or graceful_timeout expires)
+    from app import db_pool, ingest_queue, reclassify_runner
+    if ingest_queue is not None:
+        ingest_queue.stop()
+    # A paused reclassification resumes from its last committed chunk on the next run
+    reclassify_runner.stop(timeout=graceful_timeout)
+    db_pool.closeall()
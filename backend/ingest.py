@@ -0,0 +1,258 @@
+"""Bulk ingest of location events (offline replay from phones)"""
+from datetime import datetime
+
+from daily import record_day_logs
+from rollups import record_logs
+from sqlparams import Params, columns
+from visits import latest_paired_events, lock_open_visits, plan_visits, record_visits
+
+
+def parse_timestamp(value, tz):
+    """Parse a client timestamp (ISO 8601 string or epoch seconds); naive values are taken as ``tz``"""
+    if isinstance(value, bool):
+        raise ValueError("Invalid timestamp")
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("Invalid timestamp")
+    parsed = datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed
+
+
+def prepare_event(item, now, tz):
+    """Validate one batch item and normalise it into the fields stored in logs"""
+    if not isinstance(item, dict):
+        raise ValueError("Event must be a JSON object")
+    for field in ['event', 'lat', 'lon']:
+        if field not in item:
+            raise ValueError(f"Missing required field: {field}")
+
+    event = item['event']
+    if not isinstance(event, str) or not event:
+        raise ValueError("Invalid event")
+    try:
+        lat = float(item['lat'])
+        lon = float(item['lon'])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid latitude or longitude format")
+
+    timestamp = now
+    if item.get('timestamp') is not None:
+        try:
+            timestamp = parse_timestamp(item['timestamp'], tz)
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValueError(f"Invalid timestamp: {item['timestamp']}")
+
+    duration_minutes = item.get('duration_minutes', 0) or 0
+    try:
+        duration_minutes = int(duration_minutes)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid duration_minutes")
+
+    source = item.get('source', 'manual')
+    return {
+        "timestamp": timestamp,
+        "event": event,
+        "lat": lat,
+        "lon": lon,
+        "notes": item.get('notes', '') or '',
+        "duration_minutes": duration_minutes,
+        "auto_duration": event == 'exit' and duration_minutes == 0,
+        "mode": 'iPhone' if source == 'iphone' else 'Manual',
+    }
+
+
+def insert_log_query(timestamp, event, lat, lon, place_id, notes, duration_minutes, mode, auto_duration=False,
+                     paramstyle='psycopg2'):
+    """(sql, params) inserting one log row with its visit pairing, rollup delta and day summary.
+
+    The statement pairs the event with its place's open visit (found
+    through the open-visit index): an exit closes it and, with
+    auto_duration, takes its duration from it; an arrive opens a new one.
+    The place id is re-checked against places so a stale geofence index can
+    never violate the foreign key. Returns one row of (id,
+    duration_minutes, place_id, visit_id, visit_arrived_at, closed) where
+    visit_id/visit_arrived_at describe a visit left open.
+    """
+    params = Params(paramstyle)
+    # Bound once in args and reused: psycopg2 placeholders are positional
+    sql = f"""
+        WITH args AS (
+            SELECT {params.add(timestamp)}::timestamptz AS timestamp, {params.add(event)}::text AS event,
+                   {params.add(lat)}::float8 AS lat, {params.add(lon)}::float8 AS lon,
+                   {params.add(place_id)}::text AS place_id, {params.add(notes)}::text AS notes,
+                   {params.add(int(duration_minutes or 0))}::int AS duration_minutes,
+                   {params.add(mode)}::text AS mode, {params.add(bool(auto_duration))}::boolean AS auto_duration
+        ), place AS (
+            SELECT (SELECT id FROM places WHERE id = args.place_id) AS place_id FROM args
+        ), open_visit AS (
+            SELECT v.id, v.arrived_at FROM visits v, place, args
+            WHERE COALESCE(v.place_id, '') = COALESCE(place.place_id, '') AND v.open
+              AND args.event IN ('arrive', 'exit')
+            FOR UPDATE OF v
+        ), new_log AS (
+        INSERT INTO logs (timestamp, event, lat, lon, place_id, notes, duration_minutes, mode)
+        SELECT a.timestamp, a.event, a.lat, a.lon, place.place_id, a.notes,
+               CASE WHEN a.auto_duration THEN COALESCE((
+                   SELECT GREATEST(FLOOR(EXTRACT(EPOCH FROM (a.timestamp - arrived_at)) / 60), 0)::int
+                   FROM open_visit
+                   WHERE arrived_at <= a.timestamp
+               ), 0) ELSE a.duration_minutes END,
+               a.mode
+        FROM place, args a
+        RETURNING id, timestamp, event, place_id, duration_minutes
+        ), closed AS (
+            -- An exit closes the open visit; an arrive closes it as a missed exit
+            UPDATE visits v
+            SET open = FALSE,
+                exited_at = CASE WHEN n.event = 'exit' THEN n.timestamp END,
+                exit_log_id = CASE WHEN n.event = 'exit' THEN n.id END,
+                duration_minutes = CASE WHEN n.event = 'exit'
+                    THEN GREATEST(FLOOR(EXTRACT(EPOCH FROM (n.timestamp - v.arrived_at)) / 60), 0)::int END
+            FROM new_log n, open_visit o
+            WHERE v.id = o.id AND o.arrived_at <= n.timestamp
+            RETURNING v.id
+        ), new_visit AS (
+            -- Arrives open a visit unless replayed from before a stored event at the place; unpaired
+            -- exits stand alone. Reading COUNT(*) FROM closed closes the open visit before this insert.
+            INSERT INTO visits (place_id, arrived_at, arrive_log_id, exited_at, exit_log_id, open)
+            SELECT n.place_id,
+                   CASE WHEN n.event = 'arrive' THEN n.timestamp END,
+                   CASE WHEN n.event = 'arrive' THEN n.id END,
+                   CASE WHEN n.event = 'exit' THEN n.timestamp END,
+                   CASE WHEN n.event = 'exit' THEN n.id END,
+                   n.event = 'arrive' AND NOT EXISTS (
+                       SELECT 1 FROM logs l
+                       WHERE l.event IN ('arrive', 'exit') AND l.timestamp > n.timestamp
+                         AND (l.place_id = n.place_id OR (n.place_id IS NULL AND l.place_id IS NULL))
+                   )
+            FROM new_log n, (SELECT COUNT(*) AS closed_count FROM closed) c
+            WHERE n.event = 'arrive' OR (n.event = 'exit' AND c.closed_count = 0)
+            ON CONFLICT ((COALESCE(place_id, ''))) WHERE open DO NOTHING
+            RETURNING id, place_id, arrived_at, open
+        ), rollup AS (
+            INSERT INTO log_daily_rollup (day, place_id, event, log_count, duration_minutes)
+            SELECT (timestamp AT TIME ZONE 'Asia/Kolkata')::date, COALESCE(place_id, ''), event, 1, COALESCE(duration_minutes, 0)
+            FROM new_log
+            ON CONFLICT (day, place_id, event) DO UPDATE
+            SET log_count = log_daily_rollup.log_count + EXCLUDED.log_count,
+                duration_minutes = log_daily_rollup.duration_minutes + EXCLUDED.duration_minutes
+        ), day_summary AS (
+            INSERT INTO daily_summaries (day, log_count, first_arrive_at, last_arrive_at, last_exit_at)
+            SELECT (timestamp AT TIME ZONE 'Asia/Kolkata')::date, 1,
+                   CASE WHEN event = 'arrive' THEN timestamp END,
+                   CASE WHEN event = 'arrive' THEN timestamp END,
+                   CASE WHEN event = 'exit' THEN timestamp END
+            FROM new_log
+            ON CONFLICT (day) DO UPDATE
+            SET log_count = daily_summaries.log_count + EXCLUDED.log_count,
+                first_arrive_at = LEAST(daily_summaries.first_arrive_at, EXCLUDED.first_arrive_at),
+                last_arrive_at = GREATEST(daily_summaries.last_arrive_at, EXCLUDED.last_arrive_at),
+                last_exit_at = GREATEST(daily_summaries.last_exit_at, EXCLUDED.last_exit_at),
+                updated_at = NOW()
+        )
+        SELECT n.id, n.duration_minutes, n.place_id,
+               (SELECT id FROM new_visit WHERE open) AS visit_id,
+               (SELECT arrived_at FROM new_visit WHERE open) AS visit_arrived_at,
+               EXISTS (SELECT 1 FROM closed) AS closed
+        FROM new_log n
+    """
+    return sql, params
+
+
+def existing_places_query(place_ids, paramstyle='psycopg2'):
+    """(sql, params) for the ids among ``place_ids`` still in places"""
+    params = Params(paramstyle)
+    return f"SELECT id FROM places WHERE id = ANY({params.add(place_ids)}::text[])", params
+
+
+def insert_logs_query(rows, paramstyle='psycopg2'):
+    """(sql, params) inserting plan_rows() rows in one statement, returning their ids in order"""
+    params = Params(paramstyle)
+    timestamps, events, lats, lons, place_ids, notes, durations, modes = columns(rows)
+    sql = f"""
+        INSERT INTO logs (timestamp, event, lat, lon, place_id, notes, duration_minutes, mode)
+        SELECT * FROM unnest({params.add(timestamps)}::timestamptz[], {params.add(events)}::text[],
+                             {params.add(lats)}::float8[], {params.add(lons)}::float8[],
+                             {params.add(place_ids)}::text[], {params.add(notes)}::text[],
+                             {params.add(durations)}::int[], {params.add(modes)}::text[])
+        RETURNING id
+    """
+    return sql, params
+
+
+def plan_rows(ordered, places, durations):
+    """Fill in exit durations and return the logs rows for events sorted by timestamp.
+
+    ``places`` holds the (place_id, place_name) of each event and
+    ``durations`` the visit durations paired by visits.plan_visits.
+    """
+    rows = []
+    for event, (place_id, _), paired in zip(ordered, places, durations):
+        duration_minutes = event['duration_minutes']
+        if event['auto_duration']:
+            duration_minutes = paired or 0
+            event['duration_minutes'] = duration_minutes
+        rows.append((event['timestamp'], event['event'], event['lat'], event['lon'], place_id,
+                     event['notes'], duration_minutes, event['mode']))
+    return rows
+
+
+def ingest_results(count, order, ordered, ids, places):
+    """Per-event result dicts in input order for events inserted as ``ids`` (timestamp order)"""
+    results = [None] * count
+    for position, (log_id, (_, place_name)) in enumerate(zip(ids, places)):
+        event = ordered[position]
+        results[order[position]] = {
+            "success": True,
+            "id": log_id,
+            "event": event['event'],
+            "timestamp": event['timestamp'].isoformat(),
+            "place": place_name,
+            "duration_minutes": event['duration_minutes'],
+        }
+    return results
+
+
+def ingest_events(cursor, events, resolve_places, open_visits=None):
+    """Insert prepared events in timestamp order and return one result dict per event (input order).
+
+    ``resolve_places(points)`` maps a list of (lat, lon) to (place_id,
+    place_name) pairs in one vectorized geofence pass. Arrives and exits are
+    paired per place into visits (continuing the places' stored open visits)
+    and exits without a duration take it from their visit. Rows are written
+    with a single multi-row INSERT and folded into the dashboard rollup and
+    the day summaries;
+    ``open_visits`` (a visits.OpenVisits) is kept in step when given.
+    """
+    if not events:
+        return []
+
+    order = sorted(range(len(events)), key=lambda i: events[i]['timestamp'])
+    ordered = [events[i] for i in order]
+
+    # Geofence resolution; place ids are re-checked in one query so a stale index can't break the FK
+    places = resolve_places([(e['lat'], e['lon']) for e in ordered])
+    candidate_ids = sorted({place_id for place_id, _ in places if place_id is not None})
+    if candidate_ids:
+        cursor.execute(*existing_places_query(candidate_ids))
+        existing = {row[0] for row in cursor.fetchall()}
+        places = [(place_id, name) if place_id in existing else (None, "unknown") for place_id, name in places]
+
+    paired_places = [place_id for (place_id, _), e in zip(places, ordered) if e['event'] in ('arrive', 'exit')]
+    stored_visits = lock_open_visits(cursor, paired_places)
+    durations, closes, visit_rows = plan_visits(ordered, places, stored_visits, latest_paired_events(cursor, paired_places))
+    rows = plan_rows(ordered, places, durations)
+    cursor.execute(*insert_logs_query(rows))
+    ids = [row[0] for row in cursor.fetchall()]
+    opened = record_visits(cursor, closes, visit_rows, ids)
+    logs = [(row[0], row[4], row[1], row[6]) for row in rows]
+    record_logs(cursor, logs)
+    record_day_logs(cursor, logs)
+    if open_visits is not None:
+        closed_ids = {visit_id for visit_id, _, _, _ in closes}
+        open_visits.update([key for key, visit in stored_visits.items() if visit['id'] in closed_ids], opened)
+
+    return ingest_results(len(events), order, ordered, ids, places)
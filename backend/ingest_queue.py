@@ -0,0 +1,234 @@
+"""Write-behind queue for location events.
+
+Events are appended to a local SQLite journal and acknowledged immediately; a
+background thread drains the journal into Postgres in batches, in enqueue
+order, so arrive/exit pairing sees events in the order they happened. If the
+database is unreachable the events stay in the journal and the drain is
+retried with backoff. Several processes (gunicorn workers) can share one
+journal: an flock on ``<path>.lock`` makes sure only one of them drains at a
+time.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: assume a single process
+    fcntl = None
+
+
+def _encode(event):
+    return json.dumps({
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in event.items()
+    })
+
+
+def _decode(payload):
+    event = json.loads(payload)
+    event['timestamp'] = datetime.fromisoformat(event['timestamp'])
+    return event
+
+
+class IngestQueue:
+    """Durable local journal of prepared events plus the thread that drains it.
+
+    ``drain(events)`` must write the events (dicts from ingest.prepare_event)
+    to the database and commit, or raise. Exceptions listed in
+    ``transient_errors`` (connection failures, pool timeouts) leave the batch
+    queued for a retry; any other error retries the events one at a time and
+    moves those that still fail to the ``dead_letter`` table.
+    """
+
+    def __init__(self, path, drain, batch_size=500, interval=0.5, max_retry_delay=30.0,
+                 transient_errors=()):
+        self.path = path
+        self.drain = drain
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retry_delay = max_retry_delay
+        self.transient_errors = tuple(transient_errors)
+        self._lock = threading.Lock()
+        self._reset_state()
+
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS queue (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                seq INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            );
+        """)
+        conn.close()
+
+    def _reset_state(self):
+        """Forget the journal connection and drain thread (used on init and after a fork)"""
+        self._pid = os.getpid()
+        self._conn = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._stats = {
+            "enqueued": 0,
+            "drained": 0,
+            "dead_lettered": 0,
+            "drain_failures": 0,
+            "last_error": None,
+            "last_drain_at": None,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: an acknowledged event survives a power loss, not just a process crash
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _journal(self):
+        # Caller holds self._lock
+        if self._pid != os.getpid():
+            self._reset_state()
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def enqueue(self, event):
+        """Append one prepared event to the journal and return its sequence number"""
+        with self._lock:
+            cursor = self._journal().execute(
+                "INSERT INTO queue (payload, enqueued_at) VALUES (?, ?)",
+                (_encode(event), time.time())
+            )
+            self._stats["enqueued"] += 1
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def start(self):
+        """Start the drain thread in this process if it is not running"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_state()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ingest-queue-drain', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop the drain thread after one last drain attempt"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        thread.join(timeout)
+
+    def _run(self):
+        delay = self.interval
+        lock_file = open(self.path + '.lock', 'a') if fcntl is not None else None
+        try:
+            while True:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                stopping = self._stopping
+
+                if lock_file is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # Another process is draining
+                        delay = self.interval
+                        if stopping:
+                            return
+                        continue
+                try:
+                    while self._drain_batch():
+                        pass
+                    delay = self.interval
+                except self.transient_errors as e:
+                    self._stats["drain_failures"] += 1
+                    self._stats["last_error"] = str(e)
+                    delay = min(max(delay * 2, 1.0), self.max_retry_delay)
+                    print(f"⚠️ Ingest queue drain failed, retrying in {delay:.0f}s: {e}")
+                except Exception as e:
+                    self._stats["drain_failures"] += 1
+                    self._stats["last_error"] = str(e)
+                    delay = self.max_retry_delay
+                    print(f"❌ Error draining ingest queue: {e}")
+                finally:
+                    if lock_file is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+                if stopping:
+                    return
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _drain_batch(self):
+        """Write the oldest batch to the database; returns True if it was a full batch"""
+        with self._lock:
+            rows = self._journal().execute(
+                "SELECT seq, payload FROM queue ORDER BY seq LIMIT ?", (self.batch_size,)
+            ).fetchall()
+        if not rows:
+            return False
+
+        try:
+            self.drain([_decode(payload) for _, payload in rows])
+            done, dead = rows, []
+        except self.transient_errors:
+            raise
+        except Exception:
+            # Isolate the bad event(s) so they can't block the rest of the queue
+            done, dead = [], []
+            for seq, payload in rows:
+                try:
+                    self.drain([_decode(payload)])
+                    done.append((seq, payload))
+                except self.transient_errors:
+                    break
+                except Exception as e:
+                    print(f"❌ Moving queued event {seq} to dead_letter: {e}")
+                    dead.append((seq, payload, str(e)))
+
+        with self._lock:
+            journal = self._journal()
+            journal.execute("BEGIN IMMEDIATE")
+            journal.executemany("DELETE FROM queue WHERE seq = ?", [(seq,) for seq, _ in done])
+            journal.executemany(
+                "INSERT OR REPLACE INTO dead_letter (seq, payload, error, failed_at) VALUES (?, ?, ?, ?)",
+                [(seq, payload, error, time.time()) for seq, payload, error in dead]
+            )
+            journal.executemany("DELETE FROM queue WHERE seq = ?", [(seq,) for seq, _, _ in dead])
+            journal.execute("COMMIT")
+            self._stats["drained"] += len(done)
+            self._stats["dead_lettered"] += len(dead)
+            self._stats["last_drain_at"] = datetime.now().isoformat()
+        return len(rows) == self.batch_size and len(done) + len(dead) == len(rows)
+
+    def stats(self):
+        """Queue depth and drain counters for this process"""
+        with self._lock:
+            journal = self._journal()
+            depth, oldest = journal.execute("SELECT COUNT(*), MIN(enqueued_at) FROM queue").fetchone()
+            dead = journal.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+            snapshot = dict(self._stats)
+        snapshot.update({
+            "depth": depth,
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest else 0,
+            "dead_letter": dead,
+            "draining": self._thread is not None and self._thread.is_alive(),
+        })
+        return snapshot
@@ -0,0 +1,121 @@
+"""Server-side clustering of logged locations for the map (/api/map/points).
+
+Points are aggregated on a grid aligned with the Web Mercator (slippy map)
+tiles of the requested zoom: every tile is split into CLUSTER_GRID x
+CLUSTER_GRID cells and each non-empty cell becomes one cluster (count and
+centroid). A response therefore holds at most tiles x CLUSTER_GRID² clusters
+however many logs there are, and each tile's clusters can be cached on their
+own so panning only computes the newly visible tiles.
+"""
+import math
+from datetime import timedelta
+
+from sqlparams import Params
+
+# Mercator is undefined at the poles; map libraries clip latitudes here
+MAX_LAT = 85.0511287798
+MAX_ZOOM = 22
+
+
+def clamp_lat(lat):
+    return max(-MAX_LAT, min(MAX_LAT, lat))
+
+
+def tile_x(lon, zoom):
+    return int((lon + 180.0) / 360.0 * (1 << zoom))
+
+
+def tile_y(lat, zoom):
+    lat = math.radians(clamp_lat(lat))
+    return int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * (1 << zoom))
+
+
+def tile_bounds(x, y, zoom):
+    """(min_lon, min_lat, max_lon, max_lat) of tile x/y at ``zoom``"""
+    n = 1 << zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def parse_bbox(value):
+    """'min_lon,min_lat,max_lon,max_lat' (Leaflet's toBBoxString order), clamped to the map; raises ValueError"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        raise ValueError("bbox must be finite")
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    min_lat, max_lat = clamp_lat(min_lat), clamp_lat(max_lat)
+    if min_lon >= max_lon or min_lat >= max_lat:
+        raise ValueError("bbox must have min < max (split boxes crossing the antimeridian)")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def tiles_for_bbox(bbox, zoom):
+    """Every (x, y) tile at ``zoom`` that overlaps ``bbox``"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    last = (1 << zoom) - 1
+    x0, x1 = tile_x(min_lon, zoom), min(tile_x(max_lon, zoom), last)
+    y0, y1 = tile_y(max_lat, zoom), min(tile_y(min_lat, zoom), last)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def cluster_query(tiles, zoom, grid, event=None, place=None, start=None, end=None, paramstyle='psycopg2'):
+    """(sql, params) clustering the logs inside the bounding box of ``tiles``.
+
+    Rows are (cell_x, cell_y, count, lat, lon, id, event, timestamp) where
+    cell_x // grid, cell_y // grid is the tile; id/event/timestamp describe
+    the point when count is 1. ``start``/``end`` are inclusive dates (IST days).
+    """
+    params = Params(paramstyle)
+    add = params.add
+
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    min_lon, _, _, max_lat = tile_bounds(min(xs), min(ys), zoom)
+    _, min_lat, max_lon, _ = tile_bounds(max(xs), max(ys), zoom)
+    # Bound first: psycopg2 placeholders are positional and the join precedes the WHERE clause
+    cells = add(float((1 << zoom) * grid))
+
+    # Matches the logs_location_idx GiST expression index
+    conditions = [f"point(l.lon, l.lat) <@ box(point({add(min_lon)}::float8, {add(min_lat)}::float8), "
+                  f"point({add(max_lon)}::float8, {add(max_lat)}::float8))"]
+    if event:
+        conditions.append(f"l.event = {add(event)}::text")
+    if place:
+        conditions.append(f"l.place_id IN (SELECT id FROM places WHERE name = {add(place)}::text)")
+    if start:
+        conditions.append(f"l.timestamp >= {add(start.isoformat())}::text::date::timestamp AT TIME ZONE 'Asia/Kolkata'")
+    if end:
+        conditions.append(f"l.timestamp < {add((end + timedelta(days=1)).isoformat())}::text::date::timestamp AT TIME ZONE 'Asia/Kolkata'")
+
+    sql = f"""
+        SELECT LEAST(floor((l.lon + 180) / 360 * g.cells), g.cells - 1)::bigint AS cell_x,
+               LEAST(floor((1 - ln(tan(radians(l.lat)) + 1 / cos(radians(l.lat))) / pi()) / 2 * g.cells),
+                     g.cells - 1)::bigint AS cell_y,
+               COUNT(*) AS count, AVG(l.lat) AS lat, AVG(l.lon) AS lon,
+               MIN(l.id) AS id, MIN(l.event) AS event, MIN(l.timestamp) AS timestamp
+        FROM logs l
+        CROSS JOIN (SELECT {cells}::float8 AS cells) g
+        WHERE {" AND ".join(conditions)}
+        GROUP BY 1, 2
+    """
+    return sql, params
+
+
+def split_clusters(rows, tiles, grid, tz):
+    """{(x, y): [cluster dicts]} for ``tiles`` from cluster_query() rows (others dropped)"""
+    clusters = {tile: [] for tile in tiles}
+    for cell_x, cell_y, count, lat, lon, log_id, event, timestamp in map(tuple, rows):
+        tile = clusters.get((cell_x // grid, cell_y // grid))
+        if tile is None:
+            continue
+        cluster = {"lat": round(float(lat), 6), "lon": round(float(lon), 6), "count": count}
+        if count == 1:
+            cluster.update(id=log_id, event=event, timestamp=timestamp.astimezone(tz).isoformat())
+        tile.append(cluster)
+    return clusters
@@ -0,0 +1,306 @@
+"""In-process metrics with Prometheus text exposition (served at /api/metrics).
+
+* Per-route request latency and response size histograms (instrument_app).
+* Per-statement database timings and row counts, via a psycopg2 connection
+  factory (MetricsConnection) that instruments every cursor it creates.
+  Statements are tagged with the current *site*: the Flask endpoint by
+  default, narrowed with ``with db_site('...')`` around specific call paths.
+* Pool checkout wait times (observe_pool_wait) and gauges read at scrape time
+  (register_gauge).
+
+Metrics are kept per process; under gunicorn each scrape reports the worker
+that served it.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2.extensions
+from flask import g, request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_site = contextvars.ContextVar('db_site', default='other')
+# Per-request statement log (a list) while capture_statements() is active
+_statements = contextvars.ContextVar('db_statements', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + (float('inf'),), series[:len(self.buckets)] + [series[-1]]):
+                    le = _labels(self.label_names, labels, [('le', _number(bound))])
+                    lines.append(f"{self.name}_bucket{le} {count}")
+                plain = _labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{plain} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{plain} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge (or externally maintained counter) whose samples are read at scrape time"""
+
+    def __init__(self, name, help_text, collect, kind='gauge', labels=()):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.kind = kind
+        self.label_names = tuple(labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        samples = self.collect()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for labels, value in sorted(samples.items()):
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+_metrics = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+http_latency = _register(Histogram(
+    'worklog_http_request_duration_seconds', 'Time to produce a response, by route',
+    labels=('method', 'route', 'status')))
+http_size = _register(Histogram(
+    'worklog_http_response_size_bytes', 'Response body size, by route (streamed bodies counted when complete)',
+    labels=('route',), buckets=SIZE_BUCKETS))
+db_latency = _register(Histogram(
+    'worklog_db_query_duration_seconds', 'Database statement time, by call site and operation',
+    labels=('site', 'op')))
+db_rows = _register(Counter(
+    'worklog_db_rows_total', 'Rows fetched from the database, by call site', labels=('site',)))
+db_errors = _register(Counter(
+    'worklog_db_errors_total', 'Failed database statements, by call site', labels=('site',)))
+pool_wait = _register(Histogram(
+    'worklog_db_pool_wait_seconds', 'Time to check a connection out of the pool'))
+
+
+def register_gauge(name, help_text, collect, kind='gauge', labels=()):
+    """Expose a value computed at scrape time; ``collect`` returns a number or {label(s): number}"""
+    return _register(Gauge(name, help_text, collect, kind, labels))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"Error collecting metric {metric.name}: {e}")
+    return '\n'.join(lines) + '\n'
+
+
+def observe_pool_wait(seconds):
+    """ConnectionPool on_checkout hook"""
+    pool_wait.observe(seconds)
+
+
+@contextmanager
+def db_site(name):
+    """Tag database statements issued inside the block with ``name``"""
+    token = _site.set(name)
+    try:
+        yield
+    finally:
+        _site.reset(token)
+
+
+@contextmanager
+def capture_statements():
+    """Collect (site, op, seconds, sql) for every statement issued inside the block"""
+    statements = []
+    token = _statements.set(statements)
+    try:
+        yield statements
+    finally:
+        _statements.reset(token)
+
+
+def _timed(op, call, sql=None):
+    started = time.perf_counter()
+    site = _site.get()
+    try:
+        return call()
+    except Exception:
+        db_errors.inc(site)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        db_latency.observe(elapsed, site, op)
+        statements = _statements.get()
+        if statements is not None:
+            statements.append((site, op, elapsed, sql))
+
+
+class _MetricsCursorMixin:
+    def execute(self, query, vars=None):
+        return _timed('execute', lambda: super(_MetricsCursorMixin, self).execute(query, vars), query)
+
+    def executemany(self, query, vars_list):
+        return _timed('executemany', lambda: super(_MetricsCursorMixin, self).executemany(query, vars_list), query)
+
+    def copy_expert(self, sql, file, size=8192):
+        return _timed('copy', lambda: super(_MetricsCursorMixin, self).copy_expert(sql, file, size), sql)
+
+    def _fetch(self, call):
+        # Server-side cursors do a round trip per fetch; client-side fetches are in memory
+        if self.name:
+            rows = _timed('fetch', call, f"FETCH FROM {self.name}")
+        else:
+            rows = call()
+        count = len(rows) if isinstance(rows, list) else int(rows is not None)
+        if count:
+            db_rows.inc(_site.get(), amount=count)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(lambda: super(_MetricsCursorMixin, self).fetchone())
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        return self._fetch(lambda: super(_MetricsCursorMixin, self).fetchmany(size))
+
+    def fetchall(self):
+        return self._fetch(lambda: super(_MetricsCursorMixin, self).fetchall())
+
+    def __iter__(self):
+        # Go through the fetch methods so rows (and server-side round trips) are counted
+        if not self.name:
+            yield from self.fetchall()
+            return
+        while True:
+            rows = self.fetchmany(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+
+_cursor_classes = {}
+
+
+def _instrumented(cursor_class):
+    cls = _cursor_classes.get(cursor_class)
+    if cls is None:
+        cls = type('Metrics' + cursor_class.__name__, (_MetricsCursorMixin, cursor_class), {})
+        _cursor_classes[cursor_class] = cls
+    return cls
+
+
+class MetricsConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors (any cursor_factory, named or not) record metrics"""
+
+    def cursor(self, *args, **kwargs):
+        cursor_factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _instrumented(cursor_factory)
+        return super().cursor(*args, **kwargs)
+
+
+class _CountingBody:
+    """Wraps a streamed response body to record its size once it has been sent"""
+
+    def __init__(self, body, route):
+        self.body = body
+        self.route = route
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        http_size.observe(self.size, self.route)
+        if hasattr(self.body, 'close'):
+            self.body.close()
+
+
+def instrument_app(app):
+    """Record latency and response size for every request and tag its statements with the endpoint"""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        _site.set(request.endpoint or 'unmatched')
+        # A statement capture never outlives the request that started it
+        _statements.set(None)
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_latency.observe(time.perf_counter() - started, request.method, route, response.status_code)
+        if response.is_streamed:
+            response.response = _CountingBody(response.response, route)
+        else:
+            http_size.observe(response.calculate_content_length() or 0, route)
+        return response
@@ -0,0 +1,106 @@
+"""Versioned schema migrations.
+
+Migrations are plain SQL files in ``migrations/`` named ``NNNN_description.sql``.
+Each pending file runs in its own transaction and is recorded in the
+``schema_migrations`` table; an advisory lock keeps concurrent workers from
+applying the same migration twice.
+
+Usage: python migrate.py [--list]
+"""
+import os
+import re
+import sys
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+# Arbitrary constant identifying the migration lock in pg_advisory_lock
+MIGRATION_LOCK_ID = 727_274_001
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Return [(version, name, path)] for every migration file, ordered by version"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), filename[:-4], os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers in " + directory)
+    return migrations
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def applied_versions(conn):
+    """Versions already recorded in schema_migrations"""
+    cursor = conn.cursor()
+    _ensure_table(cursor)
+    conn.commit()
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    conn.commit()
+    return versions
+
+
+def run_migrations(conn, directory=MIGRATIONS_DIR):
+    """Apply pending migrations in order and return the names applied"""
+    applied = []
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    conn.commit()
+    try:
+        done = applied_versions(conn)
+        for version, name, path in discover_migrations(directory):
+            if version in done:
+                continue
+            with open(path, 'r') as f:
+                sql = f.read()
+            try:
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"❌ Migration {name} failed")
+                raise
+            print(f"✅ Applied migration {name}")
+            applied.append(name)
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cursor.close()
+    return applied
+
+
+if __name__ == '__main__':
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv('.env.production')
+    connection = psycopg2.connect(os.getenv('DATABASE_URL', 'NOURLHERE'), connect_timeout=10)
+    try:
+        if '--list' in sys.argv[1:]:
+            done = applied_versions(connection)
+            for version, name, _ in discover_migrations():
+                print(f"{'applied' if version in done else 'pending':8} {name}")
+        else:
+            names = run_migrations(connection)
+            print(f"{len(names)} migration(s) applied")
+    finally:
+        connection.close()
@@ -1,4 +1,4 @@
--- schema.sql
+-- 0001_initial.sql: baseline schema (formerly schema.sql)
 
 CREATE TABLE IF NOT EXISTS places (
     id TEXT PRIMARY KEY,
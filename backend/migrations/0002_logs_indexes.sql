@@ -0,0 +1,12 @@
+-- 0002_logs_indexes.sql: indexes for the hot logs queries
+
+-- Latest arrive lookup (exit duration) and event filters: WHERE event = ... ORDER BY timestamp DESC
+CREATE INDEX IF NOT EXISTS logs_event_timestamp_idx ON logs (event, timestamp DESC);
+
+-- Per-place history and the place join in GET /api/logs and the dashboard
+CREATE INDEX IF NOT EXISTS logs_place_timestamp_idx ON logs (place_id, timestamp);
+
+-- Date-range filters and ORDER BY timestamp DESC (id breaks ties for stable ordering)
+CREATE INDEX IF NOT EXISTS logs_timestamp_id_idx ON logs (timestamp DESC, id DESC);
+
+ANALYZE logs;
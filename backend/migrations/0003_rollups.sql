@@ -0,0 +1,32 @@
+-- 0003_rollups.sql: incrementally maintained aggregates for the dashboard
+
+-- Per IST day x place x event log counts and duration sums.
+-- place_id is '' for logs without a place so it can be part of the primary key.
+CREATE TABLE IF NOT EXISTS log_daily_rollup (
+    day DATE NOT NULL,
+    place_id TEXT NOT NULL DEFAULT '',
+    event TEXT NOT NULL,
+    log_count INTEGER NOT NULL DEFAULT 0,
+    duration_minutes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, place_id, event)
+);
+
+-- Task counts per status ('' for tasks without a status)
+CREATE TABLE IF NOT EXISTS task_status_rollup (
+    status TEXT PRIMARY KEY,
+    task_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Backfill from existing data
+INSERT INTO log_daily_rollup (day, place_id, event, log_count, duration_minutes)
+SELECT (timestamp AT TIME ZONE 'Asia/Kolkata')::date, COALESCE(place_id, ''), event,
+       COUNT(*), COALESCE(SUM(duration_minutes), 0)
+FROM logs
+GROUP BY 1, 2, 3
+ON CONFLICT (day, place_id, event) DO NOTHING;
+
+INSERT INTO task_status_rollup (status, task_count)
+SELECT COALESCE(status, ''), COUNT(*)
+FROM tasks
+GROUP BY 1
+ON CONFLICT (status) DO NOTHING;
@@ -0,0 +1,20 @@
+-- 0004_reclassify_jobs.sql: progress of the historical log re-classification job (reclassify.py)
+
+-- One row per run. Logs with id <= max_log_id existed when the job started
+-- (newer ones are classified at insert time); last_log_id is the keyset
+-- position, committed together with each chunk so an interrupted job resumes
+-- exactly where it stopped. places_signature identifies the set of places the
+-- job matched against; a job is only resumed while that set is unchanged.
+CREATE TABLE IF NOT EXISTS reclassify_jobs (
+    id SERIAL PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'running',  -- running, paused, completed, failed
+    places_signature TEXT NOT NULL,
+    max_log_id INTEGER NOT NULL,
+    last_log_id INTEGER NOT NULL DEFAULT 0,
+    scanned_count BIGINT NOT NULL DEFAULT 0,
+    changed_count BIGINT NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
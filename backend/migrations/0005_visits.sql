@@ -0,0 +1,48 @@
+-- 0005_visits.sql: per-place visit sessions (arrive/exit pairs), maintained on ingest by visits.py
+
+-- An arrive opens a visit at its place (place_id NULL = outside every geofence);
+-- the next exit at the same place closes it with the duration. A visit whose
+-- place sees another arrive first is closed without an exit (missed exit), and
+-- an exit with no open visit is stored on its own with arrived_at NULL.
+CREATE TABLE IF NOT EXISTS visits (
+    id SERIAL PRIMARY KEY,
+    place_id TEXT REFERENCES places(id) ON DELETE SET NULL,
+    arrived_at TIMESTAMPTZ,
+    exited_at TIMESTAMPTZ,
+    duration_minutes INTEGER,
+    arrive_log_id INTEGER REFERENCES logs(id) ON DELETE SET NULL,
+    exit_log_id INTEGER REFERENCES logs(id) ON DELETE SET NULL,
+    open BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- At most one open visit per place; also the O(1) lookup used when pairing an exit
+CREATE UNIQUE INDEX IF NOT EXISTS visits_open_place_idx ON visits ((COALESCE(place_id, ''))) WHERE open;
+
+-- Listing newest first and per-place time-at-place reports
+CREATE INDEX IF NOT EXISTS visits_start_idx ON visits ((COALESCE(arrived_at, exited_at)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS visits_place_start_idx ON visits (place_id, (COALESCE(arrived_at, exited_at)));
+
+-- Backfill by pairing existing arrive/exit logs per place in time order
+WITH seq AS (
+    SELECT id, timestamp, event, place_id,
+           LEAD(event) OVER w AS next_event,
+           LEAD(id) OVER w AS next_id,
+           LEAD(timestamp) OVER w AS next_timestamp,
+           LAG(event) OVER w AS prev_event
+    FROM logs
+    WHERE event IN ('arrive', 'exit')
+    WINDOW w AS (PARTITION BY COALESCE(place_id, '') ORDER BY timestamp, id)
+)
+INSERT INTO visits (place_id, arrived_at, exited_at, duration_minutes, arrive_log_id, exit_log_id, open)
+SELECT place_id, timestamp,
+       CASE WHEN next_event = 'exit' THEN next_timestamp END,
+       CASE WHEN next_event = 'exit' THEN GREATEST(FLOOR(EXTRACT(EPOCH FROM (next_timestamp - timestamp)) / 60), 0)::int END,
+       id,
+       CASE WHEN next_event = 'exit' THEN next_id END,
+       next_event IS NULL
+FROM seq
+WHERE event = 'arrive'
+UNION ALL
+SELECT place_id, NULL, timestamp, NULL, NULL, id, FALSE
+FROM seq
+WHERE event = 'exit' AND prev_event IS DISTINCT FROM 'arrive';
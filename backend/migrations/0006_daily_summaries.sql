@@ -0,0 +1,43 @@
+-- 0006_daily_summaries.sql: one row per IST day for the daily log (see daily.py)
+
+-- Day-level facts kept current by every log, task and event write: the first
+-- and last arrive and the last exit of the day, the day's log count, tasks
+-- completed and journal events on that day. notes and entries are what the
+-- daily page saves for the day. Minutes per place come from log_daily_rollup.
+CREATE TABLE IF NOT EXISTS daily_summaries (
+    day DATE PRIMARY KEY,
+    first_arrive_at TIMESTAMPTZ,
+    last_arrive_at TIMESTAMPTZ,
+    last_exit_at TIMESTAMPTZ,
+    log_count INTEGER NOT NULL DEFAULT 0,
+    tasks_completed INTEGER NOT NULL DEFAULT 0,
+    events_count INTEGER NOT NULL DEFAULT 0,
+    notes TEXT NOT NULL DEFAULT '',
+    entries JSONB NOT NULL DEFAULT '[]',
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Backfill from existing data
+INSERT INTO daily_summaries (day, first_arrive_at, last_arrive_at, last_exit_at, log_count, tasks_completed, events_count)
+SELECT day, MIN(first_arrive_at), MAX(last_arrive_at), MAX(last_exit_at),
+       SUM(log_count), SUM(tasks_completed), SUM(events_count)
+FROM (
+    SELECT (timestamp AT TIME ZONE 'Asia/Kolkata')::date AS day,
+           MIN(timestamp) FILTER (WHERE event = 'arrive') AS first_arrive_at,
+           MAX(timestamp) FILTER (WHERE event = 'arrive') AS last_arrive_at,
+           MAX(timestamp) FILTER (WHERE event = 'exit') AS last_exit_at,
+           COUNT(*) AS log_count, 0 AS tasks_completed, 0 AS events_count
+    FROM logs
+    GROUP BY 1
+    UNION ALL
+    SELECT (completed_at AT TIME ZONE 'Asia/Kolkata')::date, NULL, NULL, NULL, 0, COUNT(*), 0
+    FROM tasks
+    WHERE completed_at IS NOT NULL
+    GROUP BY 1
+    UNION ALL
+    SELECT date, NULL, NULL, NULL, 0, 0, COUNT(*)
+    FROM events
+    GROUP BY 1
+) counts
+GROUP BY day
+ON CONFLICT (day) DO NOTHING;
@@ -0,0 +1,6 @@
+-- 0007_rollup_place_index.sql: per-place time series over the log rollup (/api/analytics/timeseries?place=...)
+
+-- The primary key leads with day; this serves one place's days without scanning every place in the range
+CREATE INDEX IF NOT EXISTS log_daily_rollup_place_day_idx ON log_daily_rollup (place_id, day);
+
+ANALYZE log_daily_rollup;
@@ -0,0 +1,6 @@
+-- 0008_logs_location_index.sql: bounding-box lookups for the clustered map (/api/map/points)
+
+-- Built-in GiST over point(lon, lat) (no PostGIS needed); queried with point(l.lon, l.lat) <@ box(...)
+CREATE INDEX IF NOT EXISTS logs_location_idx ON logs USING gist (point(lon, lat));
+
+ANALYZE logs;
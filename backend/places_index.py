@@ -0,0 +1,234 @@
+"""In-process spatial index over the places table for geofence matching"""
+import threading
+import time
+from math import cos, floor, radians
+
+import numpy as np
+
+from geo import calculate_distance, haversine_many, haversine_pairs, METERS_PER_DEGREE_LAT
+
+# Places whose geofence would cover more cells than this go into a
+# small list that is checked on every lookup instead of being bucketed
+MAX_CELLS_PER_PLACE = 1024
+
+# Single lookups switch from the scalar haversine loop to numpy at this many candidates
+VECTORIZE_MIN_CANDIDATES = 64
+
+# Points matched per array pass in nearest_many (bounds the candidate-pair temporaries)
+MATCH_CHUNK_POINTS = 65536
+
+
+class _Grid:
+    """Immutable snapshot of places bucketed into fixed-size lat/lon cells.
+
+    Cells hold positions into ``places``. The vectorized path uses parallel
+    coordinate arrays and a CSR copy of the cells: sorted cell keys, offsets
+    into one flat array of positions.
+    """
+
+    def __init__(self, places, cell_deg):
+        self.cell_deg = cell_deg
+        self.cols = max(int(round(360.0 / cell_deg)), 1)
+        self.cells = {}
+        self.wide = []
+        self.places = []
+
+        for place in places:
+            radius = place.get('geofence_radius') or 0
+            if radius <= 0:
+                continue
+            entry = (place['id'], place['name'], float(place['lat']), float(place['lon']), float(radius))
+            self.places.append(entry)
+            self._insert(len(self.places) - 1, entry)
+
+        self.lats = np.array([entry[2] for entry in self.places], dtype=np.float64)
+        self.lons = np.array([entry[3] for entry in self.places], dtype=np.float64)
+        self.radii = np.array([entry[4] for entry in self.places], dtype=np.float64)
+        self.wide_positions = np.array(self.wide, dtype=np.int64)
+
+        keys = sorted(self.cells)
+        self.cell_keys = np.array([row * self.cols + col for row, col in keys], dtype=np.int64)
+        self.cell_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        self.cell_offsets[1:] = np.cumsum([len(self.cells[key]) for key in keys])
+        self.cell_positions = np.array([p for key in keys for p in self.cells[key]], dtype=np.int64)
+
+    def _row(self, lat):
+        return floor((lat + 90.0) / self.cell_deg)
+
+    def _col(self, lon):
+        return floor((lon + 180.0) / self.cell_deg) % self.cols
+
+    def _insert(self, position, entry):
+        _, _, lat, lon, radius = entry
+        dlat = radius / METERS_PER_DEGREE_LAT
+        dlon = radius / (METERS_PER_DEGREE_LAT * max(cos(radians(lat)), 1e-6))
+        if dlon >= 180.0:
+            self.wide.append(position)
+            return
+
+        row_lo, row_hi = self._row(lat - dlat), self._row(lat + dlat)
+        col_lo = floor((lon - dlon + 180.0) / self.cell_deg)
+        col_hi = floor((lon + dlon + 180.0) / self.cell_deg)
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > MAX_CELLS_PER_PLACE:
+            self.wide.append(position)
+            return
+
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                self.cells.setdefault((row, col % self.cols), []).append(position)
+
+    def _candidates(self, key):
+        cell = self.cells.get(key, [])
+        return (cell + self.wide) if self.wide else cell
+
+    def nearest(self, lat, lon):
+        """Nearest place whose geofence contains the point, as (entry, distance)"""
+        candidates = self._candidates((self._row(lat), self._col(lon)))
+        if len(candidates) >= VECTORIZE_MIN_CANDIDATES:
+            positions = np.array(candidates, dtype=np.int64)
+            distances = haversine_many(lat, lon, self.lats[positions], self.lons[positions])
+            distances[distances > self.radii[positions]] = np.inf
+            best = int(distances.argmin())
+            if not np.isfinite(distances[best]):
+                return None, None
+            return self.places[candidates[best]], float(distances[best])
+
+        best, best_distance = None, None
+        for position in candidates:
+            entry = self.places[position]
+            distance = calculate_distance(lat, lon, entry[2], entry[3])
+            if distance <= entry[4] and (best_distance is None or distance < best_distance):
+                best, best_distance = entry, distance
+        return best, best_distance
+
+    def nearest_many(self, lats, lons):
+        """Vectorized nearest() for arrays of points.
+
+        Every (point, candidate place) pair from the point's cell (plus the
+        wide places) is expanded into flat arrays, measured in one haversine
+        pass and reduced to the closest containing place per point. Returns
+        (positions, distances) arrays, -1 / NaN outside every geofence.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        positions = np.full(len(lats), -1, dtype=np.int64)
+        distances = np.full(len(lats), np.nan)
+        for start in range(0, len(lats) if self.places else 0, MATCH_CHUNK_POINTS):
+            chunk = slice(start, start + MATCH_CHUNK_POINTS)
+            positions[chunk], distances[chunk] = self._match_chunk(lats[chunk], lons[chunk])
+        return positions, distances
+
+    def _match_chunk(self, lats, lons):
+        count = len(lats)
+        rows = np.floor((lats + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lons + 180.0) / self.cell_deg).astype(np.int64) % self.cols
+        keys = rows * self.cols + cols
+
+        # Locate each point's cell and expand it into (point, place position) pairs
+        starts = np.zeros(count, dtype=np.int64)
+        counts = np.zeros(count, dtype=np.int64)
+        if len(self.cell_keys):
+            slots = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+            found = self.cell_keys[slots] == keys
+            starts = self.cell_offsets[slots]
+            counts = np.where(found, self.cell_offsets[slots + 1] - starts, 0)
+        pair_points = np.repeat(np.arange(count), counts)
+        within = np.arange(len(pair_points)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_places = self.cell_positions[np.repeat(starts, counts) + within]
+        if len(self.wide_positions):
+            pair_points = np.concatenate([pair_points, np.repeat(np.arange(count), len(self.wide_positions))])
+            pair_places = np.concatenate([pair_places, np.tile(self.wide_positions, count)])
+
+        positions = np.full(count, -1, dtype=np.int64)
+        distances = np.full(count, np.nan)
+        pair_distances = haversine_pairs(lats[pair_points], lons[pair_points],
+                                         self.lats[pair_places], self.lons[pair_places])
+        inside = pair_distances <= self.radii[pair_places]
+        pair_points, pair_places, pair_distances = pair_points[inside], pair_places[inside], pair_distances[inside]
+        if not len(pair_points):
+            return positions, distances
+
+        # Closest containing place per point: sort by (point, distance) and keep each point's first pair
+        order = np.lexsort((pair_distances, pair_points))
+        first = order[np.r_[True, pair_points[order][1:] != pair_points[order][:-1]]]
+        positions[pair_points[first]] = pair_places[first]
+        distances[pair_points[first]] = pair_distances[first]
+        return positions, distances
+
+
+class PlacesIndex:
+    """Lazily built, invalidatable geofence index.
+
+    ``loader`` returns the current rows of the places table as dicts. The
+    index is rebuilt on the first lookup after ``invalidate()`` or once the
+    snapshot is older than ``ttl`` seconds, which bounds staleness when
+    another process mutates places.
+    """
+
+    def __init__(self, loader, cell_deg=0.01, ttl=300.0):
+        self.loader = loader
+        self.cell_deg = cell_deg
+        self.ttl = ttl
+        self._grid = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Drop the current snapshot; the next lookup rebuilds it"""
+        with self._lock:
+            self._grid = None
+
+    def _snapshot(self):
+        grid = self._grid
+        if grid is not None and time.monotonic() - self._built_at < self.ttl:
+            return grid
+        with self._lock:
+            if self._grid is None or time.monotonic() - self._built_at >= self.ttl:
+                self._grid = _Grid(self.loader(), self.cell_deg)
+                self._built_at = time.monotonic()
+            return self._grid
+
+    def warm(self):
+        """Build the snapshot now (e.g. at startup) instead of on first lookup"""
+        self._snapshot()
+
+    def lookup(self, lat, lon):
+        """Return (place_id, place_name, distance_m) for the nearest containing geofence, or None"""
+        entry, distance = self._snapshot().nearest(lat, lon)
+        if entry is None:
+            return None
+        return entry[0], entry[1], distance
+
+    def lookup_cached(self, lat, lon):
+        """lookup() against the snapshot already loaded, however old, never touching the database.
+
+        Returns None when no snapshot is loaded yet or no geofence contains
+        the point (for callers that must not wait on a rebuild).
+        """
+        grid = self._grid
+        if grid is None:
+            return None
+        entry, distance = grid.nearest(lat, lon)
+        if entry is None:
+            return None
+        return entry[0], entry[1], distance
+
+    def lookup_many(self, points):
+        """lookup() for a sequence of (lat, lon) points in one vectorized pass"""
+        grid = self._snapshot()
+        if not points:
+            return []
+        lats, lons = zip(*points)
+        positions, distances = grid.nearest_many(lats, lons)
+        return [
+            (grid.places[position][0], grid.places[position][1], float(distance)) if position >= 0 else None
+            for position, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+    def names(self):
+        """{place_id: place_name} of the indexed places"""
+        return {entry[0]: entry[1] for entry in self._snapshot().places}
+
+    def size(self):
+        """Number of indexed places"""
+        return len(self._snapshot().places)
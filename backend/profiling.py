@@ -0,0 +1,183 @@
+"""Opt-in request profiling.
+
+A request is profiled when it carries the ``X-Profile`` header or is picked by
+random sampling (``sample_rate``). Profiled requests run under cProfile and
+record every SQL statement they issue (via metrics.capture_statements). The
+slowest ``keep`` profiles are retained, along with the last ``keep``
+explicitly requested ones. Both are served by the admin endpoints in app.py.
+Profiles are kept per process.
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import g, request
+
+import metrics
+
+PROFILE_HEADER = 'X-Profile'
+
+
+def _sql_text(sql, limit=2000):
+    if sql is None:
+        return None
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = ' '.join(str(sql).split())
+    return sql if len(sql) <= limit else sql[:limit] + '...'
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate=0.0, keep=20, sql_limit=200, top_functions=40, authorize=None):
+        self.sample_rate = sample_rate
+        # Optional check that the current request may ask for a profile via the header
+        self.authorize = authorize
+        self.keep = keep
+        self.sql_limit = sql_limit
+        self.top_functions = top_functions
+        self._slowest = []                  # min-heap of (duration, id, profile)
+        self._requested = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _wanted(self):
+        requested = request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes')
+        if requested and self.authorize is not None and not self.authorize():
+            requested = False
+        return requested, requested or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self):
+        """Begin profiling the current request if it asked for it or was sampled"""
+        requested, wanted = self._wanted()
+        if not wanted:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this process (Python 3.12+ allows only one)
+            profile = None
+        statements = metrics.capture_statements()
+        g.profiling = {
+            "requested": requested,
+            "started": time.perf_counter(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "profile": profile,
+            "capture": statements,
+            "statements": statements.__enter__(),
+        }
+
+    def finish(self, response):
+        """Stop profiling once the response is complete (streamed bodies: when fully sent)"""
+        state = g.pop('profiling', None)
+        if state is None:
+            return response
+        profile_id = next(self._ids)
+        response.headers['X-Profile-Id'] = str(profile_id)
+        details = {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.full_path.rstrip('?'),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "started_at": state["started_at"],
+            "requested": state["requested"],
+        }
+        if response.is_streamed:
+            response.response = _ProfiledBody(response.response, lambda: self._store(state, details))
+        else:
+            self._store(state, details)
+        return response
+
+    def _store(self, state, details):
+        duration = time.perf_counter() - state["started"]
+        profile = state["profile"]
+        if profile is not None:
+            profile.disable()
+        try:
+            state["capture"].__exit__(None, None, None)
+        except ValueError:
+            # Ended in a different context than it started (e.g. a body closed by the server)
+            pass
+
+        statements = state["statements"]
+        details.update({
+            "duration_ms": round(duration * 1000, 3),
+            "sql_count": len(statements),
+            "sql_ms": round(sum(seconds for _, _, seconds, _ in statements) * 1000, 3),
+            "sql": [
+                {"site": site, "op": op, "ms": round(seconds * 1000, 3), "statement": _sql_text(sql)}
+                for site, op, seconds, sql in statements[:self.sql_limit]
+            ],
+        })
+        if profile is not None:
+            stats = pstats.Stats(profile)
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats('cumulative').print_stats(self.top_functions)
+            details["profile_text"] = text.getvalue()
+            details["_pstats"] = marshal.dumps(stats.stats)
+
+        entry = (duration, details["id"], details)
+        with self._lock:
+            if details["requested"]:
+                self._requested.append(details)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def list(self):
+        """Summaries of retained profiles, slowest first"""
+        with self._lock:
+            profiles = {details["id"]: details for _, _, details in self._slowest}
+            profiles.update({details["id"]: details for details in self._requested})
+        summaries = [
+            {key: value for key, value in details.items() if key not in ('sql', 'profile_text', '_pstats')}
+            for details in profiles.values()
+        ]
+        return sorted(summaries, key=lambda details: details["duration_ms"], reverse=True)
+
+    def get(self, profile_id):
+        """Full profile (SQL statements and cProfile report) or None"""
+        with self._lock:
+            for details in itertools.chain((d for _, _, d in self._slowest), self._requested):
+                if details["id"] == profile_id:
+                    return details
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._slowest.clear()
+            self._requested.clear()
+
+    def instrument_app(self, app):
+        """Register the request hooks on a Flask app"""
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+
+class _ProfiledBody:
+    """Wraps a streamed response body and finishes the profile when it is closed"""
+
+    def __init__(self, body, on_close):
+        self.body = body
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.on_close()
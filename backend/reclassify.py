@@ -0,0 +1,312 @@
+"""Re-match historical logs against the current places.
+
+Logs are classified once, at insert time, so adding a place leaves older logs
+inside its geofence at place_id NULL and deleting one nulls its logs. This
+job walks logs in primary-key order in chunks, matches each chunk with the
+vectorized geofence index and rewrites place_id only where it changes, with
+the rollup deltas, the re-paired visits at the old and new places and the
+job's progress committed in the same short transaction. Row locks are held
+for one chunk at a time, and an interrupted job resumes from its last
+committed chunk while the places are unchanged.
+
+Usage: python reclassify.py [--chunk-size N] [--pause SECONDS] [--restart] [--status]
+"""
+import os
+import sys
+import threading
+import time
+
+import psycopg2.extras
+
+from places_index import PlacesIndex
+from rollups import record_logs
+from visits import repair_points, repair_visits
+
+# Arbitrary constant identifying the reclassification lock in pg_try_advisory_lock
+RECLASSIFY_LOCK_ID = 727_274_002
+
+DEFAULT_CHUNK_SIZE = 10000
+
+JOB_COLUMNS = """
+    id, status, places_signature, max_log_id, last_log_id, scanned_count, changed_count,
+    error, started_at, updated_at, finished_at
+"""
+
+# Changes are applied only where the row still holds the place it was read with,
+# so a concurrent place deletion (ON DELETE SET NULL) or edit is never overwritten,
+# and only to places that still exist
+UPDATE_CHANGED_SQL = """
+    UPDATE logs l
+    SET place_id = v.new_place_id
+    FROM (VALUES %s) AS v(id, old_place_id, new_place_id)
+    WHERE l.id = v.id
+      AND l.place_id IS NOT DISTINCT FROM v.old_place_id
+      AND (v.new_place_id IS NULL OR EXISTS (SELECT 1 FROM places p WHERE p.id = v.new_place_id))
+    RETURNING l.timestamp, l.event, l.duration_minutes, v.old_place_id, l.place_id
+"""
+
+
+class ReclassifyBusy(Exception):
+    """Raised when another session is already running a reclassification"""
+
+
+def places_signature(cursor):
+    """Fingerprint of every place's id, position and radius"""
+    cursor.execute("""
+        SELECT COALESCE(md5(string_agg(id || ':' || lat || ':' || lon || ':' || COALESCE(geofence_radius, 0),
+                                       ',' ORDER BY id)), '')
+        FROM places
+    """)
+    return cursor.fetchone()[0]
+
+
+def job_status(cursor, limit=1):
+    """The most recent jobs (newest first) as dicts"""
+    cursor.execute(f"SELECT {JOB_COLUMNS} FROM reclassify_jobs ORDER BY id DESC LIMIT %s", (limit,))
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _resumable_job(cursor, signature):
+    """The latest unfinished job if it was matching against the same places, else None"""
+    jobs = job_status(cursor)
+    if jobs and jobs[0]['status'] != 'completed' and jobs[0]['places_signature'] == signature:
+        return jobs[0]
+    return None
+
+
+def _load_index(cursor):
+    cursor.execute("SELECT id, name, lat, lon, geofence_radius FROM places")
+    columns = [column[0] for column in cursor.description]
+    places = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    index = PlacesIndex(lambda: places, ttl=float('inf'))
+    index.warm()
+    return index
+
+
+def reclassify_chunk(cursor, index, after_id, max_log_id, chunk_size):
+    """Re-match the next chunk of logs after ``after_id``; returns (last_id, scanned, changed) or None when done"""
+    cursor.execute("""
+        SELECT id, lat, lon, place_id FROM logs
+        WHERE id > %s AND id <= %s
+        ORDER BY id
+        LIMIT %s
+    """, (after_id, max_log_id, chunk_size))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    matches = index.lookup_many([(row[1], row[2]) for row in rows])
+    changes = [
+        (row[0], row[3], match[0] if match else None)
+        for row, match in zip(rows, matches)
+        if (match[0] if match else None) != row[3]
+    ]
+    changed = []
+    if changes:
+        changed = psycopg2.extras.execute_values(
+            cursor, UPDATE_CHANGED_SQL, changes,
+            template="(%s::integer, %s::text, %s::text)", page_size=len(changes), fetch=True
+        )
+        # Move the rows' rollup counts from the old place to the new one
+        record_logs(cursor, [(timestamp, old, event, duration) for timestamp, event, duration, old, _ in changed], sign=-1)
+        record_logs(cursor, [(timestamp, new, event, duration) for timestamp, event, duration, _, new in changed])
+        # and re-pair the visits around the moved arrives/exits at both places
+        repair_visits(cursor, repair_points([(timestamp, place_id, event)
+                                            for timestamp, event, _, old, new in changed for place_id in (old, new)]))
+    return rows[-1][0], len(rows), len(changed)
+
+
+def run(conn, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.0, restart=False, should_stop=None, on_chunk=None):
+    """Run (or resume) a reclassification to completion and return the final job row.
+
+    Commits after every chunk. ``should_stop()`` is polled between chunks;
+    when it returns True the job is left 'paused' and can be resumed later.
+    ``on_chunk(job, changed)`` is called after each committed chunk. Raises
+    ReclassifyBusy if another session holds the job lock.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (RECLASSIFY_LOCK_ID,))
+    locked = cursor.fetchone()[0]
+    conn.commit()
+    if not locked:
+        cursor.close()
+        raise ReclassifyBusy("Another reclassification is already running")
+
+    job_id = None
+    try:
+        signature = places_signature(cursor)
+        job = None if restart else _resumable_job(cursor, signature)
+        if job is None:
+            # Unfinished jobs against other places can no longer be resumed
+            cursor.execute("""
+                UPDATE reclassify_jobs SET status = 'failed', error = 'superseded', finished_at = NOW()
+                WHERE status IN ('running', 'paused')
+            """)
+            cursor.execute(f"""
+                INSERT INTO reclassify_jobs (places_signature, max_log_id)
+                SELECT %s, COALESCE(MAX(id), 0) FROM logs
+                RETURNING {JOB_COLUMNS}
+            """, (signature,))
+        else:
+            cursor.execute(f"""
+                UPDATE reclassify_jobs SET status = 'running', error = NULL, updated_at = NOW()
+                WHERE id = %s
+                RETURNING {JOB_COLUMNS}
+            """, (job['id'],))
+        columns = [column[0] for column in cursor.description]
+        job = dict(zip(columns, cursor.fetchone()))
+        job_id = job['id']
+        conn.commit()
+
+        index = _load_index(cursor)
+        conn.commit()
+        status = 'completed'
+        while True:
+            if should_stop is not None and should_stop():
+                status = 'paused'
+                break
+            result = reclassify_chunk(cursor, index, job['last_log_id'], job['max_log_id'], chunk_size)
+            if result is None:
+                break
+            last_id, scanned, changed = result
+            cursor.execute(f"""
+                UPDATE reclassify_jobs
+                SET last_log_id = %s, scanned_count = scanned_count + %s, changed_count = changed_count + %s,
+                    updated_at = NOW()
+                WHERE id = %s
+                RETURNING {JOB_COLUMNS}
+            """, (last_id, scanned, changed, job_id))
+            job = dict(zip(columns, cursor.fetchone()))
+            conn.commit()
+            if on_chunk is not None:
+                on_chunk(job, changed)
+            if pause:
+                time.sleep(pause)
+
+        cursor.execute(f"""
+            UPDATE reclassify_jobs
+            SET status = %s, updated_at = NOW(), finished_at = CASE WHEN %s = 'completed' THEN NOW() END
+            WHERE id = %s
+            RETURNING {JOB_COLUMNS}
+        """, (status, status, job_id))
+        job = dict(zip(columns, cursor.fetchone()))
+        conn.commit()
+        return job
+    except Exception as e:
+        conn.rollback()
+        if job_id is not None and not conn.closed:
+            cursor.execute("""
+                UPDATE reclassify_jobs SET status = 'failed', error = %s, updated_at = NOW()
+                WHERE id = %s
+            """, (str(e), job_id))
+            conn.commit()
+        raise
+    finally:
+        # Interrupted mid-chunk: nothing of the chunk is kept, and the job resumes from the last commit
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (RECLASSIFY_LOCK_ID,))
+        conn.commit()
+        cursor.close()
+
+
+class ReclassifyRunner:
+    """Runs reclassification jobs on a background thread of the API process.
+
+    ``connection()`` is a context manager yielding a database connection
+    (e.g. ``db_pool.connection``). Asking for a run while one is in progress
+    queues exactly one more run, so places changed mid-job are picked up.
+    """
+
+    def __init__(self, connection, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.0, on_chunk=None):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.on_chunk = on_chunk
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = None
+        self._stop = threading.Event()
+        self.last_error = None
+
+    def start(self, restart=False):
+        """Start a run, or queue one after the current run; returns 'started' or 'queued'"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._pending = bool(self._pending) or restart
+                return 'queued'
+            self._pending = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(restart,), name='reclassify', daemon=True)
+            self._thread.start()
+            return 'started'
+
+    def stop(self, timeout=None):
+        """Pause the current run after its current chunk and drop any queued run.
+
+        With ``timeout`` wait up to that many seconds for the thread to finish.
+        """
+        with self._lock:
+            self._pending = None
+            self._stop.set()
+            thread = self._thread
+        if timeout is not None and thread is not None:
+            thread.join(timeout)
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, restart):
+        while True:
+            try:
+                self.last_error = None
+                with self.connection() as conn:
+                    run(conn, self.chunk_size, self.pause, restart=restart,
+                        should_stop=self._stop.is_set, on_chunk=self.on_chunk)
+            except ReclassifyBusy as e:
+                self.last_error = str(e)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Reclassification failed: {e}")
+            with self._lock:
+                if self._pending is None or self._stop.is_set():
+                    return
+                restart, self._pending = self._pending, None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv('.env.production')
+    parser = argparse.ArgumentParser(description="Re-match historical logs against the current places")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="logs per transaction")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between chunks")
+    parser.add_argument('--restart', action='store_true', help="start over instead of resuming an unfinished job")
+    parser.add_argument('--status', action='store_true', help="show recent jobs and exit")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(os.getenv('DATABASE_URL', 'NOURLHERE'), connect_timeout=10)
+    try:
+        if args.status:
+            for job in reversed(job_status(connection.cursor(), limit=10)):
+                print(f"#{job['id']:<5} {job['status']:9} {job['last_log_id']}/{job['max_log_id']} "
+                      f"scanned={job['scanned_count']} changed={job['changed_count']} {job['error'] or ''}")
+        else:
+            def report(job, changed):
+                print(f"  {job['last_log_id']}/{job['max_log_id']} scanned={job['scanned_count']} "
+                      f"changed={job['changed_count']}", file=sys.stderr)
+            try:
+                finished = run(connection, args.chunk_size, args.pause, args.restart, on_chunk=report)
+            except KeyboardInterrupt:
+                print("⚠️ Interrupted; run again to resume")
+                sys.exit(130)
+            except ReclassifyBusy as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print(f"✅ Job {finished['id']} {finished['status']}: scanned {finished['scanned_count']}, "
+                  f"changed {finished['changed_count']}")
+    finally:
+        connection.close()
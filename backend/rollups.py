@@ -0,0 +1,149 @@
+"""Incremental maintenance of the dashboard rollup tables (see migrations/0003_rollups.sql).
+
+Every write path that inserts or deletes logs or tasks calls these helpers in
+the same transaction, so the rollups always match the base tables. The
+statements are built by the *_query functions for either driver (see
+sqlparams.py); the cursor helpers run them with psycopg2.
+"""
+from collections import defaultdict
+from datetime import timezone, timedelta
+
+from sqlparams import Params, columns
+
+# Rollup days are IST calendar days, matching the timezone used everywhere else in the API
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def rollup_day(timestamp):
+    """IST calendar day a log timestamp is counted under"""
+    return timestamp.astimezone(IST).date()
+
+
+def log_rollup_rows(logs, sign=1):
+    """Aggregate (timestamp, place_id, event, duration_minutes) logs into (day, place_id, event, count, duration) deltas"""
+    deltas = defaultdict(lambda: [0, 0])
+    for timestamp, place_id, event, duration_minutes in logs:
+        delta = deltas[(rollup_day(timestamp), place_id or '', event)]
+        delta[0] += sign
+        delta[1] += sign * (duration_minutes or 0)
+    return [(day, place_id, event, count, duration) for (day, place_id, event), (count, duration) in deltas.items()]
+
+
+def log_rollup_query(rows, paramstyle='psycopg2'):
+    """(sql, params) adding log_rollup_rows() deltas to log_daily_rollup"""
+    params = Params(paramstyle)
+    days, place_ids, events, counts, durations = columns(rows)
+    sql = f"""
+        INSERT INTO log_daily_rollup (day, place_id, event, log_count, duration_minutes)
+        SELECT * FROM unnest({params.add(days)}::date[], {params.add(place_ids)}::text[], {params.add(events)}::text[],
+                             {params.add(counts)}::int[], {params.add(durations)}::bigint[])
+        ON CONFLICT (day, place_id, event) DO UPDATE
+        SET log_count = log_daily_rollup.log_count + EXCLUDED.log_count,
+            duration_minutes = log_daily_rollup.duration_minutes + EXCLUDED.duration_minutes
+    """
+    return sql, params
+
+
+def record_logs(cursor, logs, sign=1):
+    """Add (sign=1) or remove (sign=-1) logs given as (timestamp, place_id, event, duration_minutes)"""
+    rows = log_rollup_rows(logs, sign)
+    if not rows:
+        return
+    cursor.execute(*log_rollup_query(rows))
+
+
+def release_place_query(place_id, paramstyle='psycopg2'):
+    """(sql, params) moving a deleted place's rollup rows to the no-place bucket (mirrors ON DELETE SET NULL on logs)"""
+    params = Params(paramstyle)
+    sql = f"""
+        WITH moved AS (
+            DELETE FROM log_daily_rollup WHERE place_id = {params.add(place_id)}::text
+            RETURNING day, event, log_count, duration_minutes
+        )
+        INSERT INTO log_daily_rollup (day, place_id, event, log_count, duration_minutes)
+        SELECT day, '', event, log_count, duration_minutes FROM moved
+        ON CONFLICT (day, place_id, event) DO UPDATE
+        SET log_count = log_daily_rollup.log_count + EXCLUDED.log_count,
+            duration_minutes = log_daily_rollup.duration_minutes + EXCLUDED.duration_minutes
+    """
+    return sql, params
+
+
+def release_place(cursor, place_id):
+    """Move a deleted place's rollup rows to the no-place bucket"""
+    cursor.execute(*release_place_query(place_id))
+
+
+def task_status_rows(old_status=None, new_status=None, created=False, deleted=False):
+    """(status, delta) rows for a task being created, deleted, or moved between statuses"""
+    changes = defaultdict(int)
+    if not created:
+        changes[old_status or ''] -= 1
+    if not deleted:
+        changes[new_status or ''] += 1
+    return [(status, delta) for status, delta in changes.items() if delta]
+
+
+def task_status_query(rows, paramstyle='psycopg2'):
+    """(sql, params) applying task_status_rows() deltas to task_status_rollup"""
+    params = Params(paramstyle)
+    statuses, deltas = columns(rows)
+    sql = f"""
+        INSERT INTO task_status_rollup (status, task_count)
+        SELECT * FROM unnest({params.add(statuses)}::text[], {params.add(deltas)}::int[])
+        ON CONFLICT (status) DO UPDATE
+        SET task_count = task_status_rollup.task_count + EXCLUDED.task_count
+    """
+    return sql, params
+
+
+def record_task_status(cursor, old_status=None, new_status=None, created=False, deleted=False):
+    """Account for a task being created, deleted, or moved between statuses"""
+    rows = task_status_rows(old_status, new_status, created, deleted)
+    if not rows:
+        return
+    cursor.execute(*task_status_query(rows))
+
+
+# Every dashboard metric in one round trip. The per-event groups are computed
+# once and the totals are derived from them; the distributions come back as JSON objects.
+DASHBOARD_SQL = """
+    WITH by_event AS (
+        SELECT event,
+               SUM(log_count)::bigint AS log_count,
+               SUM(log_count) FILTER (WHERE day = (NOW() AT TIME ZONE 'Asia/Kolkata')::date)::bigint AS today_count,
+               SUM(duration_minutes)::bigint AS duration_minutes
+        FROM log_daily_rollup
+        GROUP BY event
+    ), by_place AS (
+        SELECT COALESCE(p.name, 'unknown') AS name, SUM(r.log_count)::bigint AS log_count
+        FROM log_daily_rollup r
+        LEFT JOIN places p ON p.id = NULLIF(r.place_id, '')
+        GROUP BY p.name HAVING SUM(r.log_count) > 0
+    )
+    SELECT (SELECT COALESCE(SUM(log_count), 0)::bigint FROM by_event) AS total_logs,
+           (SELECT COALESCE(SUM(today_count), 0)::bigint FROM by_event) AS today_logs,
+           (SELECT COUNT(*) FROM by_event WHERE log_count > 0) AS unique_events,
+           (SELECT COALESCE(SUM(duration_minutes), 0)::bigint FROM by_event) AS total_duration,
+           (SELECT COALESCE(json_object_agg(event, log_count), '{}') FROM by_event WHERE log_count > 0) AS event_counts,
+           (SELECT COALESCE(json_object_agg(name, log_count), '{}') FROM by_place) AS place_counts,
+           (SELECT COALESCE(json_object_agg(status, task_count), '{}') FROM task_status_rollup WHERE task_count > 0) AS task_status_counts
+"""
+
+
+def rebuild_rollups(cursor):
+    """Recompute both rollup tables from the base tables (after bulk loads outside the API)"""
+    cursor.execute("""
+        TRUNCATE log_daily_rollup, task_status_rollup;
+
+        INSERT INTO log_daily_rollup (day, place_id, event, log_count, duration_minutes)
+        SELECT (timestamp AT TIME ZONE 'Asia/Kolkata')::date, COALESCE(place_id, ''), event,
+               COUNT(*), COALESCE(SUM(duration_minutes), 0)
+        FROM logs
+        GROUP BY 1, 2, 3;
+
+        INSERT INTO task_status_rollup (status, task_count)
+        SELECT COALESCE(status, ''), COUNT(*)
+        FROM tasks
+        GROUP BY 1;
+    """)
@@ -0,0 +1,28 @@
+"""Placeholders for SQL shared by app.py (psycopg2) and async_app.py (asyncpg).
+
+Statement builders take ``paramstyle='psycopg2'|'asyncpg'`` and return
+(sql, params): psycopg2 runs them with cursor.execute(sql, params), asyncpg
+with conn.execute(sql, *params). Multi-row writes pass one array per column
+and unnest() them, which both drivers bind the same way.
+"""
+
+PARAMSTYLES = ('psycopg2', 'asyncpg')
+
+
+class Params(list):
+    """Positional query parameters; add() returns the placeholder for a value (%s or $n)"""
+
+    def __init__(self, paramstyle='psycopg2'):
+        if paramstyle not in PARAMSTYLES:
+            raise ValueError(f"Unknown paramstyle: {paramstyle}")
+        super().__init__()
+        self.paramstyle = paramstyle
+
+    def add(self, value):
+        self.append(value)
+        return '%s' if self.paramstyle == 'psycopg2' else f"${len(self)}"
+
+
+def columns(rows):
+    """Row tuples as one list per column (the arrays unnest() takes)"""
+    return [list(column) for column in zip(*rows)]
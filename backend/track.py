@@ -0,0 +1,44 @@
+"""Movement paths for /api/track: logged points simplified and polyline-encoded (see geo.py)."""
+from datetime import datetime
+
+import numpy as np
+
+from geo import simplify_track, encode_polyline
+
+from sqlparams import Params
+
+
+def track_query(start, end, paramstyle='psycopg2'):
+    """(sql, params) for the (epoch_seconds, lat, lon) of every log on IST days ``start``..``end``, in time order.
+
+    ``paramstyle`` is 'psycopg2' (%s) or 'asyncpg' ($n). The range is served
+    backwards by the (timestamp DESC, id DESC) index.
+    """
+    params = Params(paramstyle)
+    add = params.add
+
+    sql = f"""
+        SELECT EXTRACT(EPOCH FROM timestamp)::float8, lat, lon
+        FROM logs
+        WHERE timestamp >= {add(start)}::date::timestamp AT TIME ZONE 'Asia/Kolkata'
+          AND timestamp < ({add(end)}::date + 1)::timestamp AT TIME ZONE 'Asia/Kolkata'
+        ORDER BY timestamp, id
+    """
+    return sql, params
+
+
+def track_json(rows, tolerance, precision, tz):
+    """Simplified, polyline-encoded track from track_query() rows"""
+    track = np.array(list(map(tuple, rows)), dtype=np.float64).reshape(-1, 3)
+    kept = simplify_track(track[:, 1], track[:, 2], tolerance)
+    times = np.round(track[kept, 0]).astype(np.int64)
+    return {
+        "points": len(track),
+        "kept": len(kept),
+        "tolerance_m": tolerance,
+        "precision": precision,
+        "polyline": encode_polyline(track[kept, 1], track[kept, 2], precision),
+        "start_time": datetime.fromtimestamp(int(times[0]), tz).isoformat() if len(times) else None,
+        # Seconds since the previous kept point (0 for the first)
+        "time_deltas": np.diff(times, prepend=times[:1]).tolist(),
+    }
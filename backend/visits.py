@@ -0,0 +1,415 @@
+"""Per-place visit sessions (see migrations/0005_visits.sql).
+
+Arrive and exit events are paired per place as they are ingested: an arrive
+opens a visit at its place, closing one still open there as a missed exit;
+an exit closes its place's open visit and takes its duration from it; an
+exit with no open visit is stored on its own. The partial unique index on
+open visits keeps at most one per place and makes finding it O(1), and
+OpenVisits keeps the same information in memory for reads. Deleting logs
+re-pairs just the visits around them (repair_visits).
+
+Usage: python visits.py --rebuild   (re-pair every visit from logs)
+"""
+import threading
+import time
+
+from sqlparams import Params, columns
+
+# Visits whose events are both present are paired; the others are recorded as missed
+PAIRED_EVENTS = ('arrive', 'exit')
+
+VISIT_COLUMNS = "v.id, v.place_id, v.arrived_at, v.exited_at, v.duration_minutes, v.arrive_log_id, v.exit_log_id, v.open"
+
+# Full re-pairing from logs; the same statement backfills visits in migration 0005
+PAIR_VISITS_SQL = """
+    WITH seq AS (
+        SELECT id, timestamp, event, place_id,
+               LEAD(event) OVER w AS next_event,
+               LEAD(id) OVER w AS next_id,
+               LEAD(timestamp) OVER w AS next_timestamp,
+               LAG(event) OVER w AS prev_event
+        FROM logs
+        WHERE event IN ('arrive', 'exit')
+        WINDOW w AS (PARTITION BY COALESCE(place_id, '') ORDER BY timestamp, id)
+    )
+    INSERT INTO visits (place_id, arrived_at, exited_at, duration_minutes, arrive_log_id, exit_log_id, open)
+    SELECT place_id, timestamp,
+           CASE WHEN next_event = 'exit' THEN next_timestamp END,
+           CASE WHEN next_event = 'exit' THEN GREATEST(FLOOR(EXTRACT(EPOCH FROM (next_timestamp - timestamp)) / 60), 0)::int END,
+           id,
+           CASE WHEN next_event = 'exit' THEN next_id END,
+           next_event IS NULL
+    FROM seq
+    WHERE event = 'arrive'
+    UNION ALL
+    SELECT place_id, NULL, timestamp, NULL, NULL, id, FALSE
+    FROM seq
+    WHERE event = 'exit' AND prev_event IS DISTINCT FROM 'arrive'
+"""
+
+
+def place_key(place_id):
+    """Key of a place in the open-visit index ('' for logs outside every geofence)"""
+    return place_id or ''
+
+
+def elapsed_minutes(start, end):
+    """Whole minutes between two timestamps, never negative"""
+    return max(int((end - start).total_seconds() // 60), 0)
+
+
+def open_visits_query(keys, paramstyle='psycopg2'):
+    """(sql, params) locking the open visits at these place keys until commit: rows of (id, key, arrived_at)"""
+    params = Params(paramstyle)
+    sql = f"""
+        SELECT id, COALESCE(place_id, '') AS key, arrived_at FROM visits
+        WHERE COALESCE(place_id, '') = ANY({params.add(keys)}::text[]) AND open
+        FOR UPDATE
+    """
+    return sql, params
+
+
+def latest_paired_query(keys, paramstyle='psycopg2'):
+    """(sql, params) for the latest stored arrive/exit at each place key: rows of (key, latest)"""
+    params = Params(paramstyle)
+    sql = f"""
+        SELECT k.key, CASE WHEN k.key = '' THEN (
+                   SELECT MAX(timestamp) FROM logs WHERE place_id IS NULL AND event IN ('arrive', 'exit')
+               ) ELSE (
+                   SELECT MAX(timestamp) FROM logs WHERE place_id = k.key AND event IN ('arrive', 'exit')
+               ) END AS latest
+        FROM unnest({params.add(keys)}::text[]) AS k(key)
+    """
+    return sql, params
+
+
+def lock_open_visits(cursor, place_ids):
+    """{place_key: {"id", "arrived_at"}} for the open visits at these places, locked until commit"""
+    keys = sorted({place_key(place_id) for place_id in place_ids})
+    if not keys:
+        return {}
+    cursor.execute(*open_visits_query(keys))
+    return {key: {"id": visit_id, "arrived_at": arrived_at} for visit_id, key, arrived_at in cursor.fetchall()}
+
+
+def latest_paired_events(cursor, place_ids):
+    """{place_key: timestamp} of the latest stored arrive/exit at each place (via the place/timestamp index)"""
+    keys = sorted({place_key(place_id) for place_id in place_ids})
+    if not keys:
+        return {}
+    cursor.execute(*latest_paired_query(keys))
+    return {key: latest for key, latest in cursor.fetchall() if latest is not None}
+
+
+def plan_visits(ordered, places, open_visits, latest=None):
+    """Pair a timestamp-ordered batch of events per place.
+
+    ``places`` holds the (place_id, place_name) of each event,
+    ``open_visits`` the stored open visits from lock_open_visits and
+    ``latest`` the places' latest stored events from latest_paired_events.
+    A stored open visit only pairs with events at or after its arrival;
+    earlier (replayed) events are paired among themselves, and a replayed
+    arrive older than a stored event at its place is not left open. Returns (durations,
+    closes, inserts): the paired duration of each exit (None otherwise),
+    (visit_id, exited_at, exit_index, duration_minutes) for stored visits
+    that get closed, and the new visit rows as dicts.
+    """
+    durations = [None] * len(ordered)
+    closes = []
+    inserts = []
+    pending = dict(open_visits)
+    current = {}
+
+    for index, (event, (place_id, _)) in enumerate(zip(ordered, places)):
+        if event['event'] not in PAIRED_EVENTS:
+            continue
+        key = place_key(place_id)
+        timestamp = event['timestamp']
+        stored = pending.get(key)
+        if stored is not None and timestamp >= stored['arrived_at']:
+            # Events have caught up with the stored open visit: it replaces any earlier local one
+            current[key] = pending.pop(key)
+        visit = current.pop(key, None)
+
+        if event['event'] == 'arrive':
+            if visit is not None and 'arrive_index' not in visit:
+                closes.append((visit['id'], None, None, None))
+            visit = {"place_id": place_id, "arrived_at": timestamp, "arrive_index": index,
+                     "exited_at": None, "exit_index": None, "duration_minutes": None}
+            inserts.append(visit)
+            current[key] = visit
+        elif visit is not None:
+            duration = elapsed_minutes(visit['arrived_at'], timestamp)
+            durations[index] = duration
+            if 'arrive_index' in visit:
+                visit.update(exited_at=timestamp, exit_index=index, duration_minutes=duration)
+            else:
+                closes.append((visit['id'], timestamp, index, duration))
+        else:
+            inserts.append({"place_id": place_id, "arrived_at": None, "arrive_index": None,
+                            "exited_at": timestamp, "exit_index": index, "duration_minutes": None})
+
+    # New visits left open stay open unless later stored events at the place supersede them
+    latest = latest or {}
+    for key, visit in current.items():
+        if 'arrive_index' in visit and key not in pending and (key not in latest or visit['arrived_at'] >= latest[key]):
+            visit['open'] = True
+    return durations, closes, inserts
+
+
+def close_visits_query(closes, log_ids, paramstyle='psycopg2'):
+    """(sql, params) closing the stored visits in a plan_visits() result"""
+    params = Params(paramstyle)
+    ids, exited_ats, exit_log_ids, durations = columns(
+        [(visit_id, exited_at, log_ids[index] if index is not None else None, duration)
+         for visit_id, exited_at, index, duration in closes])
+    sql = f"""
+        UPDATE visits v
+        SET open = FALSE, exited_at = c.exited_at, exit_log_id = c.exit_log_id, duration_minutes = c.duration_minutes
+        FROM unnest({params.add(ids)}::int[], {params.add(exited_ats)}::timestamptz[],
+                    {params.add(exit_log_ids)}::int[], {params.add(durations)}::int[])
+             AS c(id, exited_at, exit_log_id, duration_minutes)
+        WHERE v.id = c.id
+    """
+    return sql, params
+
+
+def insert_visits_query(inserts, log_ids, paramstyle='psycopg2'):
+    """(sql, params) inserting the new visits in a plan_visits() result: rows of (id, place_id, arrived_at, open)"""
+    params = Params(paramstyle)
+    rows = [(visit['place_id'], visit['arrived_at'], visit['exited_at'], visit['duration_minutes'],
+             log_ids[visit['arrive_index']] if visit['arrive_index'] is not None else None,
+             log_ids[visit['exit_index']] if visit['exit_index'] is not None else None,
+             visit.get('open', False)) for visit in inserts]
+    place_ids, arrived_ats, exited_ats, durations, arrive_log_ids, exit_log_ids, opens = columns(rows)
+    # ON CONFLICT only fires if another transaction opened a visit at the place concurrently
+    sql = f"""
+        INSERT INTO visits (place_id, arrived_at, exited_at, duration_minutes, arrive_log_id, exit_log_id, open)
+        SELECT * FROM unnest({params.add(place_ids)}::text[], {params.add(arrived_ats)}::timestamptz[],
+                             {params.add(exited_ats)}::timestamptz[], {params.add(durations)}::int[],
+                             {params.add(arrive_log_ids)}::int[], {params.add(exit_log_ids)}::int[],
+                             {params.add(opens)}::boolean[])
+        ON CONFLICT ((COALESCE(place_id, ''))) WHERE open DO NOTHING
+        RETURNING id, place_id, arrived_at, open
+    """
+    return sql, params
+
+
+def record_visits(cursor, closes, inserts, log_ids):
+    """Write a plan_visits() result once the batch's logs have ``log_ids`` (timestamp order).
+
+    Returns {place_key: {"id", "place_id", "arrived_at"}} for the visits left open.
+    """
+    if closes:
+        cursor.execute(*close_visits_query(closes, log_ids))
+    if not inserts:
+        return {}
+    cursor.execute(*insert_visits_query(inserts, log_ids))
+    return {place_key(place_id): {"id": visit_id, "place_id": place_id, "arrived_at": arrived_at}
+            for visit_id, place_id, arrived_at, is_open in cursor.fetchall() if is_open}
+
+
+def repair_points(logs):
+    """Sorted (place_key, timestamp) of the arrive/exit logs among ``logs`` ((timestamp, place_id, event, ...))"""
+    return sorted({(place_key(place_id), timestamp) for timestamp, place_id, event, *_ in logs if event in PAIRED_EVENTS})
+
+
+def _at_place(table, key, condition, order=""):
+    # Rows at a place key; split so each half is a range scan of the (place_id, ...) index
+    return f"""(
+        (SELECT * FROM {table} WHERE place_id = {key} AND {condition} {order})
+        UNION ALL
+        (SELECT * FROM {table} WHERE place_id IS NULL AND {key} = '' AND {condition} {order})
+    )"""
+
+
+def repair_visits_query(points, paramstyle='psycopg2'):
+    """(sql, params) re-pairing the visits around arrive/exit logs that were deleted or moved between places.
+
+    ``points`` come from repair_points(). An event's visit only depends on
+    its neighbours at the same place, so around every point the events from
+    the one before it to the one after it (windows that overlap are merged)
+    are paired again as PAIR_VISITS_SQL would and replace the visits they
+    start; an exit on the left edge and an arrive on the right edge keep
+    theirs. Returns rows of (id, place_id, arrived_at, open) for the visits
+    written.
+    """
+    params = Params(paramstyle)
+    keys, timestamps = columns(points)
+    # Events and visits are ordered by (timestamp, log id) as in the window of PAIR_VISITS_SQL; a visit
+    # starts at its arrive, or at its exit when it has none (0 once the FK nulled a deleted log's id)
+    visit_start = "(COALESCE(v.arrived_at, v.exited_at), COALESCE(v.arrive_log_id, v.exit_log_id, 0))"
+    sql = f"""
+        WITH windows AS (
+            SELECT p.key, COALESCE(a.timestamp, '-infinity') AS from_ts, COALESCE(a.id, 0) AS from_id,
+                   a.event AS from_event, COALESCE(b.timestamp, 'infinity') AS to_ts, b.id AS to_id, b.event AS to_event
+            FROM unnest({params.add(keys)}::text[], {params.add(timestamps)}::timestamptz[]) AS p(key, timestamp)
+            LEFT JOIN LATERAL (
+                SELECT timestamp, id, event FROM {_at_place('logs', 'p.key',
+                                                            "event IN ('arrive', 'exit') AND timestamp < p.timestamp",
+                                                            'ORDER BY timestamp DESC LIMIT 1')} l LIMIT 1
+            ) a ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT timestamp, id, event FROM {_at_place('logs', 'p.key',
+                                                            "event IN ('arrive', 'exit') AND timestamp > p.timestamp",
+                                                            'ORDER BY timestamp LIMIT 1')} l LIMIT 1
+            ) b ON TRUE
+        ), islands AS (
+            SELECT *, SUM(starts) OVER (PARTITION BY key ORDER BY from_ts, from_id) AS island
+            FROM (
+                SELECT *, CASE WHEN from_ts <= MAX(to_ts) OVER (
+                           PARTITION BY key ORDER BY from_ts, from_id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                       ) THEN 0 ELSE 1 END AS starts
+                FROM windows
+            ) w
+        ), spans AS (
+            SELECT key, island, MIN(from_ts) AS from_ts,
+                   (array_agg(from_id ORDER BY from_ts, from_id))[1] AS from_id,
+                   (array_agg(from_event ORDER BY from_ts, from_id))[1] IS NOT DISTINCT FROM 'exit' AS skip_from,
+                   MAX(to_ts) AS to_ts,
+                   (array_agg(to_id ORDER BY to_ts DESC, to_id DESC NULLS FIRST))[1] AS to_id,
+                   (array_agg(to_event ORDER BY to_ts DESC, to_id DESC NULLS FIRST))[1] IS DISTINCT FROM 'exit' AS skip_to
+            FROM islands
+            GROUP BY key, island
+        ), stale AS (
+            DELETE FROM visits
+            WHERE id IN (
+                SELECT v.id FROM spans s
+                CROSS JOIN LATERAL {_at_place('visits', 's.key', "COALESCE(arrived_at, exited_at) BETWEEN s.from_ts AND s.to_ts")} v
+                WHERE ({visit_start} > (s.from_ts, s.from_id) OR ({visit_start} = (s.from_ts, s.from_id) AND NOT s.skip_from))
+                  AND (s.to_id IS NULL OR {visit_start} < (s.to_ts, s.to_id)
+                       OR ({visit_start} = (s.to_ts, s.to_id) AND NOT s.skip_to))
+            )
+            RETURNING id
+        ), seq AS (
+            SELECT l.id, l.timestamp, l.event, l.place_id,
+                   (l.id = s.from_id AND s.skip_from) OR (l.id IS NOT DISTINCT FROM s.to_id AND s.skip_to) AS edge,
+                   LEAD(l.event) OVER w AS next_event,
+                   LEAD(l.id) OVER w AS next_id,
+                   LEAD(l.timestamp) OVER w AS next_timestamp,
+                   LAG(l.event) OVER w AS prev_event
+            FROM spans s
+            CROSS JOIN LATERAL {_at_place('logs', 's.key',
+                                          "event IN ('arrive', 'exit') AND timestamp BETWEEN s.from_ts AND s.to_ts")} l
+            WHERE (l.timestamp, l.id) >= (s.from_ts, s.from_id)
+              AND (s.to_id IS NULL OR (l.timestamp, l.id) <= (s.to_ts, s.to_id))
+            WINDOW w AS (PARTITION BY s.key, s.island ORDER BY l.timestamp, l.id)
+        )
+        -- Reading stale deletes the old rows (including the place's open visit) before these are inserted
+        INSERT INTO visits (place_id, arrived_at, exited_at, duration_minutes, arrive_log_id, exit_log_id, open)
+        SELECT r.* FROM (
+            SELECT place_id, timestamp AS arrived_at,
+                   CASE WHEN next_event = 'exit' THEN next_timestamp END AS exited_at,
+                   CASE WHEN next_event = 'exit' THEN GREATEST(FLOOR(EXTRACT(EPOCH FROM (next_timestamp - timestamp)) / 60), 0)::int END,
+                   id,
+                   CASE WHEN next_event = 'exit' THEN next_id END,
+                   next_event IS NULL
+            FROM seq
+            WHERE event = 'arrive' AND NOT edge
+            UNION ALL
+            SELECT place_id, NULL, timestamp, NULL, NULL, id, FALSE
+            FROM seq
+            WHERE event = 'exit' AND prev_event IS DISTINCT FROM 'arrive' AND NOT edge
+        ) r, (SELECT COUNT(*) FROM stale) c
+        RETURNING id, place_id, arrived_at, open
+    """
+    return sql, params
+
+
+def repair_visits(cursor, points):
+    """Run repair_visits_query(); returns {place_key: {"id", "place_id", "arrived_at"}} for the visits left open"""
+    if not points:
+        return {}
+    cursor.execute(*repair_visits_query(points))
+    return {place_key(place_id): {"id": visit_id, "place_id": place_id, "arrived_at": arrived_at}
+            for visit_id, place_id, arrived_at, is_open in cursor.fetchall() if is_open}
+
+
+def release_place_visits_query(place_id, paramstyle='psycopg2'):
+    """(sql, params) closing a place's open visit before the place is deleted (its visits then get place_id NULL)"""
+    params = Params(paramstyle)
+    return f"UPDATE visits SET open = FALSE WHERE place_id = {params.add(place_id)} AND open", params
+
+
+def release_place_visits(cursor, place_id):
+    """Close a place's open visit before the place is deleted"""
+    cursor.execute(*release_place_visits_query(place_id))
+
+
+def rebuild_visits(cursor):
+    """Re-pair every visit from logs (e.g. after logs were edited outside the API)"""
+    cursor.execute("TRUNCATE visits RESTART IDENTITY")
+    cursor.execute(PAIR_VISITS_SQL)
+
+
+class OpenVisits:
+    """In-memory map of the open visit at each place.
+
+    Writes in this process update it directly; the whole map is reloaded
+    from the open-visit index (one indexed query) once it is older than
+    ``ttl`` seconds, which bounds staleness when other processes write.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._visits = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def replace(self, rows):
+        """Load (id, place_id, arrived_at) rows of every open visit"""
+        with self._lock:
+            self._visits = {place_key(place_id): {"id": visit_id, "place_id": place_id, "arrived_at": arrived_at}
+                            for visit_id, place_id, arrived_at in rows}
+            self._loaded_at = time.monotonic()
+
+    def apply(self, place_id, opened=None, closed=False):
+        """Record a visit opened (dict) or closed at a place by a committed write"""
+        with self._lock:
+            if opened is not None:
+                self._visits[place_key(place_id)] = opened
+            elif closed:
+                self._visits.pop(place_key(place_id), None)
+
+    def update(self, keys, opened):
+        """Apply a batch: ``keys`` are the places it touched, ``opened`` what record_visits returned"""
+        with self._lock:
+            for key in keys:
+                self._visits.pop(key, None)
+            self._visits.update(opened)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def get(self, place_id):
+        return self._visits.get(place_key(place_id))
+
+    def all(self):
+        return list(self._visits.values())
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv('.env.production')
+    if '--rebuild' not in sys.argv[1:]:
+        print(__doc__)
+        sys.exit(2)
+    connection = psycopg2.connect(os.getenv('DATABASE_URL', 'NOURLHERE'), connect_timeout=10)
+    try:
+        cursor = connection.cursor()
+        rebuild_visits(cursor)
+        connection.commit()
+        cursor.execute("SELECT COUNT(*), COUNT(*) FILTER (WHERE open) FROM visits")
+        total, still_open = cursor.fetchone()
+        print(f"✅ Rebuilt {total} visits ({still_open} open)")
+    finally:
+        connection.close()
@@ -0,0 +1,24 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:application
+
+With preload_app (the default in gunicorn.conf.py) this module is imported
+once in the gunicorn master, so migrations run once and the places index is
+built once and shared copy-on-write by every forked worker.
+"""
+from app import app, init_database, places_index
+
+
+def create_app(migrate=True, warm=True):
+    """Prepare shared state and return the Flask app"""
+    if migrate:
+        init_database()
+    if warm:
+        try:
+            places_index.warm()
+            print(f"✅ Places index ready ({places_index.size()} places)")
+        except Exception as e:
+            # Not fatal: the index is built on the first lookup instead
+            print(f"⚠️ Could not warm places index: {e}")
+    return app
+
+
+application = create_app()
@@ -64,7 +64,7 @@ pip install -r requirements.txt
 
 # Run backend with Python in nohup
 BACKEND_LOG="$ROOT_DIR/backend/worklog.log"
-nohup python app.py > "$BACKEND_LOG" 2>&1 &
+nohup gunicorn -c gunicorn.conf.py wsgi:application > "$BACKEND_LOG" 2>&1 &
 echo "✅ Backend started on port 5051 (logs: $BACKEND_LOG)"
 
 # ----------------------------